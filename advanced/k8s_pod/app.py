@@ -1,8 +1,38 @@
+"""
+Neptune client for the pod: one long-lived NeptuneClient per process instead of a boto3 session, a service
+model and a TLS connection per request.
+
+- the boto3 session and its credentials are resolved once, requests are SigV4-signed (service neptune-db) with
+  a cached signer over frozen credentials
+- a daemon thread refreshes temporary IAM credentials (pod role, instance profile) REFRESH_MARGIN seconds
+  before they expire, so no request waits on STS
+- requests go through a urllib3 pool of keep-alive connections, the TLS handshake is paid once per connection
+- warm_up() resolves the credentials and opens the connections before the first probe; /ready (readiness
+  probe) answers from the last check while it is under READY_TTL seconds old, else checks /status again, and a
+  failed connection or a rejected signature marks the pod not ready at once:
+
+    readinessProbe:
+      httpGet: {path: /ready, port: 80}
+
+Gremlin websocket clients (gremlinpython's Client, one shared pool of connections) sign their handshake with
+websocket_headers().
+
+    python app.py                                   # NEPTUNE_URL=https://<neptune-endpoint>:8182
+    python app.py --fake                            # local fake endpoint, static test credentials
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import boto3
+import urllib3
+from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
-from botocore.endpoint import EndpointCreator
-from botocore.session import Session
-import os
 
 '''
 // Create account vertices
@@ -22,25 +52,314 @@ g.addE('transfers').from(t2).to(a3).property('date', '2021-02-20').next()
 ```
 '''
 
+logger = logging.getLogger(__name__)
+
+SERVICE = 'neptune-db'
+POOL_SIZE = 10
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+# Temporary credentials are renewed this many seconds before they expire, inside botocore's 15 minute advisory
+# window (get_frozen_credentials only fetches new credentials within it)
+REFRESH_MARGIN = 300
+# The refresh thread checks the expiry this often (a failed refresh is retried at the next check)
+REFRESH_CHECK_INTERVAL = 30
+# Static credentials (no expiry) are re-read this often
+REFRESH_INTERVAL = 3600
+# Seconds a readiness check is reused by /ready
+READY_TTL = 10
+
+
+class NeptuneClient:
+    def __init__(self, url=None, region=None, session=None, pool_size=POOL_SIZE, refresh_margin=REFRESH_MARGIN,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        """
+        Args:
+            url (str): Neptune endpoint, https://<cluster>:8182, NEPTUNE_URL when None
+            region (str): region of the cluster, AWS_REGION or the session's region when None
+            session (boto3.Session): credentials source, a default session (the pod's IAM role) when None
+            pool_size (int): keep-alive connections kept open to the endpoint
+            refresh_margin (float): seconds before expiry the background thread renews the credentials
+        """
+        self.url = (url or os.getenv('NEPTUNE_URL', '')).rstrip('/')
+        if not self.url:
+            raise ValueError('no Neptune url, set NEPTUNE_URL')
+        self.session = session or boto3.Session()
+        self.region = region or os.getenv('AWS_REGION') or self.session.region_name
+        self.pool_size = pool_size
+        self.refresh_margin = refresh_margin
+        self.http = urllib3.PoolManager(num_pools=2, maxsize=pool_size, block=True,
+                                        timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+                                        retries=urllib3.Retry(total=2, connect=2, read=0, backoff_factor=0.2))
+        self.ready = False
+        self._checked_at = None
+        self._credentials = None
+        self._refreshed_at = None
+        self._signer = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def refresh_credentials(self):
+        """Resolve the session's credentials (renewing them when they are about to expire), cache the signer"""
+        if self._credentials is None:
+            self._credentials = self.session.get_credentials()
+            if self._credentials is None:
+                raise RuntimeError('no AWS credentials found for the Neptune client')
+        frozen = self._credentials.get_frozen_credentials()
+        with self._lock:
+            self._signer = SigV4Auth(frozen, SERVICE, self.region)
+            self._refreshed_at = time.monotonic()
+
+    def refresh_due(self):
+        """True when the credentials expire within refresh_margin seconds (static ones: every REFRESH_INTERVAL)"""
+        # RefreshableCredentials (role, instance profile, web identity) answer refresh_needed(seconds),
+        # static Credentials have no expiry
+        refresh_needed = getattr(self._credentials, 'refresh_needed', None)
+        if refresh_needed is None:
+            return time.monotonic() - self._refreshed_at >= REFRESH_INTERVAL
+        return refresh_needed(self.refresh_margin)
+
+    def _refresh_loop(self):
+        while not self._stop.wait(REFRESH_CHECK_INTERVAL):
+            try:
+                if self.refresh_due():
+                    self.refresh_credentials()
+            except Exception:
+                logger.exception('credential refresh failed, retrying in %s s', REFRESH_CHECK_INTERVAL)
+
+    def start(self):
+        """Resolve the credentials and start the background refresh, once (safe to call from several threads)"""
+        with self._start_lock:
+            if self._refresher is None:
+                self.refresh_credentials()
+                self._refresher = threading.Thread(target=self._refresh_loop, name='neptune-credentials',
+                                                   daemon=True)
+                self._refresher.start()
+
+    def signed_headers(self, method, url, body=None, headers=None):
+        """SigV4 headers of a request, signed with the cached signer"""
+        if self._signer is None:
+            self.start()
+        request = AWSRequest(method=method, url=url, data=body, headers=headers or {})
+        with self._lock:
+            signer = self._signer
+        signer.add_auth(request)
+        return dict(request.headers.items())
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Signed request on a pooled connection
+
+        Args:
+            path (str): path on the endpoint, e.g. /status or /gremlin
+            body (dict, str or bytes): request body, dicts are sent as JSON
+
+        Returns:
+            urllib3.HTTPResponse: status and data
+        """
+        headers = dict(headers or {})
+        if isinstance(body, dict):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+        if isinstance(body, str):
+            body = body.encode()
+        url = self.url + path
+        try:
+            response = self.http.request(method, url, body=body,
+                                         headers=self.signed_headers(method, url, body, headers), preload_content=True)
+        except Exception:
+            self.ready = False
+            raise
+        if response.status in (401, 403):
+            # the signature was rejected, e.g. expired or revoked credentials
+            self.ready = False
+        return response
+
+    def status(self):
+        """The cluster's /status, parsed"""
+        response = self.request('GET', '/status')
+        if response.status != 200:
+            raise RuntimeError(f'Neptune /status answered {response.status}: {response.data[:200]!r}')
+        return json.loads(response.data)
+
+    def gremlin(self, query):
+        """Result of a Gremlin script over HTTP, parsed"""
+        response = self.request('POST', '/gremlin', {'gremlin': query})
+        if response.status != 200:
+            raise RuntimeError(f'Gremlin query failed with {response.status}: {response.data[:200]!r}')
+        return json.loads(response.data)
+
+    def websocket_headers(self, path='/gremlin'):
+        """Signed handshake headers for a websocket client of the endpoint (gremlinpython Client(headers=...))"""
+        return self.signed_headers('GET', self.url + path)
+
+    def warm_up(self, connections=1):
+        """
+        Readiness hook: credentials resolved, `connections` pooled connections open and the cluster answering
+
+        Returns:
+            bool: True when the pod can take traffic
+        """
+        try:
+            self.start()
+            # concurrent requests, so that `connections` connections are opened; map re-raises a failed one here
+            with ThreadPoolExecutor(max_workers=connections) as executor:
+                statuses = list(executor.map(lambda _: self.status(), range(connections)))
+            self.ready = all(status.get('status') == 'healthy' for status in statuses)
+        except Exception:
+            logger.exception('Neptune warm-up failed')
+            self.ready = False
+        self._checked_at = time.monotonic()
+        return self.ready
+
+    def check_ready(self):
+        """Readiness for the probe: the last check while it is under READY_TTL seconds old, else a new one"""
+        if not self.ready or self._checked_at is None or time.monotonic() - self._checked_at >= READY_TTL:
+            return self.warm_up()
+        return self.ready
+
+    def close(self):
+        self._stop.set()
+        self.http.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide NeptuneClient, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NeptuneClient()
+        return _client
 
 
 def connect_to_neptune():
-    # Configure the session to use the IAM role
-    session = boto3.Session()
+    """Print the cluster status, through the shared client"""
+    response = get_client().request('GET', '/status')
+    print(response.data.decode())
+
+
+class ProbeHandler(BaseHTTPRequestHandler):
+    """/ready (readiness probe, see NeptuneClient.check_ready), /health (liveness), /status"""
+    client = None
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        elif self.path == '/ready':
+            ready = self.client.check_ready()
+            self._send(200 if ready else 503, {'ready': ready})
+        elif self.path == '/status':
+            try:
+                self._send(200, self.client.status())
+            except Exception as e:
+                self._send(502, {'error': str(e)})
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def serve(client, port=80):
+    """Probe endpoints on port, the client warmed up before the first probe"""
+    ProbeHandler.client = client
+    client.warm_up(client.pool_size)
+    server = ThreadingHTTPServer(('', port), ProbeHandler)
+    logger.info('serving on port %s, ready: %s', port, client.ready)
+    server.serve_forever()
+
+
+class FakeNeptuneHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the cluster: answers /status and /gremlin, rejects unsigned requests"""
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes, Nagle would hold the body back on a keep-alive connection
+    disable_nagle_algorithm = True
+    requests = 0
+    connections = set()
+
+    def _answer(self, data):
+        FakeNeptuneHandler.requests += 1
+        FakeNeptuneHandler.connections.add(self.client_address)
+        if not self.headers.get('Authorization', '').startswith('AWS4-HMAC-SHA256 '):
+            status, data = 403, {'code': 'AccessDeniedException', 'detailedMessage': 'Missing Authentication Token'}
+        else:
+            status = 200
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._answer({'status': 'healthy', 'role': 'writer'})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self._answer({'requestId': 'fake', 'result': {'data': [request.get('gremlin')]}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fake_demo(requests=50):
+    """Per-request setup (what connect_to_neptune did) vs the long-lived client, against the fake endpoint"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeNeptuneHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    session = boto3.Session(aws_access_key_id='AKIDEXAMPLE', aws_secret_access_key='secret', region_name='us-east-1')
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        client = NeptuneClient(url, session=boto3.Session(aws_access_key_id='AKIDEXAMPLE',
+                                                          aws_secret_access_key='secret', region_name='us-east-1'))
+        client.status()
+        client.close()
+    per_request = (time.perf_counter() - start) / requests * 1000
+    connections = len(FakeNeptuneHandler.connections)
+
+    client = NeptuneClient(url, session=session)
+    print(f'warm_up: {client.warm_up()}')
+    FakeNeptuneHandler.connections = set()
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.status()
+    long_lived = (time.perf_counter() - start) / requests * 1000
+    print(f'new client per request: {per_request:7.2f} ms/request, {connections} connections')
+    print(f'long-lived client:      {long_lived:7.2f} ms/request, {len(FakeNeptuneHandler.connections)} connections')
+    print(f'gremlin: {client.gremlin("g.V().count()")["result"]}')
+    client.close()
+    server.shutdown()
 
-    # Retrieve the Neptune URL from the environment variable
-    neptune_url = os.getenv('NEPTUNE_URL', 'default_neptune_url_if_not_provided')
 
-    # Create an AWS request
-    request = AWSRequest(method="GET", url=neptune_url)
+def main():
+    parser = argparse.ArgumentParser(description='Neptune client of the pod')
+    parser.add_argument('--fake', action='store_true', help='run against a local fake endpoint')
+    parser.add_argument('--serve', action='store_true', help='serve the probe endpoints instead of printing /status')
+    parser.add_argument('--port', type=int, default=80)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
-    # Create an endpoint using the session
-    creator = EndpointCreator(session.get_component('event_emitter'), region_name="your-region")
-    endpoint = creator.create_endpoint(service_model=session.get_service_model('neptune'), region_name=session.region_name)
+    if args.fake:
+        fake_demo()
+    elif args.serve:
+        serve(get_client(), args.port)
+    else:
+        connect_to_neptune()
 
-    # Send the request
-    response = endpoint.make_request(request)
-    print(response.text)
 
 if __name__ == '__main__':
-    connect_to_neptune()
+    main()
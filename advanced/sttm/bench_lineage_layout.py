@@ -0,0 +1,111 @@
+"""
+Benchmark of the hierarchical layouts of sttm-visual.py: the per-renderer layer assignments they used before
+lineage_layout (kept below for the comparison) against longest_path_layers.
+
+The lineage graph is synthetic: tables in schemas, every table fed by a few tables created shortly before it,
+so paths are long, like warehouse staging -> core -> mart chains. The legacy functions are only timed up to
+--legacy-max-nodes, they grow with roots x nodes.
+
+    python bench_lineage_layout.py --nodes 500 5000 20000
+"""
+import argparse
+import random
+import time
+
+import networkx as nx
+
+from lineage_layout import layered_positions, longest_path_layers
+
+
+def synthetic_lineage(nodes=20000, sources_per_table=2, window=300, cycles=0, seed=42):
+    """
+    Lineage DAG of `nodes` tables, plus `cycles` back edges
+
+    Returns:
+        nx.DiGraph
+    """
+    rng = random.Random(seed)
+    names = [f'DW{i % 4}.SCHEMA{i % 10}.TABLE_{i}' for i in range(nodes)]
+    G = nx.DiGraph()
+    G.add_nodes_from(names)
+    for i in range(nodes // 10, nodes):
+        for _ in range(sources_per_table):
+            G.add_edge(names[rng.randrange(max(0, i - window), i)], names[i])
+    for _ in range(cycles):
+        i = rng.randrange(nodes // 10 + 1, nodes)
+        G.add_edge(names[i], names[rng.randrange(max(0, i - window), i)])
+    return G
+
+
+def legacy_hierarchy_levels(G):
+    """create_static_graph before: max over the roots of the shortest path length to every node"""
+    roots = [n for n in G.nodes() if G.in_degree(n) == 0]
+    levels = {}
+    for node in G.nodes():
+        max_level = 0
+        for root in roots:
+            try:
+                path_length = len(nx.shortest_path(G, root, node)) - 1
+                max_level = max(max_level, path_length)
+            except nx.NetworkXNoPath:
+                continue
+        levels[node] = max_level
+    return levels
+
+
+def legacy_horizontal_layers(G):
+    """create_static_graph3 before: longest path over nx.topological_sort, fails on cycles"""
+    layers = {}
+    sources = [n for n in G.nodes() if G.in_degree(n) == 0]
+    for node in nx.topological_sort(G):
+        if node in sources:
+            layers[node] = 0
+        else:
+            predecessors = list(G.predecessors(node))
+            layers[node] = max(layers[parent] for parent in predecessors) + 1
+    return layers
+
+
+def legacy_assign_layers(G):
+    """create_static_graph2 before: BFS from every source, shortest_path_length and has_path per node"""
+    layers = {}
+    sources = [n for n in G.nodes() if G.in_degree(n) == 0]
+    for source in sources:
+        for node in nx.bfs_tree(G, source):
+            dist = max([nx.shortest_path_length(G, s, node)
+                        for s in sources if nx.has_path(G, s, node)])
+            layers[node] = dist
+    return layers
+
+
+def timed(run, G):
+    start = time.perf_counter()
+    run(G)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hierarchical layout of a lineage graph, legacy vs O(V + E)')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[500, 5000, 20000])
+    parser.add_argument('--legacy-max-nodes', type=int, default=500)
+    parser.add_argument('--cycles', type=int, default=50, help='back edges in the cyclic run')
+    args = parser.parse_args()
+
+    for nodes in args.nodes:
+        G = synthetic_lineage(nodes)
+        print(f'{G.number_of_nodes()} tables, {G.number_of_edges()} mappings, '
+              f'{max(longest_path_layers(G).values()) + 1} layers')
+        if nodes <= args.legacy_max_nodes:
+            for name, run in (('create_static_graph  get_hierarchy_pos', legacy_hierarchy_levels),
+                              ('create_static_graph2 assign_layers', legacy_assign_layers),
+                              ('create_static_graph3 assign_horizontal_layers', legacy_horizontal_layers)):
+                print(f'  {name:48} {timed(run, G):9.3f} s')
+        print(f"  {'longest_path_layers':48} {timed(longest_path_layers, G):9.3f} s")
+        print(f"  {'layered_positions':48} {timed(layered_positions, G):9.3f} s")
+
+        cyclic = synthetic_lineage(nodes, cycles=args.cycles)
+        print(f"  {f'longest_path_layers, {args.cycles} back edges':48} {timed(longest_path_layers, cyclic):9.3f} s")
+
+
+if __name__ == '__main__':
+    main()
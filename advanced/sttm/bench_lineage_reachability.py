@@ -0,0 +1,73 @@
+"""
+Query latency of lineage_reachability.ReachabilityIndex against networkx traversals of the same graph
+(nx.descendants / nx.ancestors / nx.has_path, what a mappings.csv loaded into a DiGraph answers with).
+
+    python bench_lineage_reachability.py --nodes 20000 --queries 1000
+"""
+import argparse
+import random
+import time
+
+import networkx as nx
+
+from bench_lineage_layout import synthetic_lineage
+from lineage_reachability import ReachabilityIndex
+
+
+def per_query(run, queries):
+    """
+    Mean latency of run(source, target) over the queries
+
+    Returns:
+        float: microseconds per query
+    """
+    start = time.perf_counter()
+    for source, target in queries:
+        run(source, target)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reachability index vs networkx traversals')
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--cycles', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--added', type=int, default=1000, help='mappings added incrementally')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    G = synthetic_lineage(args.nodes, cycles=args.cycles)
+    edges = list(G.edges())
+    rng.shuffle(edges)
+    base, added = edges[args.added:], edges[:args.added]
+
+    start = time.perf_counter()
+    index = ReachabilityIndex.from_edges(base)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for source, target in added:
+        index.add_edge(source, target)
+    incremental = (time.perf_counter() - start) / len(added) * 1e6
+    print(f'{G.number_of_nodes()} tables, {G.number_of_edges()} mappings, {len(index.members)} components')
+    print(f'build {build:.2f} s, add_edge {incremental:,.0f} us per mapping')
+    start = time.perf_counter()
+    ReachabilityIndex.from_edges(base).add_edges(added)
+    print(f'build + add_edges of the {len(added)} mappings in one batch {time.perf_counter() - start:.2f} s')
+
+    nodes = list(G)
+    queries = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(args.queries)]
+    for source, target in queries[:100]:
+        assert index.downstream(source) == nx.descendants(G, source) - {source}
+        assert index.upstream(target) == nx.ancestors(G, target) - {target}
+        assert index.is_reachable(source, target) == nx.has_path(G, source, target)
+
+    for name, indexed, traversal in (
+            ('is_reachable', index.is_reachable, lambda source, target: nx.has_path(G, source, target)),
+            ('downstream', lambda source, _: index.downstream(source), lambda source, _: nx.descendants(G, source)),
+            ('upstream', lambda _, target: index.upstream(target), lambda _, target: nx.ancestors(G, target))):
+        fast, slow = per_query(indexed, queries), per_query(traversal, queries)
+        print(f'{name:13} index {fast:10,.1f} us   networkx {slow:10,.1f} us   ({slow / fast:,.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Micro-benchmark for SQLLineageParser on a synthetic query log.
+
+The log mixes INSERT ... SELECT with joins, CREATE OR REPLACE TABLE ... AS, MERGE, UPDATE, CTEs and DELETE,
+generated from a fixed number of statement templates with different literals (like production logs),
+wrapped in timestamp/INFO/"Query completed" log lines.
+
+    python bench_sql_lineage.py --statements 20000
+"""
+import argparse
+import random
+import re
+import time
+from functools import partial
+
+import sqlparse
+
+from sttm_from_sql_logs import SQLLineageParser
+
+STATEMENT_SPLIT = r';|\n\n(?=(?:SELECT|INSERT|UPDATE|CREATE|MERGE))'
+
+TEMPLATES = [
+    "INSERT INTO {t0} SELECT a.id, a.amount, b.name FROM {t1} a JOIN {t2} b ON a.id = b.id "
+    "WHERE a.load_date > '{date}' AND a.amount > {number}",
+    "CREATE OR REPLACE TABLE {t0} AS SELECT id, SUM(amount) AS total FROM {t1} WHERE region = '{word}' GROUP BY id",
+    "MERGE INTO {t0} t USING {t1} s ON t.id = s.id WHEN MATCHED THEN UPDATE SET t.amount = s.amount "
+    "WHEN NOT MATCHED THEN INSERT (id, amount) VALUES (s.id, s.amount)",
+    "UPDATE {t0} SET status = '{word}' FROM {t1} s WHERE {t0}.id = s.id AND s.batch = {number}",
+    "WITH recent AS (SELECT id, amount FROM {t1} WHERE load_date >= '{date}') "
+    "INSERT INTO {t0} SELECT r.id, r.amount, c.code FROM recent r LEFT JOIN {t2} c ON r.id = c.id",
+    "DELETE FROM {t0} WHERE load_date < '{date}'",
+]
+
+
+def synthetic_log(statements=20000, tables=500, templates=2000, seed=42):
+    """
+    Query log text with `statements` statements built from `templates` distinct statement shapes
+
+    Returns:
+        str: log text
+    """
+    rng = random.Random(seed)
+    names = [f'DW{i % 4}.SCHEMA{i % 10}.TABLE_{i}' for i in range(tables)]
+    shapes = [(rng.choice(TEMPLATES), rng.sample(names, 3)) for _ in range(templates)]
+    lines = []
+    for n in range(statements):
+        template, (t0, t1, t2) = rng.choice(shapes)
+        sql = template.format(t0=t0, t1=t1, t2=t2, date=f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                              number=rng.randint(0, 100000), word=rng.choice(['EU', 'US', 'APAC', 'OPEN', 'DONE']))
+        lines.append(f'2024-03-01 10:{n // 60 % 60:02d}:{n % 60:02d} INFO: Running query: {sql};\n'
+                     f'Query completed\nAffected rows: {rng.randint(0, 5000)}\n\n')
+    return ''.join(lines)
+
+
+class LegacySQLLineageParser(SQLLineageParser):
+    """
+    The parser before the log patterns were compiled: one re.sub per pattern (with the original, partly glued,
+    pattern list), format-string regexes and a sqlparse.parse() per statement. Kept for the comparison only.
+    """
+
+    legacy_log_patterns = [
+        r'^Created\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)'
+        r'^Populated\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)'
+        r'^\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',
+        r'Running query:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',
+        r'INFO:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',
+        r'DEBUG:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',
+        r'Query completed.*$',
+        r'Affected rows:.*$',
+        r'Execution time:.*$'
+    ]
+
+    def clean_sql_statement(self, sql):
+        cleaned_sql = sql.strip()
+        for pattern in self.legacy_log_patterns:
+            cleaned_sql = re.sub(pattern, '', cleaned_sql, flags=re.IGNORECASE | re.MULTILINE)
+        sql_lines = []
+        for line in cleaned_sql.split(';'):
+            line = line.strip()
+            if (re.match(
+                    r'^(SELECT|INSERT|UPDATE|CREATE|MERGE|FROM|JOIN|WHERE|GROUP|ORDER|HAVING|WITH|AND|OR|UNION|INTO|AS|\()',
+                    line, re.IGNORECASE) or
+                    re.match(r'^\s*[A-Za-z0-9_\.\(\)]', line)):
+                sql_lines.append(line)
+        return ' '.join(sql_lines)
+
+    def extract_table_names(self, sql):
+        sql = self.clean_sql_statement(sql)
+        sql = ' '.join(sql.split()).upper()
+        table_pattern = r'(?:[\w]+\.){0,3}[\w]+(?=\s|$|\))'
+        function_pattern = r'\b(COUNT|SUM|AVG|MAX|MIN|COALESCE|CASE|WHEN|THEN|END|AND|OR|IN|EXISTS|BETWEEN)\b'
+        sources = set()
+        targets = set()
+        try:
+            parsed = sqlparse.parse(sql)[0]
+            if parsed.get_type() == 'DELETE':
+                return [], []
+            if self.check_keywords(sql, ['INSERT', 'UPDATE', 'MERGE']):
+                target_match = re.search(f"(?:INTO|UPDATE|MERGE INTO)\\s+({table_pattern})", sql)
+                if target_match and not re.match(function_pattern, target_match.group(1)):
+                    targets.add(target_match.group(1))
+            elif self.check_keywords(sql, ['CREATE', 'REPLACE']):
+                target_match = re.search(f"(?:CREATE|REPLACE)\\s+(VIEW|TABLE)\\s+((?:[\\w]+\\.){0,3}[\\w]+)", sql)
+                if target_match and not re.match(function_pattern, target_match.group(1)):
+                    targets.add(target_match.group(1))
+            for match in re.finditer(r'FROM\s+({})'.format(table_pattern), sql):
+                if not re.match(function_pattern, match.group(1)):
+                    sources.add(match.group(1))
+            for match in re.finditer(r'JOIN\s+({})'.format(table_pattern), sql):
+                if not re.match(function_pattern, match.group(1)):
+                    sources.add(match.group(1))
+            cte_names = set(re.findall(r'WITH\s+(\w+)\s+AS\s*\(', sql))
+            sources = {table for table in sources if table not in cte_names}
+        except Exception:
+            return [], []
+        return list(sources), list(targets)
+
+
+def bench(run, statements, repeat=3):
+    """
+    Best of `repeat` calls of run(statements)
+
+    Returns:
+        float: statements per second
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(statements)
+        best = min(best, time.perf_counter() - start)
+    return len(statements) / best
+
+
+def extract_all(parser):
+    """Run parser.extract_table_names over the statements"""
+    def run(statements):
+        for stmt in statements:
+            parser.extract_table_names(stmt)
+    return run
+
+
+def extract_all_cached(statements, column_lineage=False):
+    """cached_extract with a fresh parser, so every run parses the first statement of each template"""
+    lineage = SQLLineageParser(column_lineage=column_lineage)
+    for stmt in statements:
+        lineage.cached_extract(stmt)
+    return lineage.cache_stats()
+
+
+def extract_all_columns(statements):
+    """Column-level lineage of every statement, no cache"""
+    lineage = SQLLineageParser(cache_size=0, column_lineage=True)
+    for stmt in statements:
+        lineage.extract_column_mappings(stmt)
+    return lineage.column_lineage.unresolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statements per second of SQLLineageParser.extract_table_names')
+    parser.add_argument('--statements', type=int, default=20000)
+    parser.add_argument('--templates', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    log = synthetic_log(args.statements, templates=args.templates)
+    statements = [stmt for stmt in re.split(STATEMENT_SPLIT, log) if stmt.strip()]
+    print(f'{len(statements)} statements, {len(log) / 1e6:.1f} MB')
+
+    legacy = bench(extract_all(LegacySQLLineageParser()), statements, args.repeat)
+    print(f'legacy (re.sub per pattern, sqlparse.parse): {legacy:12,.0f} statements/s')
+    compiled = bench(extract_all(SQLLineageParser()), statements, args.repeat)
+    print(f'compiled single-pass cleaner:                {compiled:12,.0f} statements/s  ({compiled / legacy:.1f}x)')
+    cached = bench(extract_all_cached, statements, args.repeat)
+    stats = extract_all_cached(statements)
+    print(f"fingerprint parse cache:                     {cached:12,.0f} statements/s  ({cached / legacy:.1f}x), "
+          f"hit rate {stats['hit_rate']:.1%}")
+
+    columns = bench(extract_all_columns, statements, args.repeat)
+    print(f'column lineage (sqlparse token tree):        {columns:12,.0f} statements/s, '
+          f'{extract_all_columns(statements)} unresolved column references')
+    cached_columns = bench(partial(extract_all_cached, column_lineage=True), statements, args.repeat)
+    print(f'column + table lineage, parse cache:         {cached_columns:12,.0f} statements/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+"""
+Column-level source to target mappings from the sqlparse token tree.
+
+    ColumnLineageExtractor().extract(
+        'INSERT INTO dw.t (id, total) SELECT a.id, SUM(b.amount) FROM dw.a a JOIN dw.b b ON a.id = b.id')
+    -> [('DW.T', 'ID', 'DW.A', 'ID'), ('DW.T', 'TOTAL', 'DW.B', 'AMOUNT')]
+
+Mappings are (target table, target column, source table, source column), names upper-cased.
+- table aliases, CTEs and subqueries in FROM: the output columns of a CTE/subquery are resolved down to the
+  base tables they come from, so lineage goes through any number of them
+- INSERT ... SELECT with a column list is matched by position, without one by the select output names,
+  CREATE TABLE/VIEW ... AS SELECT by the output names, UNION branches by position
+- MERGE ... WHEN MATCHED THEN UPDATE SET / WHEN NOT MATCHED THEN INSERT (...) VALUES (...) and UPDATE ... SET ... FROM
+- an unqualified column is resolved when the FROM clause has a single source, or when exactly one CTE/subquery
+  has a column of that name; otherwise it is counted in `unresolved` rather than guessed
+- SELECT * (and t.*) maps to a '*' column, unless it comes from a CTE/subquery whose columns are known
+"""
+import sqlparse
+from sqlparse import sql as S
+from sqlparse import tokens as T
+
+SET_OPERATORS = {'UNION', 'UNION ALL', 'UNION DISTINCT', 'INTERSECT', 'EXCEPT', 'MINUS'}
+# Clauses ending the FROM clause of a query
+FROM_END = {'GROUP BY', 'ORDER BY', 'HAVING', 'LIMIT', 'QUALIFY', 'WINDOW', 'OFFSET', 'FETCH'} | SET_OPERATORS
+
+
+def _significant(tokens):
+    return [token for token in tokens if not token.is_whitespace and token.ttype not in T.Comment
+            and not isinstance(token, S.Comment)]
+
+
+def _clean(name):
+    return name.strip('"`[]').upper()
+
+
+def _keyword(token):
+    """Normalized keyword ('LEFT JOIN', 'GROUP BY', ...) or None"""
+    if token.ttype in T.Keyword:
+        return token.normalized
+    return None
+
+
+def _dotted_name(token):
+    """['DB', 'T'] for db.t or "db"."t", an alias after the name is ignored. None when token is not a plain name"""
+    if token.ttype in T.Name or token.ttype is T.Wildcard:
+        return [_clean(token.value)]
+    if not isinstance(token, S.Identifier):
+        return None
+    parts = []
+    expect_name = True
+    for child in token.tokens:
+        if expect_name and (child.ttype in T.Name or child.ttype in T.Literal.String.Symbol or
+                            child.ttype is T.Wildcard or (child.ttype in T.Keyword and child.ttype not in T.DML)):
+            parts.append(_clean(child.value))
+            expect_name = False
+        elif not expect_name and child.ttype is T.Punctuation and child.value == '.':
+            expect_name = True
+        else:
+            break
+    if not parts or expect_name:
+        return None
+    return parts
+
+
+def _split_commas(tokens):
+    """Token lists between top level commas, an IdentifierList is split into its items"""
+    tokens = _significant(tokens)
+    if len(tokens) == 1 and isinstance(tokens[0], S.IdentifierList):
+        tokens = _significant(tokens[0].tokens)
+    items = [[]]
+    for token in tokens:
+        if token.ttype is T.Punctuation and token.value == ',':
+            items.append([])
+        else:
+            items[-1].append(token)
+    return [item for item in items if item]
+
+
+def _inner(parenthesis):
+    return parenthesis.tokens[1:-1]
+
+
+def _is_query(token):
+    return isinstance(token, S.Parenthesis) and any(
+        child.ttype is T.DML and child.normalized == 'SELECT' or child.ttype is T.Keyword.CTE
+        for child in _significant(_inner(token)))
+
+
+def _target_name(token):
+    """Table name and optional column list of an INSERT/CREATE/MERGE target: db.t, db.t (a, b), db.t alias"""
+    text = str(token).strip()
+    columns = None
+    if '(' in text:
+        text, column_text = text.split('(', 1)
+        columns = [_clean(column.split()[0]) for column in column_text.rsplit(')', 1)[0].split(',') if column.strip()]
+    name = text.split()[0] if text.split() else ''
+    return '.'.join(_clean(part) for part in name.split('.')), columns
+
+
+class Scope:
+    """Sources visible to a query: alias/name -> base table name (str) or derived table outputs (list)"""
+
+    def __init__(self, ctes, extractor):
+        self.ctes = ctes
+        self.extractor = extractor
+        self.sources = []
+        self.names = {}
+
+    def add(self, source, *names):
+        self.sources.append(source)
+        for name in names:
+            if name:
+                self.names[name] = source
+
+    def add_table(self, name, alias=None):
+        if '.' not in name and name in self.ctes:
+            self.add(self.ctes[name], alias or name)
+        else:
+            self.add(name, alias, name, name.split('.')[-1])
+
+    def resolve(self, parts):
+        """(table, column) pairs a column reference comes from"""
+        column = parts[-1]
+        if len(parts) > 1:
+            source = self.names.get('.'.join(parts[:-1]))
+            if source is None:
+                self.extractor.unresolved += 1
+                return set()
+            return self._lookup(source, column)
+        if len(self.sources) == 1:
+            return self._lookup(self.sources[0], column)
+        derived = [source for source in self.sources if not isinstance(source, str) and
+                   any(name == column for name, _ in source)]
+        tables = [source for source in self.sources if isinstance(source, str)]
+        if len(derived) == 1:
+            return self._lookup(derived[0], column)
+        if not derived and len(tables) == 1:
+            return {(tables[0], column)}
+        self.extractor.unresolved += 1
+        return set()
+
+    @staticmethod
+    def _lookup(source, column):
+        if isinstance(source, str):
+            return {(source, column)}
+        for name, columns in source:
+            if name == column:
+                return set(columns)
+        # a column of a derived table selecting t.*
+        return {(table, column) for name, columns in source if name == '*' for table, _ in columns}
+
+    def star(self, parts=None):
+        """Outputs of * or t.*"""
+        if parts and len(parts) > 1:
+            sources = [self.names.get('.'.join(parts[:-1]))]
+        else:
+            sources = self.sources
+        outputs = []
+        for source in sources:
+            if source is None:
+                continue
+            if isinstance(source, str):
+                outputs.append(('*', {(source, '*')}))
+            else:
+                outputs.extend(source)
+        return outputs
+
+
+class ColumnLineageExtractor:
+    def __init__(self):
+        # column references that could not be tied to a table
+        self.unresolved = 0
+
+    def extract(self, sql):
+        """
+        Column mappings of one statement
+
+        Args:
+            sql (str): SQL statement without log text
+        Returns:
+            list: sorted (target_table, target_column, source_table, source_column) tuples
+        """
+        statements = sqlparse.parse(sql)
+        if not statements:
+            return []
+        tokens = _significant(statements[0].tokens)
+        # a trailing ';' would otherwise end up in the last SET assignment or VALUES item
+        while tokens and tokens[-1].ttype is T.Punctuation and tokens[-1].value == ';':
+            tokens.pop()
+        ctes = {}
+        if tokens and tokens[0].ttype is T.Keyword.CTE:
+            tokens = tokens[self._read_ctes(tokens, 1, ctes):]
+        if not tokens:
+            return []
+        kind = tokens[0].normalized if tokens[0].ttype in (T.DML, T.DDL) else None
+        mappings = set()
+        if kind == 'INSERT':
+            self._insert(tokens, ctes, mappings)
+        elif kind and kind.startswith('CREATE'):
+            self._create(tokens, ctes, mappings)
+        elif kind == 'MERGE':
+            self._merge(tokens, ctes, mappings)
+        elif kind == 'UPDATE':
+            self._update(tokens, ctes, mappings)
+        return sorted(mappings)
+
+    # queries
+
+    def _read_ctes(self, tokens, i, ctes):
+        """Read the CTE definitions after WITH into ctes, returns the index of the statement after them"""
+        while i < len(tokens) and _keyword(tokens[i]) == 'RECURSIVE':
+            i += 1
+        if i >= len(tokens):
+            return i
+        definitions = tokens[i].get_identifiers() if isinstance(tokens[i], S.IdentifierList) else [tokens[i]]
+        for definition in definitions:
+            if not isinstance(definition, S.Identifier):
+                continue
+            query = next((child for child in definition.tokens if _is_query(child)), None)
+            if query is not None:
+                ctes[_clean(definition.get_real_name() or definition.get_name())] = self._query(_inner(query), ctes)
+        return i + 1
+
+    def _query(self, tokens, ctes):
+        """Output columns of a query: [(name, {(table, column)})]"""
+        tokens = _significant(tokens)
+        ctes = dict(ctes)
+        if tokens and tokens[0].ttype is T.Keyword.CTE:
+            tokens = tokens[self._read_ctes(tokens, 1, ctes):]
+        branches = [[]]
+        for token in tokens:
+            if _keyword(token) in SET_OPERATORS:
+                branches.append([])
+            else:
+                branches[-1].append(token)
+        outputs = None
+        for branch in branches:
+            if len(branch) == 1 and _is_query(branch[0]):
+                branch_outputs = self._query(_inner(branch[0]), ctes)
+            else:
+                branch_outputs = self._select(branch, ctes)
+            if outputs is None:
+                outputs = branch_outputs
+            else:
+                # UNION branches line up by position, the names come from the first one
+                outputs = [(name, columns | other) for (name, columns), (_, other) in zip(outputs, branch_outputs)]
+        return outputs or []
+
+    def _select(self, tokens, ctes):
+        start = next((i for i, token in enumerate(tokens) if token.ttype is T.DML and token.normalized == 'SELECT'),
+                     None)
+        if start is None:
+            return []
+        end = next((i for i, token in enumerate(tokens) if i > start and _keyword(token) == 'FROM'), len(tokens))
+        scope = Scope(ctes, self)
+        if end < len(tokens):
+            self._from(tokens[end + 1:], scope)
+        items = tokens[start + 1:end]
+        while items and _keyword(items[0]) in ('DISTINCT', 'ALL', 'TOP'):
+            items = items[2:] if _keyword(items[0]) == 'TOP' else items[1:]
+        return self._select_items(items, scope)
+
+    def _from(self, tokens, scope):
+        """Register the tables, CTEs and subqueries of a FROM clause, join conditions are skipped"""
+        in_condition = False
+        for token in tokens:
+            keyword = _keyword(token)
+            if isinstance(token, S.Where) or keyword in FROM_END:
+                break
+            if keyword and 'JOIN' in keyword or token.ttype is T.Punctuation and token.value == ',':
+                in_condition = False
+            elif keyword in ('ON', 'USING'):
+                in_condition = True
+            elif not in_condition:
+                if isinstance(token, S.IdentifierList):
+                    for item in token.get_identifiers():
+                        self._from_item(item, scope)
+                else:
+                    self._from_item(token, scope)
+
+    def _from_item(self, token, scope):
+        if isinstance(token, S.Identifier):
+            first = _significant(token.tokens)[0]
+            if _is_query(first):
+                alias = token.get_alias()
+                scope.add(self._query(_inner(first), scope.ctes), _clean(alias) if alias else None)
+                return
+            parts = _dotted_name(token)
+            if parts:
+                alias = token.get_alias()
+                scope.add_table('.'.join(parts), _clean(alias) if alias else None)
+        elif token.ttype in T.Name:
+            scope.add_table(_clean(token.value))
+        elif _is_query(token):
+            scope.add(self._query(_inner(token), scope.ctes))
+
+    def _select_items(self, items, scope):
+        outputs = []
+        for item in _split_commas(items):
+            if len(item) == 1:
+                token = item[0]
+                parts = _dotted_name(token)
+                if parts and parts[-1] == '*':
+                    outputs.extend(scope.star(parts))
+                    continue
+                alias = token.get_alias() if isinstance(token, S.Identifier) else None
+                if alias:
+                    name = _clean(alias)
+                elif parts:
+                    name = parts[-1]
+                else:
+                    name = _clean(' '.join(str(token).split()))
+            else:
+                # not grouped by sqlparse: expression [AS] alias
+                name = _clean(str(item[-1])) if len(item) > 1 and _dotted_name(item[-1]) else \
+                    _clean(' '.join(str(token) for token in item))
+            outputs.append((name, self._sources(item, scope)))
+        return outputs
+
+    def _sources(self, tokens, scope):
+        """(table, column) pairs referenced by an expression"""
+        sources = set()
+        for token in tokens:
+            self._collect(token, scope, sources)
+        return sources
+
+    def _collect(self, token, scope, sources):
+        if _is_query(token):
+            # scalar subquery
+            for _, columns in self._query(_inner(token), scope.ctes):
+                sources |= columns
+            return
+        parts = _dotted_name(token)
+        if parts is not None:
+            if parts[-1] != '*':
+                sources |= scope.resolve(parts)
+            return
+        if isinstance(token, S.Identifier):
+            # expression with an alias: SUM(x) AS total
+            self._collect(_significant(token.tokens)[0], scope, sources)
+        elif isinstance(token, S.Function):
+            # skip the function name
+            for child in _significant(token.tokens)[1:]:
+                self._collect(child, scope, sources)
+        elif token.is_group:
+            for child in _significant(token.tokens):
+                self._collect(child, scope, sources)
+
+    # statements
+
+    @staticmethod
+    def _map(target, columns, outputs, mappings):
+        if columns:
+            pairs = zip(columns, outputs)
+        else:
+            pairs = ((name, (name, sources)) for name, sources in outputs)
+        for target_column, (_, sources) in pairs:
+            for table, column in sources:
+                mappings.add((target, target_column, table, column))
+
+    def _insert(self, tokens, ctes, mappings):
+        i = 1
+        while i < len(tokens) and _keyword(tokens[i]) in ('INTO', 'OVERWRITE', 'TABLE'):
+            i += 1
+        if i >= len(tokens):
+            return
+        target, columns = _target_name(tokens[i])
+        i += 1
+        if i < len(tokens) and isinstance(tokens[i], S.Parenthesis) and not _is_query(tokens[i]):
+            columns = [_dotted_name(item[0])[-1] for item in _split_commas(_inner(tokens[i])) if _dotted_name(item[0])]
+            i += 1
+        self._map(target, columns, self._query(tokens[i:], ctes), mappings)
+
+    def _create(self, tokens, ctes, mappings):
+        i = next((i for i, token in enumerate(tokens) if _keyword(token) in ('TABLE', 'VIEW', 'MATERIALIZED VIEW')),
+                 None)
+        if i is None:
+            return
+        i += 1
+        while i < len(tokens) and _keyword(tokens[i]) in ('IF', 'NOT', 'EXISTS', 'IF NOT EXISTS'):
+            i += 1
+        if i >= len(tokens):
+            return
+        target, columns = _target_name(tokens[i])
+        query = next((j for j in range(i + 1, len(tokens)) if _keyword(tokens[j]) == 'AS'), None)
+        if query is None:
+            # sqlparse may group "name AS (query)" into one identifier
+            children = tokens[i].tokens if tokens[i].is_group else []
+            inner = next((child for child in children if _is_query(child)), None)
+            if inner is not None:
+                self._map(target, None, self._query(_inner(inner), ctes), mappings)
+            return
+        self._map(target, columns, self._query(tokens[query + 1:], ctes), mappings)
+
+    def _assignments(self, tokens, target, scope, mappings):
+        """SET a = expr, ... : target column a comes from the columns of expr (the target's own are left out)"""
+        for item in _split_commas(tokens):
+            comparison = item[0] if len(item) == 1 and isinstance(item[0], S.Comparison) else None
+            if comparison is None:
+                continue
+            children = _significant(comparison.tokens)
+            equals = next((i for i, child in enumerate(children) if child.value == '='), None)
+            parts = _dotted_name(children[0]) if equals else None
+            if not parts:
+                continue
+            for table, column in self._sources(children[equals + 1:], scope):
+                if table != target:
+                    mappings.add((target, parts[-1], table, column))
+
+    def _merge(self, tokens, ctes, mappings):
+        i = next((i for i, token in enumerate(tokens) if _keyword(token) == 'INTO'), None)
+        using = next((i for i, token in enumerate(tokens) if _keyword(token) == 'USING'), None)
+        if i is None or using is None or using + 1 >= len(tokens):
+            return
+        target, _ = _target_name(tokens[i + 1])
+        scope = Scope(ctes, self)
+        target_alias = tokens[i + 1].get_alias() if isinstance(tokens[i + 1], S.Identifier) else None
+        scope.add_table(target, _clean(target_alias) if target_alias else None)
+        # the USING table or subquery is read like a FROM clause, up to ON
+        on = next((k for k in range(using + 1, len(tokens)) if _keyword(tokens[k]) == 'ON'), len(tokens))
+        self._from(tokens[using + 1:on], scope)
+
+        j = on
+        while j < len(tokens):
+            token = tokens[j]
+            if token.ttype is T.DML and token.normalized == 'UPDATE' and j + 2 < len(tokens) \
+                    and _keyword(tokens[j + 1]) == 'SET':
+                end = next((k for k in range(j + 2, len(tokens)) if _keyword(tokens[k]) == 'WHEN'), len(tokens))
+                self._assignments(tokens[j + 2:end], target, scope, mappings)
+                j = end
+            elif token.ttype is T.DML and token.normalized == 'INSERT' and j + 2 < len(tokens) \
+                    and isinstance(tokens[j + 1], S.Parenthesis) and isinstance(tokens[j + 2], S.Values):
+                columns = [_dotted_name(item[0])[-1] for item in _split_commas(_inner(tokens[j + 1]))
+                           if _dotted_name(item[0])]
+                values = next((child for child in tokens[j + 2].tokens if isinstance(child, S.Parenthesis)), None)
+                if values is not None:
+                    for column, item in zip(columns, _split_commas(_inner(values))):
+                        for table, source_column in self._sources(item, scope):
+                            if table != target:
+                                mappings.add((target, column, table, source_column))
+                j += 3
+            else:
+                j += 1
+
+    def _update(self, tokens, ctes, mappings):
+        if len(tokens) < 3:
+            return
+        target, _ = _target_name(tokens[1])
+        scope = Scope(ctes, self)
+        target_alias = tokens[1].get_alias() if isinstance(tokens[1], S.Identifier) else None
+        scope.add_table(target, _clean(target_alias) if target_alias else None)
+        set_at = next((i for i, token in enumerate(tokens) if _keyword(token) == 'SET'), None)
+        if set_at is None:
+            return
+        end = next((i for i, token in enumerate(tokens) if i > set_at and
+                    (_keyword(token) == 'FROM' or isinstance(token, S.Where))), len(tokens))
+        if end < len(tokens) and _keyword(tokens[end]) == 'FROM':
+            self._from(tokens[end + 1:], scope)
+        self._assignments(tokens[set_at + 1:end], target, scope, mappings)
@@ -0,0 +1,296 @@
+"""
+Compact lineage graph: CSR (out-edges) and CSC (in-edges) adjacency in NumPy arrays.
+
+Table names are interned to ids 0..n-1 (order of first appearance). The out-neighbors of node i are
+indices[indptr[i]:indptr[i + 1]], the in-neighbors in_indices[in_indptr[i]:in_indptr[i + 1]], so an edge costs
+two int32 plus its int64 weight instead of the nested dicts of an nx.DiGraph (hundreds of bytes per edge).
+Degrees, BFS and topological generations run frontier by frontier on whole arrays.
+
+    graph = LineageCSR.from_edge_store(parser.edges)     # or .from_dataframe(df, 'source', 'target', 'count')
+    distance = graph.bfs([graph.id('DW1.SALES.ORDERS')], hops=3)
+    graph.save('lineage_csr')                             # LineageCSR.load('lineage_csr', mmap=True)
+"""
+import json
+import os
+from bisect import bisect_left
+
+import networkx as nx
+import numpy as np
+
+from lineage_reachability import strongly_connected_components
+
+ARRAYS = ('indptr', 'indices', 'weights', 'in_indptr', 'in_indices')
+
+
+def _csr(keys, values, count):
+    """indptr and the values ordered by key (a stable sort, so ties keep their order)"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=count), out=indptr[1:])
+    return indptr, order, values[order]
+
+
+def _gather(indptr, indices, nodes):
+    """Concatenated neighbor lists of nodes, without a Python loop"""
+    starts, ends = indptr[nodes], indptr[nodes + 1]
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return indices[:0]
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return indices[offsets + np.arange(total)]
+
+
+class LineageCSR:
+    def __init__(self, names, indptr, indices, weights, in_indptr, in_indices):
+        """Use the from_* constructors, or load()"""
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self._ids = None
+        self._sorted_names = None
+
+    @classmethod
+    def from_arrays(cls, names, sources, targets, weights=None):
+        """
+        Graph of edges given as id arrays, duplicate edges merged with their weights summed
+
+        Args:
+            names (list): table name per id
+            sources, targets (array): ids of the edge ends
+            weights (array): weight per edge, 1 when None
+        """
+        count = len(names)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = np.ones(len(sources), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        keys, inverse = np.unique(sources * count + targets, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+        sources, targets = keys // count, (keys % count).astype(np.int32)
+        # keys are sorted by source then target, so the out-edges already are in CSR order
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+        in_indptr, _, in_indices = _csr(targets, sources.astype(np.int32), count)
+        return cls(list(names), indptr, targets, weights, in_indptr, in_indices)
+
+    @classmethod
+    def from_edge_store(cls, store):
+        """Graph of a sttm_from_sql_logs.LineageEdgeStore, weights are the occurrence counts"""
+        keys = np.frombuffer(store.keys, dtype=np.int64) if len(store.keys) else np.zeros(0, dtype=np.int64)
+        counts = np.frombuffer(store.counts, dtype=np.int64) if len(store.counts) else np.zeros(0, dtype=np.int64)
+        return cls.from_arrays(store.names, keys >> 32, keys & 0xFFFFFFFF, counts)
+
+    @classmethod
+    def from_dataframe(cls, df, source='Source Table', target='Target Table', weight=None):
+        """
+        Graph of a mapping frame, names interned with pandas.factorize in networkx order
+        (first appearance, source before target)
+        """
+        import pandas as pd
+        ends = np.column_stack([df[source].to_numpy(), df[target].to_numpy()]).ravel()
+        codes, names = pd.factorize(ends)
+        return cls.from_arrays(names.tolist(), codes[0::2], codes[1::2], df[weight].to_numpy() if weight else None)
+
+    @classmethod
+    def from_networkx(cls, G, weight='weight'):
+        names = list(G)
+        ids = {node: i for i, node in enumerate(names)}
+        count = G.number_of_edges()
+        edges = G.edges(data=weight, default=1)
+        sources = np.fromiter((ids[source] for source, _, _ in edges), dtype=np.int64, count=count)
+        targets = np.fromiter((ids[target] for _, target, _ in edges), dtype=np.int64, count=count)
+        weights = np.fromiter((value for _, _, value in edges), dtype=np.int64, count=count)
+        return cls.from_arrays(names, sources, targets, weights)
+
+    def to_networkx(self, weight='weight'):
+        """nx.DiGraph with the same node order, edge attribute `weight`"""
+        G = nx.DiGraph()
+        G.add_nodes_from(self.names)
+        sources = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        names = self.names
+        G.add_weighted_edges_from(zip(map(names.__getitem__, sources.tolist()),
+                                      map(names.__getitem__, self.indices.tolist()), self.weights.tolist()),
+                                  weight=weight)
+        return G
+
+    def edge_arrays(self):
+        """
+        Returns:
+            tuple: sources, targets (id arrays) and weights of every edge, in CSR order
+        """
+        return np.repeat(np.arange(len(self.names)), np.diff(self.indptr)), self.indices, self.weights
+
+    def subgraph(self, nodes):
+        """Graph of the given ids and the edges between them, ids renumbered in the given order"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        new_ids = np.full(len(self.names), -1, dtype=np.int64)
+        new_ids[nodes] = np.arange(len(nodes))
+        sources, targets, weights = self.edge_arrays()
+        keep = (new_ids[sources] >= 0) & (new_ids[targets] >= 0)
+        return LineageCSR.from_arrays([self.names[i] for i in nodes.tolist()], new_ids[sources[keep]],
+                                      new_ids[targets[keep]], weights[keep])
+
+    def collapse(self, nodes, name):
+        """
+        Graph with the given ids merged into one node `name`, put after the others (kept in order),
+        edges between the merged ids dropped and parallel edges summed
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        kept = np.ones(len(self.names), dtype=bool)
+        kept[nodes] = False
+        kept = np.flatnonzero(kept)
+        new_ids = np.full(len(self.names), len(kept), dtype=np.int64)
+        new_ids[kept] = np.arange(len(kept))
+        sources, targets, weights = self.edge_arrays()
+        sources, targets = new_ids[sources], new_ids[targets]
+        between = sources != targets
+        names = [self.names[i] for i in kept.tolist()] + ([name] if len(nodes) else [])
+        return LineageCSR.from_arrays(names, sources[between], targets[between], weights[between])
+
+    def id(self, name):
+        if self._ids is None:
+            self._ids = {node: i for i, node in enumerate(self.names)}
+        return self._ids[name]
+
+    def with_prefix(self, prefix):
+        """
+        Ids of the tables whose name starts with prefix, e.g. 'DW1.SCHEMA1.', two bisects over the names
+        sorted on the first call
+
+        Returns:
+            np.ndarray: ids in ascending order
+        """
+        if self._sorted_names is None:
+            self._sorted_names = sorted((str(node), i) for i, node in enumerate(self.names))
+        start = bisect_left(self._sorted_names, (prefix,))
+        end = bisect_left(self._sorted_names, (prefix + '\U0010ffff',), start)
+        return np.sort(np.fromiter((i for _, i in self._sorted_names[start:end]), dtype=np.int64, count=end - start))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def edges(self):
+        """(source, target) name pairs, like nx.DiGraph.edges()"""
+        sources, targets, _ = self.edge_arrays()
+        names = self.names
+        return zip(map(names.__getitem__, sources.tolist()), map(names.__getitem__, targets.tolist()))
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays (the names not included)"""
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def out_neighbors(self, node):
+        """Target ids of node, a view into indices"""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def in_neighbors(self, node):
+        """Source ids of node, a view into in_indices"""
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.diff(self.in_indptr)
+
+    def bfs(self, sources, reverse=False, hops=None):
+        """
+        Hop distance from the source ids along the edges (against them with reverse, i.e. upstream)
+
+        Returns:
+            np.ndarray: distance per id, -1 where not reached within `hops`
+        """
+        indptr, indices = (self.in_indptr, self.in_indices) if reverse else (self.indptr, self.indices)
+        distance = np.full(len(self.names), -1, dtype=np.int32)
+        frontier = np.unique(np.asarray(sources, dtype=np.int64))
+        distance[frontier] = 0
+        depth = 0
+        while len(frontier) and (hops is None or depth < hops):
+            depth += 1
+            neighbors = _gather(indptr, indices, frontier)
+            frontier = np.unique(neighbors[distance[neighbors] < 0]).astype(np.int64)
+            distance[frontier] = depth
+        return distance
+
+    def topological_generations(self):
+        """
+        Kahn's algorithm a generation at a time: every generation holds the nodes whose sources all are in
+        earlier generations, i.e. the longest-path layers
+
+        Returns:
+            list: id arrays
+
+        Raises:
+            ValueError: the graph has a cycle
+        """
+        in_degree = self.in_degree().copy()
+        frontier = np.flatnonzero(in_degree == 0)
+        generations = []
+        done = 0
+        while len(frontier):
+            generations.append(frontier)
+            done += len(frontier)
+            targets = _gather(self.indptr, self.indices, frontier)
+            in_degree -= np.bincount(targets, minlength=len(self.names))
+            candidates = np.unique(targets)
+            frontier = candidates[in_degree[candidates] == 0]
+        if done != len(self.names):
+            raise ValueError(f'lineage has cycles, {len(self.names) - done} tables are on or behind one')
+        return generations
+
+    def toposort(self):
+        """Ids in topological order (see topological_generations)"""
+        generations = self.topological_generations()
+        return np.concatenate(generations) if generations else np.zeros(0, dtype=np.int64)
+
+    def layers(self):
+        """
+        Longest-path layer per id, like lineage_layout.longest_path_layers: the tables of a cycle are condensed
+        into one node (Tarjan) and share a layer
+        """
+        layers = np.zeros(len(self.names), dtype=np.int32)
+        try:
+            generations = self.topological_generations()
+        except ValueError:
+            components = strongly_connected_components([self.out_neighbors(i).tolist() for i in range(len(self))])
+            component = np.empty(len(self.names), dtype=np.int64)
+            for c, members in enumerate(components):
+                component[members] = c
+            sources, targets, _ = self.edge_arrays()
+            between = component[sources] != component[targets]
+            condensed = LineageCSR.from_arrays(range(len(components)), component[sources[between]],
+                                               component[targets[between]])
+            return condensed.layers()[component]
+        for layer, generation in enumerate(generations):
+            layers[generation] = layer
+        return layers
+
+    def save(self, directory):
+        """One .npy per array plus names.json, load() can memory-map the arrays"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'names.json'), 'w') as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Args:
+            mmap (bool): memory-map the arrays (read-only, pages loaded on first access) instead of reading them
+        """
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None) for name in ARRAYS]
+        with open(os.path.join(directory, 'names.json')) as f:
+            names = json.load(f)
+        return cls(names, *arrays)
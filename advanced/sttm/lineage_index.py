@@ -0,0 +1,109 @@
+"""
+Adjacency indexes for focus queries on a lineage graph (sttm-visual.py draws only the selected part).
+
+LineageIndex numbers the tables once and keeps their sources and targets as lists of integers, plus the
+table names in sorted order, so
+
+    upstream/downstream of a table within k hops   BFS over the integer adjacency, touches only the result
+    tables of a schema prefix                      two bisects over the sorted names
+
+cost time in the size of the answer, not of the graph. collapse_prefix replaces the tables of a schema by one
+node carrying the summed weight of the mappings in and out of it.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+
+import networkx as nx
+
+
+class LineageIndex:
+    def __init__(self, G):
+        """
+        Args:
+            G (nx.DiGraph): lineage graph, table names as nodes
+        """
+        self.nodes = list(G)
+        self.ids = {node: i for i, node in enumerate(self.nodes)}
+        self.successors = [[self.ids[target] for target in G.successors(node)] for node in self.nodes]
+        self.predecessors = [[self.ids[source] for source in G.predecessors(node)] for node in self.nodes]
+        self.sorted_names = sorted((str(node), i) for i, node in enumerate(self.nodes))
+
+    def _walk(self, table, adjacency, hops):
+        start = self.ids.get(table)
+        if start is None:
+            raise ValueError(f'unknown table {table!r}')
+        seen = {start}
+        frontier = [start]
+        depth = 0
+        while frontier and (hops is None or depth < hops):
+            next_frontier = []
+            for node in frontier:
+                for neighbor in adjacency[node]:
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+            depth += 1
+        return {self.nodes[i] for i in seen}
+
+    def upstream(self, table, hops=None):
+        """
+        The table and the tables it is built from, within `hops` mappings (None for all)
+
+        Returns:
+            set: table names
+
+        Raises:
+            ValueError: table is not in the lineage
+        """
+        return self._walk(table, self.predecessors, hops)
+
+    def downstream(self, table, hops=None):
+        """
+        The table and the tables built from it, within `hops` mappings (None for all)
+
+        Returns:
+            set: table names
+
+        Raises:
+            ValueError: table is not in the lineage
+        """
+        return self._walk(table, self.successors, hops)
+
+    def with_prefix(self, prefix):
+        """
+        Tables whose name starts with prefix, e.g. 'DW1.SCHEMA1.'
+
+        Returns:
+            set: table names
+        """
+        start = bisect_left(self.sorted_names, (prefix,))
+        end = bisect_left(self.sorted_names, (prefix + '\U0010ffff',), start)
+        return {self.nodes[i] for _, i in self.sorted_names[start:end]}
+
+
+def collapse_prefix(G, prefix, tables, name=None):
+    """
+    G with `tables` merged into one node, mappings between them dropped and parallel mappings summed
+
+    Args:
+        prefix (str): schema prefix the tables were selected by
+        tables (set): tables to merge
+        name (str): name of the merged node, defaults to prefix + '*'
+
+    Returns:
+        nx.DiGraph: the merged node has collapsed=<number of tables>
+    """
+    name = name or prefix + '*'
+    weights = defaultdict(int)
+    for source, target, weight in G.edges(data='weight', default=1):
+        source = name if source in tables else source
+        target = name if target in tables else target
+        if source != target:
+            weights[source, target] += weight
+    collapsed = nx.DiGraph()
+    collapsed.add_nodes_from(node for node in G if node not in tables)
+    if tables:
+        collapsed.add_node(name, collapsed=len(tables))
+    collapsed.add_weighted_edges_from((source, target, weight) for (source, target), weight in weights.items())
+    return collapsed
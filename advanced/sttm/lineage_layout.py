@@ -0,0 +1,216 @@
+"""
+Hierarchical (left to right) layout of a lineage graph, shared by the static renderers of sttm-visual.py.
+
+Every node is placed in the layer of the longest path reaching it, so a table is always to the right of all its
+sources. Cycles (a table rebuilt from its own downstream tables) are condensed first: the tables of a strongly
+connected component share a layer and the condensation is a DAG. Tarjan's SCC, the condensation and one pass in
+topological order are each O(V + E), instead of a shortest path per (root, node) pair.
+
+    layers = longest_path_layers(G)
+    pos = layered_positions(G, layers)
+
+Layouts of big graphs are worth keeping: LayoutCache keys positions by a hash of the graph (in memory, and as
+.npz files when given a directory), so re-rendering an unchanged lineage skips the layout step.
+"""
+import hashlib
+import os
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+
+HORIZONTAL_SPACING = 2.5
+VERTICAL_SPACING = 2.0
+
+
+def longest_path_layers(G):
+    """
+    Layer of every node, 0 for the nodes without a source, else 1 + the highest layer of its sources
+
+    Args:
+        G (nx.DiGraph): lineage graph, cycles allowed
+
+    Returns:
+        dict: node -> layer
+    """
+    components = list(nx.strongly_connected_components(G))
+    condensed = nx.condensation(G, components)
+    component_layers = {}
+    for component in nx.topological_sort(condensed):
+        component_layers[component] = max((component_layers[parent] + 1
+                                           for parent in condensed.predecessors(component)), default=0)
+    mapping = condensed.graph['mapping']
+    return {node: component_layers[mapping[node]] for node in G}
+
+
+def layer_order(G, layers):
+    """
+    Nodes of every layer, ordered by the mean position of their sources in the layers to the left
+    (one barycenter sweep, fewer crossing edges than insertion order)
+
+    Returns:
+        list: list of nodes per layer
+    """
+    by_layer = defaultdict(list)
+    for node, layer in layers.items():
+        by_layer[layer].append(node)
+    rank = {}
+    ordered = []
+    for layer in range(max(by_layer, default=-1) + 1):
+        nodes = by_layer.get(layer, [])
+        if layer:
+            def barycenter(node):
+                ranks = [rank[parent] for parent in G.predecessors(node) if parent in rank]
+                return sum(ranks) / len(ranks) if ranks else 0.0
+            nodes.sort(key=barycenter)
+        for i, node in enumerate(nodes):
+            rank[node] = i - (len(nodes) - 1) / 2
+        ordered.append(nodes)
+    return ordered
+
+
+def layered_positions(G, layers=None, horizontal_spacing=HORIZONTAL_SPACING, vertical_spacing=VERTICAL_SPACING):
+    """
+    (x, y) of every node: x from the layer, the nodes of a layer centered around y = 0
+
+    Args:
+        layers (dict): node -> layer, longest_path_layers(G) when None
+
+    Returns:
+        dict: node -> (x, y)
+    """
+    if layers is None:
+        layers = longest_path_layers(G)
+    pos = {}
+    for layer, nodes in enumerate(layer_order(G, layers)):
+        for i, node in enumerate(nodes):
+            pos[node] = (layer * horizontal_spacing, (i - (len(nodes) - 1) / 2) * vertical_spacing)
+    return pos
+
+
+def layered_xy(layers, graph=None, horizontal_spacing=HORIZONTAL_SPACING, vertical_spacing=VERTICAL_SPACING):
+    """
+    layered_positions for a layer array, vectorized. Given the graph (a lineage_csr.LineageCSR) the nodes of a
+    layer are ordered by the barycenter of their sources like layer_order, otherwise they keep their id order.
+
+    Returns:
+        np.ndarray: n x 2 coordinates
+    """
+    layers = np.asarray(layers, dtype=np.int64)
+    if not len(layers):
+        return np.zeros((0, 2))
+    counts = np.bincount(layers)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    order = np.argsort(layers, kind='stable')
+    rank = np.empty(len(layers))
+    if graph is None:
+        rank[order] = np.arange(len(layers)) - np.repeat(starts, counts)
+        rank -= (counts[layers] - 1) / 2
+    else:
+        # edges from earlier layers, grouped by the layer of their target
+        sources, targets, _ = graph.edge_arrays()
+        keep = layers[sources] < layers[targets]
+        by_layer = np.argsort(layers[targets[keep]], kind='stable')
+        sources, targets = sources[keep][by_layer], targets[keep][by_layer]
+        edge_starts = np.searchsorted(layers[targets], np.arange(len(counts) + 1))
+        slot = np.empty(len(layers), dtype=np.int64)
+        for layer, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+            nodes = order[start:start + count]
+            if layer:
+                slot[nodes] = np.arange(count)
+                parents = sources[edge_starts[layer]:edge_starts[layer + 1]]
+                children = slot[targets[edge_starts[layer]:edge_starts[layer + 1]]]
+                totals = np.bincount(children, weights=rank[parents], minlength=count)
+                degrees = np.bincount(children, minlength=count)
+                barycenter = np.divide(totals, degrees, out=np.zeros(count), where=degrees > 0)
+                nodes = nodes[np.argsort(barycenter, kind='stable')]
+            rank[nodes] = np.arange(count) - (count - 1) / 2
+    return np.column_stack([layers * horizontal_spacing, rank * vertical_spacing])
+
+
+def csr_layered_positions(graph):
+    """
+    Layered positions of a lineage_csr.LineageCSR, from its vectorized longest-path layers and one barycenter
+    sweep over its edges
+
+    Returns:
+        dict: node -> (x, y)
+    """
+    return dict(zip(graph.names, map(tuple, layered_xy(graph.layers(), graph).tolist())))
+
+
+def graph_hash(G):
+    """Hex digest of the node and edge sets, independent of insertion order (nx.DiGraph or LineageCSR)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for node in sorted(map(str, G)):
+        digest.update(node.encode() + b'\n')
+    for source, target in sorted((str(source), str(target)) for source, target in G.edges()):
+        digest.update(f'{source}\t{target}\n'.encode())
+    return digest.hexdigest()
+
+
+def position_arrays(G, pos):
+    """
+    Node coordinates as arrays in G's node order and the node index of every edge end
+
+    Returns:
+        tuple: xy (n x 2 float array), sources, targets (int arrays, one entry per edge)
+    """
+    index = {node: i for i, node in enumerate(G)}
+    xy = np.array([pos[node] for node in G], dtype=float).reshape(-1, 2)
+    sources = np.fromiter((index[source] for source, _ in G.edges()), dtype=np.int64, count=G.number_of_edges())
+    targets = np.fromiter((index[target] for _, target in G.edges()), dtype=np.int64, count=G.number_of_edges())
+    return xy, sources, targets
+
+
+def edge_segments(xy, sources, targets):
+    """
+    x and y of all edges as one polyline each, (x0, x1, nan) per edge, nan breaks the line (plotly draws a gap)
+
+    Returns:
+        tuple: edge_x, edge_y
+    """
+    segments = np.full((len(sources), 3, 2), np.nan)
+    segments[:, 0] = xy[sources]
+    segments[:, 1] = xy[targets]
+    segments = segments.reshape(-1, 2)
+    return segments[:, 0], segments[:, 1]
+
+
+class LayoutCache:
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str): also keep the positions as <layout>-<graph hash>.npz files here, None for memory only
+        """
+        self.directory = directory
+        self.positions = {}
+
+    def get(self, G, layout, name=None):
+        """
+        layout(G) for this graph, computed only once per graph content
+
+        Args:
+            layout: callable G -> {node: (x, y)}
+            name (str): cache key of the layout, defaults to the function name
+
+        Returns:
+            dict: node -> (x, y)
+        """
+        key = f'{name or layout.__name__}-{graph_hash(G)}'
+        if key in self.positions:
+            return self.positions[key]
+        path = os.path.join(self.directory, key + '.npz') if self.directory else None
+        if path and os.path.exists(path):
+            with np.load(path) as saved:
+                index = {node: i for i, node in enumerate(saved['nodes'].tolist())}
+                xy = saved['xy']
+            pos = {node: tuple(xy[index[str(node)]]) for node in G}
+        else:
+            pos = layout(G)
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                np.savez(path, nodes=np.array([str(node) for node in G]),
+                         xy=np.array([pos[node] for node in G], dtype=float).reshape(-1, 2))
+        self.positions[key] = pos
+        return pos
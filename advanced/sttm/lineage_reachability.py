@@ -0,0 +1,292 @@
+"""
+Reachability index over table lineage: what is downstream/upstream of a table, does A feed B.
+
+The tables of a cycle are condensed into one strongly connected component (Tarjan), then every component keeps
+the components it reaches and the components reaching it as bitsets (Python ints, bit c = component c), filled
+in one pass in topological order. is_reachable is a shift and a mask, downstream/upstream read the set bits,
+so queries cost microseconds plus the size of the answer instead of a graph traversal.
+
+New mappings are added with add_edge: an edge inside the DAG ORs the target's descendants into the ancestors
+of the source (and the other way round); an edge closing a cycle merges components, which rebuilds the index.
+An edge update touches every ancestor of the source, so add_edges rebuilds once (O(V + E)) for a batch over
+REBUILD_EDGES mappings.
+
+    index = ReachabilityIndex.from_edge_store(parser.edges)    # or .from_mappings_csv('mappings.csv')
+    index.downstream('DW1.SALES.ORDERS')
+    index.save('lineage_reachability.json')
+"""
+import csv
+import json
+import os
+from itertools import chain
+
+# add_edges rebuilds the index instead of updating it edge by edge above this many new mappings
+REBUILD_EDGES = 64
+
+
+def _bits(value):
+    """Positions of the set bits of value"""
+    digits = bin(value)[:1:-1]
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def strongly_connected_components(successors):
+    """
+    Tarjan's algorithm, iterative (lineage chains are deeper than the recursion limit)
+
+    Args:
+        successors (list): set of successor node ids per node id
+
+    Returns:
+        list: components (lists of node ids), every component after all the components it reaches
+    """
+    count = len(successors)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack = []
+    components = []
+    counter = 0
+    for root in range(count):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, neighbors = work[-1]
+            for neighbor in neighbors:
+                if index[neighbor] == -1:
+                    index[neighbor] = low[neighbor] = counter
+                    counter += 1
+                    stack.append(neighbor)
+                    on_stack[neighbor] = True
+                    work.append((neighbor, iter(successors[neighbor])))
+                    break
+                if on_stack[neighbor]:
+                    low[node] = min(low[node], index[neighbor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+class ReachabilityIndex:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        # successor table ids per table id
+        self.successors = []
+        # table id -> component, component -> table ids
+        self.component = []
+        self.members = []
+        # component -> bitset of the components it reaches / is reached from, its own bit included
+        self.descendants = []
+        self.ancestors = []
+        # table names per component for the queries, None until the next query after a rebuild
+        self.member_names = []
+
+    def intern(self, name):
+        """Id of a table, a new table is its own component"""
+        table_id = self.ids.get(name)
+        if table_id is None:
+            table_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.successors.append(set())
+            self.component.append(len(self.members))
+            self.members.append([table_id])
+            if self.member_names is not None:
+                self.member_names.append((name,))
+            self.descendants.append(1 << len(self.descendants))
+            self.ancestors.append(1 << len(self.ancestors))
+        return table_id
+
+    def rebuild(self):
+        """Recompute the components and both closures from the edges, O(V + E) bitset ORs"""
+        components = strongly_connected_components(self.successors)
+        self.members = components
+        self.member_names = None
+        self.component = [0] * len(self.names)
+        for c, members in enumerate(components):
+            for table_id in members:
+                self.component[table_id] = c
+        # components come out after everything they reach, so the successors' closures are complete
+        self.descendants = []
+        successor_components = []
+        for c, members in enumerate(components):
+            reached = {self.component[successor] for table_id in members for successor in self.successors[table_id]}
+            reached.discard(c)
+            bits = 1 << c
+            for successor in reached:
+                bits |= self.descendants[successor]
+            self.descendants.append(bits)
+            successor_components.append(reached)
+        self.ancestors = [1 << c for c in range(len(components))]
+        for c in range(len(components) - 1, -1, -1):
+            for successor in successor_components[c]:
+                self.ancestors[successor] |= self.ancestors[c]
+
+    def add_edge(self, source, target):
+        """
+        Add the mapping source -> target and update the closures
+
+        Returns:
+            bool: False when the mapping was already known
+        """
+        source_id, target_id = self.intern(source), self.intern(target)
+        if target_id in self.successors[source_id]:
+            return False
+        self.successors[source_id].add(target_id)
+        source_component, target_component = self.component[source_id], self.component[target_id]
+        if source_component == target_component or self.descendants[source_component] >> target_component & 1:
+            return True
+        if self.descendants[target_component] >> source_component & 1:
+            # the mapping closes a cycle, components merge
+            self.rebuild()
+            return True
+        descendants = self.descendants[target_component]
+        for ancestor in _bits(self.ancestors[source_component]):
+            self.descendants[ancestor] |= descendants
+        ancestors = self.ancestors[source_component]
+        for descendant in _bits(descendants):
+            self.ancestors[descendant] |= ancestors
+        return True
+
+    def add_edges(self, edges):
+        """
+        Add (source, target) mappings, one rebuild for a batch over REBUILD_EDGES mappings
+
+        Returns:
+            int: mappings that were new
+        """
+        edges = list(edges)
+        if len(edges) <= REBUILD_EDGES:
+            return sum(self.add_edge(source, target) for source, target in edges)
+        added = 0
+        for source, target in edges:
+            source_id, target_id = self.intern(source), self.intern(target)
+            if target_id not in self.successors[source_id]:
+                self.successors[source_id].add(target_id)
+                added += 1
+        self.rebuild()
+        return added
+
+    def _tables(self, components, table):
+        if self.member_names is None:
+            self.member_names = [tuple(self.names[table_id] for table_id in members) for members in self.members]
+        tables = set(chain.from_iterable(map(self.member_names.__getitem__, _bits(components))))
+        tables.discard(table)
+        return tables
+
+    def downstream(self, table):
+        """
+        Tables built from table, directly or not
+
+        Returns:
+            set: table names, empty for an unknown table
+        """
+        table_id = self.ids.get(table)
+        if table_id is None:
+            return set()
+        return self._tables(self.descendants[self.component[table_id]], table)
+
+    def upstream(self, table):
+        """
+        Tables table is built from, directly or not
+
+        Returns:
+            set: table names, empty for an unknown table
+        """
+        table_id = self.ids.get(table)
+        if table_id is None:
+            return set()
+        return self._tables(self.ancestors[self.component[table_id]], table)
+
+    def is_reachable(self, source, target):
+        """True when target is built from source, directly or not (a table reaches itself)"""
+        source_id, target_id = self.ids.get(source), self.ids.get(target)
+        if source_id is None or target_id is None:
+            return False
+        return bool(self.descendants[self.component[source_id]] >> self.component[target_id] & 1)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Index of (source, target) pairs"""
+        index = cls()
+        for source, target in edges:
+            index.successors[index.intern(source)].add(index.intern(target))
+        index.rebuild()
+        return index
+
+    @classmethod
+    def from_edge_store(cls, store):
+        """Index of a sttm_from_sql_logs.LineageEdgeStore, read from its interned keys"""
+        index = cls()
+        for name in store.names:
+            index.intern(name)
+        for key in store.keys:
+            index.successors[key >> 32].add(key & 0xFFFFFFFF)
+        index.rebuild()
+        return index
+
+    @classmethod
+    def from_mappings_csv(cls, path):
+        """Index of a mappings.csv, source/target or 'Source Table'/'Target Table' columns"""
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            source, target = ('source', 'target') if 'source' in reader.fieldnames else ('Source Table', 'Target Table')
+            return cls.from_edges((row[source], row[target]) for row in reader)
+
+    def save(self, path):
+        """Write the index as JSON (closures as hex strings), atomically"""
+        state = {
+            'names': self.names,
+            'edges': [[source_id, target_id] for source_id, targets in enumerate(self.successors)
+                      for target_id in targets],
+            'component': self.component,
+            'descendants': [format(bits, 'x') for bits in self.descendants],
+            'ancestors': [format(bits, 'x') for bits in self.ancestors],
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Index written by save(), without recomputing the closures"""
+        with open(path) as f:
+            state = json.load(f)
+        index = cls()
+        index.names = state['names']
+        index.ids = {name: table_id for table_id, name in enumerate(index.names)}
+        index.successors = [set() for _ in index.names]
+        for source_id, target_id in state['edges']:
+            index.successors[source_id].add(target_id)
+        index.component = state['component']
+        index.members = [[] for _ in state['descendants']]
+        index.member_names = None
+        for table_id, c in enumerate(index.component):
+            index.members[c].append(table_id)
+        index.descendants = [int(bits, 16) for bits in state['descendants']]
+        index.ancestors = [int(bits, 16) for bits in state['ancestors']]
+        return index
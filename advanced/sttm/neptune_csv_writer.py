@@ -0,0 +1,128 @@
+"""
+Streaming writers for the Neptune bulk loader CSV formats (see how_to_upload_to_neptune.md).
+
+    gremlin:     ~id,~label,name:String,...            ~id,~from,~to,~label,count:Long,...
+    opencypher:  :ID,:LABEL,name:String,...            :ID,:START_ID,:END_ID,:TYPE,count:Long,...
+
+Rows are written as they come, nothing is collected. Nodes of different kinds share one header
+(a property a node does not have is left empty, which the loader skips), so each of nodes and edges is a
+single file, or size-bounded parts (optionally gzipped) that the loader reads in parallel.
+"""
+import os
+import sys
+
+try:
+    from generic_load_vertices_edge.neptune_csv_export import CsvPartWriter
+except ImportError:
+    # run as a script from advanced/sttm, the shared package is at the repository root
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+    from generic_load_vertices_edge.neptune_csv_export import CsvPartWriter
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+FORMATS = {
+    'gremlin': {'id': '~id', 'label': '~label', 'from': '~from', 'to': '~to', 'type': '~label', 'types': {}},
+    'opencypher': {'id': ':ID', 'label': ':LABEL', 'from': ':START_ID', 'to': ':END_ID', 'type': ':TYPE',
+                   'types': {'Date': 'DateTime'}},
+}
+
+
+def _part_writer(path, header, max_bytes, compress):
+    """
+    CsvPartWriter for a file path: the file itself, or <name>-00000<ext>, ... parts next to it with max_bytes.
+    Compressed files always end in .gz (a given .gz is not doubled).
+    """
+    directory, name = os.path.split(path)
+    if name.endswith('.gz'):
+        name = name[:-len('.gz')]
+    prefix, suffix = os.path.splitext(name)
+    return CsvPartWriter(directory, prefix, header, max_bytes, compress, suffix or '.csv')
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class NeptuneCsvWriter:
+    def __init__(self, nodes_path, edges_path, node_properties, edge_properties, format='gremlin', max_bytes=None,
+                 compress=False):
+        """
+        Args:
+            nodes_path (str), edges_path (str): file paths, with max_bytes the parts are named
+                nodes-00000.csv, ... after them
+            node_properties (list): (name, type) of the node property columns, e.g. [('name', 'String')]
+            edge_properties (list): (name, type) of the edge property columns, e.g. [('count', 'Long')]
+            format (str): 'gremlin' or 'opencypher'
+            max_bytes (int): uncompressed size after which a new part is started, None writes single files
+            compress (bool): gzip every file, .gz is added to the names
+        """
+        columns = FORMATS[format]
+        types = columns['types']
+        self.node_properties = [name for name, _ in node_properties]
+        self.edge_properties = [name for name, _ in edge_properties]
+        node_header = [columns['id'], columns['label']] + [f'{name}:{types.get(prop_type, prop_type)}'
+                                                           for name, prop_type in node_properties]
+        edge_header = [columns['id'], columns['from'], columns['to'], columns['type']] + [
+            f'{name}:{types.get(prop_type, prop_type)}' for name, prop_type in edge_properties]
+        self.nodes = _part_writer(nodes_path, node_header, max_bytes, compress)
+        self.edges = _part_writer(edges_path, edge_header, max_bytes, compress)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_node(self, node):
+        """node: {'~id', '~label', property: value}"""
+        self.nodes.writerow([node['~id'], node['~label']] +
+                            [_format_value(node.get(prop)) for prop in self.node_properties])
+
+    def write_edge(self, edge):
+        """edge: {'~id', '~from', '~to', '~label', property: value}"""
+        self.edges.writerow([edge['~id'], edge['~from'], edge['~to'], edge['~label']] +
+                            [_format_value(edge.get(prop)) for prop in self.edge_properties])
+
+    def close(self):
+        self.nodes.close()
+        self.edges.close()
+
+    @property
+    def paths(self):
+        return self.nodes.paths + self.edges.paths
+
+
+def write_neptune_csv(nodes, edges, nodes_path, edges_path, node_properties, edge_properties, format='gremlin',
+                      max_bytes=None, compress=False):
+    """
+    Stream node and edge dicts (iterables, e.g. generators) into Neptune bulk loader CSV
+
+    Returns:
+        list: paths written, node files first
+    """
+    with NeptuneCsvWriter(nodes_path, edges_path, node_properties, edge_properties, format, max_bytes,
+                          compress) as writer:
+        for node in nodes:
+            writer.write_node(node)
+        for edge in edges:
+            writer.write_edge(edge)
+    return writer.paths
+
+
+def write_neptune_csv_parts(nodes, edges, output_dir, node_properties, edge_properties, format='gremlin',
+                            max_bytes=DEFAULT_MAX_BYTES, compress=False):
+    """
+    write_neptune_csv into output_dir as nodes-00000.csv[.gz], ... and edges-00000.csv[.gz], ...,
+    upload the folder as the loader source prefix
+
+    Returns:
+        list: paths written, node files first
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    return write_neptune_csv(nodes, edges, os.path.join(output_dir, 'nodes.csv'),
+                             os.path.join(output_dir, 'edges.csv'), node_properties, edge_properties, format,
+                             max_bytes, compress)
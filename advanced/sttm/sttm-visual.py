@@ -1,62 +1,175 @@
+import numpy as np
 import pandas as pd
 import networkx as nx
 import plotly.graph_objects as go
 from pyvis.network import Network
 import matplotlib.pyplot as plt
+import copy
 import random
+from functools import cached_property
+
+from lineage_csr import LineageCSR
+from lineage_layout import (LayoutCache, csr_layered_positions, edge_segments, layered_positions, longest_path_layers,
+                            position_arrays)
+
+# Mapping files are read this many rows at a time
+CHUNK_ROWS = 1_000_000
+
+# Above this many tables create_interactive_plotly switches to the layered layout and WebGL traces
+LARGE_GRAPH_NODES = 2000
+
+
+def read_mappings(mapping_csv, chunksize=CHUNK_ROWS):
+    """
+    Distinct (source, target) mappings of a mapping CSV with their weight, read in chunks so only the
+    distinct mappings are held in memory. Accepts 'Source Table'/'Target Table' columns, or the
+    source/target/count columns of sttm_from_sql_logs.py (the weight is then the sum of count).
+
+    Returns:
+        pd.DataFrame: 'Source Table', 'Target Table', 'weight'
+    """
+    columns = pd.read_csv(mapping_csv, nrows=0).columns
+    if 'Source Table' in columns:
+        source, target, count = 'Source Table', 'Target Table', None
+    else:
+        source, target, count = 'source', 'target', 'count' if 'count' in columns else None
+    usecols = [source, target] + ([count] if count else [])
+    weights = []
+    for chunk in pd.read_csv(mapping_csv, usecols=usecols, chunksize=chunksize):
+        grouped = chunk.groupby([source, target], sort=False)
+        weights.append(grouped[count].sum() if count else grouped.size())
+    if not weights:
+        return pd.DataFrame(columns=['Source Table', 'Target Table', 'weight'])
+    weight = pd.concat(weights).groupby(level=[0, 1], sort=False).sum()
+    df = weight.rename('weight').reset_index()
+    df.columns = ['Source Table', 'Target Table', 'weight']
+    return df
 
 
 class TableLineageVisualizer:
-    def __init__(self, mapping_csv):
-        """Initialize visualizer with mapping CSV file."""
-        self.df = pd.read_csv(mapping_csv)
-        self.G = self._create_graph()
+    def __init__(self, mapping_csv, layout_cache_dir=None, chunksize=CHUNK_ROWS):
+        """
+        Initialize visualizer with mapping CSV file.
+        The file is read chunksize rows at a time and duplicate mappings are merged into one edge with a weight,
+        so self.df holds every distinct mapping once ('Source Table', 'Target Table', 'weight').
+        Layout positions are cached by graph content, also in layout_cache_dir (.npz files) when given.
+        """
+        self.df = read_mappings(mapping_csv, chunksize)
+        # compact CSR arrays, the NetworkX graph G is only built when a renderer needs it
+        self.graph = LineageCSR.from_dataframe(self.df, weight='weight')
+        self.layout_cache = LayoutCache(layout_cache_dir)
+        # merged node -> number of tables, set on the views of collapse_schema
+        self.collapsed = {}
+
+    @cached_property
+    def G(self):
+        return self._create_graph()
 
     def _create_graph(self):
-        """Create NetworkX graph from DataFrame."""
-        G = nx.DiGraph()
-        for _, row in self.df.iterrows():
-            G.add_edge(row['Source Table'], row['Target Table'])
+        """Create NetworkX graph from the CSR graph, nodes in the same order."""
+        G = self.graph.to_networkx()
+        nx.set_node_attributes(G, self.collapsed, 'collapsed')
         return G
 
-    def create_interactive_plotly(self, output_html='graph_plotly.html'):
-        """Create interactive visualization using Plotly."""
-        # Create layout using Kamada-Kawai algorithm
-        pos = nx.kamada_kawai_layout(self.G)
-
-        # Create edges
-        edge_x = []
-        edge_y = []
-        for edge in self.G.edges():
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            edge_x.extend([x0, x1, None])
-            edge_y.extend([y0, y1, None])
-
-        edge_trace = go.Scatter(
+    @cached_property
+    def node_stats(self):
+        """
+        In/out degree and role ('source', 'intermediate', 'target') of every node, in G's node order.
+        Computed once and shared by the renderers.
+        """
+        in_degree, out_degree = self.graph.in_degree(), self.graph.out_degree()
+        role = np.where(in_degree == 0, 'source', np.where(out_degree == 0, 'target', 'intermediate'))
+        return pd.DataFrame({'in_degree': in_degree, 'out_degree': out_degree, 'role': role}, index=self.graph.names)
+
+    def _view(self, graph, collapsed=None):
+        """
+        Visualizer over a LineageCSR sharing the layout cache, every renderer draws only that graph.
+        Its NetworkX graph is built from the (small) view when a renderer needs it.
+        """
+        view = copy.copy(self)
+        view.graph = graph
+        view.collapsed = collapsed or {}
+        sources, targets, weights = graph.edge_arrays()
+        names = np.array(graph.names, dtype=object)
+        view.df = pd.DataFrame({'Source Table': names[sources], 'Target Table': names[targets], 'weight': weights})
+        view.__dict__.pop('G', None)
+        view.__dict__.pop('node_stats', None)
+        return view
+
+    def _table_id(self, table):
+        try:
+            return self.graph.id(table)
+        except KeyError:
+            raise ValueError(f'unknown table {table!r}') from None
+
+    def focus(self, table, upstream=None, downstream=None):
+        """
+        View of a table with the tables it is built from within `upstream` mappings and the tables built from it
+        within `downstream` mappings (None for the whole lineage, 0 for none)
+
+            visualizer.focus('DW1.SALES.ORDERS', upstream=2, downstream=1).create_static_graph('orders.png')
+
+        Raises:
+            ValueError: table is not in the lineage
+        """
+        table_id = self._table_id(table)
+        reached = ((self.graph.bfs([table_id], reverse=True, hops=upstream) >= 0) |
+                   (self.graph.bfs([table_id], hops=downstream) >= 0))
+        return self._view(self.graph.subgraph(np.flatnonzero(reached)))
+
+    def filter_schema(self, prefix):
+        """View of the tables whose name starts with prefix, e.g. 'DW1.SALES.'"""
+        return self._view(self.graph.subgraph(self.graph.with_prefix(prefix)))
+
+    def collapse_schema(self, prefix, name=None):
+        """
+        View with the tables whose name starts with prefix merged into one node (prefix + '*' by default),
+        mappings between them dropped and parallel mappings summed. The merged node has collapsed=<number of tables>.
+        """
+        name = name or prefix + '*'
+        tables = self.graph.with_prefix(prefix)
+        return self._view(self.graph.collapse(tables, name), {name: len(tables)} if len(tables) else None)
+
+    def create_interactive_plotly(self, output_html='graph_plotly.html', large=None):
+        """
+        Create interactive visualization using Plotly.
+        Graphs over LARGE_GRAPH_NODES tables (or large=True) use the linear layered layout instead of
+        Kamada-Kawai (O(n^2)) and WebGL traces without node labels, the names are shown on hover.
+        """
+        if large is None:
+            large = len(self.graph) > LARGE_GRAPH_NODES
+        if large:
+            # Straight from the CSR arrays, the NetworkX graph is not built
+            pos = self.layout_cache.get(self.graph, csr_layered_positions)
+            xy = np.array([pos[node] for node in self.graph.names], dtype=float).reshape(-1, 2)
+            sources, targets, _ = self.graph.edge_arrays()
+            scatter = go.Scattergl
+        else:
+            # Create layout using Kamada-Kawai algorithm
+            pos = self.layout_cache.get(self.G, nx.kamada_kawai_layout)
+            xy, sources, targets = position_arrays(self.G, pos)
+            scatter = go.Scatter
+
+        # Create edges, one polyline broken by NaN
+        edge_x, edge_y = edge_segments(xy, sources, targets)
+
+        edge_trace = scatter(
             x=edge_x, y=edge_y,
             line=dict(width=0.5, color='#888'),
             hoverinfo='none',
             mode='lines')
 
         # Create nodes
-        node_x = []
-        node_y = []
-        for node in self.G.nodes():
-            x, y = pos[node]
-            node_x.append(x)
-            node_y.append(y)
-
-        node_trace = go.Scatter(
-            x=node_x, y=node_y,
-            mode='markers+text',
+        node_trace = scatter(
+            x=xy[:, 0], y=xy[:, 1],
+            mode='markers' if large else 'markers+text',
             hoverinfo='text',
-            text=[str(node) for node in self.G.nodes()],
+            text=[str(node) for node in self.graph.names],
             textposition="bottom center",
             marker=dict(
                 showscale=True,
                 colorscale='YlGnBu',
-                size=20,
+                size=6 if large else 20,
                 colorbar=dict(
                     thickness=15,
                     title='Node Connections',
@@ -66,11 +179,7 @@ class TableLineageVisualizer:
             ))
 
         # Color nodes by number of connections
-        node_adjacencies = []
-        for node in self.G.nodes():
-            node_adjacencies.append(len(list(self.G.neighbors(node))))
-
-        node_trace.marker.color = node_adjacencies
+        node_trace.marker.color = self.node_stats['out_degree'].to_numpy()
 
         # Create figure
         fig = go.Figure(data=[edge_trace, node_trace],
@@ -92,16 +201,13 @@ class TableLineageVisualizer:
         net = Network(height='750px', width='100%', directed=True)
 
         # Add nodes with different colors for source and target
-        sources = set(self.df['Source Table'])
-        targets = set(self.df['Target Table'])
-
-        for node in self.G.nodes():
-            color = '#97c2fc' if node in sources else '#ff9999'  # Blue for source, Red for target
-            net.add_node(node, label=node, color=color)
+        nodes = self.node_stats.index.tolist()
+        # Blue for source, Red for target
+        colors = np.where(self.node_stats['out_degree'] > 0, '#97c2fc', '#ff9999').tolist()
+        net.add_nodes(nodes, label=nodes, color=colors)
 
         # Add edges
-        for edge in self.G.edges():
-            net.add_edge(edge[0], edge[1])
+        net.add_edges(list(self.graph.edges()))
 
         # Set physics layout
         net.set_options('''
@@ -175,46 +281,8 @@ class TableLineageVisualizer:
         except ImportError:
             plt.figure(figsize=(24, 16))
 
-            def get_hierarchy_pos(G):
-                roots = [n for n in G.nodes() if G.in_degree(n) == 0]
-                levels = {}
-                for node in G.nodes():
-                    max_level = 0
-                    for root in roots:
-                        try:
-                            path_length = len(nx.shortest_path(G, root, node)) - 1
-                            max_level = max(max_level, path_length)
-                        except nx.NetworkXNoPath:
-                            continue
-                    levels[node] = max_level
-
-                # Assign positions with increased spacing
-                width = max(levels.values()) + 1
-                height = len(G.nodes())
-                pos = {}
-                nodes_at_level = {}
-
-                for node, level in levels.items():
-                    if level not in nodes_at_level:
-                        nodes_at_level[level] = []
-                    nodes_at_level[level].append(node)
-
-                # Increase these multipliers for more spacing
-                horizontal_spacing = 2.5  # Increase for more horizontal space
-                vertical_spacing = 2.0  # Increase for more vertical space
-
-                for level in range(width):
-                    nodes = nodes_at_level.get(level, [])
-                    n_nodes = len(nodes)
-                    for i, node in enumerate(nodes):
-                        pos[node] = (
-                            level * horizontal_spacing,  # Horizontal spacing
-                            (i - (n_nodes - 1) / 2) * vertical_spacing  # Vertical spacing
-                        )
-
-                return pos
-
-            pos = get_hierarchy_pos(self.G)
+            # Longest-path layers, O(V + E) and cycles allowed
+            pos = layered_positions(self.G)
 
         # Draw with larger node sizes and spacing
         nx.draw_networkx_nodes(self.G, pos,
@@ -251,89 +319,49 @@ class TableLineageVisualizer:
         # Make figure wider than tall for left-to-right layout
         plt.figure(figsize=(20, 8))
 
-        def assign_horizontal_layers(G):
-            """Assign layers based on longest path from source nodes."""
-            layers = {}
-            # Start with nodes that have no predecessors (source/parent nodes)
-            sources = [n for n in G.nodes() if G.in_degree(n) == 0]
-
-            # Use topological sort to ensure parent nodes are processed before children
-            for node in nx.topological_sort(G):
-                if node in sources:
-                    layers[node] = 0
-                else:
-                    # Place node one layer to the right of its leftmost parent
-                    predecessors = list(G.predecessors(node))
-                    max_parent_layer = max(layers[parent] for parent in predecessors)
-                    layers[node] = max_parent_layer + 1
-            return layers
-
         # Assign layers to nodes
-        try:
-            layers = assign_horizontal_layers(self.G)
-            for node, layer in layers.items():
-                self.G.nodes[node]['layer'] = layer
-
-            # Use multipartite layout with increased spacing
-            pos = nx.multipartite_layout(self.G,
-                                         subset_key='layer',
-                                         scale=3.0,
-                                         align='horizontal')  # Left to right
-
-            # Draw nodes
-            nx.draw_networkx_nodes(self.G, pos,
-                                   node_color='lightblue',
-                                   node_size=2000,
-                                   alpha=0.7)
-
-            # Draw edges with slight curve for better visibility
-            nx.draw_networkx_edges(self.G, pos,
-                                   edge_color='gray',
-                                   arrows=True,
-                                   arrowsize=20,
-                                   connectionstyle='arc3,rad=0.2')
-
-            # Add labels
-            nx.draw_networkx_labels(self.G, pos,
-                                    font_size=8,
-                                    font_weight='bold')
-
-            plt.title("Table Lineage Graph")
-            plt.margins(x=0.2, y=0.2)
-            plt.axis('off')
-            plt.tight_layout()
-
-            # Save to file
-            plt.savefig(output_file, format='png', dpi=300, bbox_inches='tight')
-            plt.close()
-
-        except nx.NetworkXUnfeasible:
-            print("Error: Graph contains cycles. Cannot create a hierarchical layout.")
-            plt.close()
+        # Tables of a cycle share a layer, so cyclic lineage renders too
+        nx.set_node_attributes(self.G, longest_path_layers(self.G), 'layer')
+
+        # Use multipartite layout with increased spacing
+        pos = nx.multipartite_layout(self.G,
+                                     subset_key='layer',
+                                     scale=3.0,
+                                     align='horizontal')  # Left to right
+
+        # Draw nodes
+        nx.draw_networkx_nodes(self.G, pos,
+                               node_color='lightblue',
+                               node_size=2000,
+                               alpha=0.7)
+
+        # Draw edges with slight curve for better visibility
+        nx.draw_networkx_edges(self.G, pos,
+                               edge_color='gray',
+                               arrows=True,
+                               arrowsize=20,
+                               connectionstyle='arc3,rad=0.2')
+
+        # Add labels
+        nx.draw_networkx_labels(self.G, pos,
+                                font_size=8,
+                                font_weight='bold')
+
+        plt.title("Table Lineage Graph")
+        plt.margins(x=0.2, y=0.2)
+        plt.axis('off')
+        plt.tight_layout()
+
+        # Save to file
+        plt.savefig(output_file, format='png', dpi=300, bbox_inches='tight')
+        plt.close()
 
     def create_static_graph2(self, output_file='graph_static.png'):
         """Create static visualization using NetworkX and Matplotlib."""
         plt.figure(figsize=(15, 10))
 
-        # Assign layers based on distance from source nodes
-        def assign_layers(G):
-            layers = {}
-            # Find source nodes (nodes with no incoming edges)
-            sources = [n for n in G.nodes() if G.in_degree(n) == 0]
-
-            # Assign layers using BFS
-            for source in sources:
-                for node in nx.bfs_tree(G, source):
-                    # Get max distance from any source
-                    dist = max([nx.shortest_path_length(G, s, node)
-                                for s in sources if nx.has_path(G, s, node)])
-                    layers[node] = dist
-            return layers
-
-        # Assign layers to nodes
-        layers = assign_layers(self.G)
-        for node, layer in layers.items():
-            self.G.nodes[node]['layer'] = layer
+        # Assign layers based on the longest path from source nodes
+        nx.set_node_attributes(self.G, longest_path_layers(self.G), 'layer')
 
         # Use multipartite layout for left-to-right arrangement
         pos = nx.multipartite_layout(self.G,
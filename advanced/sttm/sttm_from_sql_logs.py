@@ -1,29 +1,243 @@
-import sqlparse
+import argparse
+import hashlib
 import re
-from collections import defaultdict
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache, partial
 import csv
+import glob
 import json
+import os
 
+from column_lineage import ColumnLineageExtractor
+from lineage_reachability import ReachabilityIndex
+from neptune_csv_writer import DEFAULT_MAX_BYTES, write_neptune_csv, write_neptune_csv_parts
+
+# Large files are split into ranges of about this size (at a ';') so one file can keep several workers busy
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Statements end at a ';' or at a blank line followed by the next statement
+STATEMENT_PATTERN = r';|\n\n(?=(?:SELECT|INSERT|UPDATE|CREATE|MERGE))'
+STATEMENT_SPLIT_RE = re.compile(STATEMENT_PATTERN)
+STATEMENT_SPLIT_BYTES_RE = re.compile(STATEMENT_PATTERN.encode())
+# Longest separator match plus look-ahead, the tail of a buffer rescanned after more data is read
+STATEMENT_SPLIT_OVERLAP = len('\n\nINSERT')
+
+# Files are streamed in blocks of this size
+DEFAULT_READ_SIZE = 1024 * 1024
+# A checkpoint remembers a hash of up to this many leading bytes of each file, so a file rotated by
+# copytruncate and grown back past the saved offset is read again from the start
+HEAD_CHECKSUM_BYTES = 4096
+
+# Where the SQL starts after log text, WITH only when it opens a CTE
+STATEMENT_START = r'(?=SELECT|INSERT|UPDATE|CREATE|MERGE|WITH\s+\w+\s+AS\s*\()'
+
+# Common log patterns to clean up
+LOG_PATTERNS = [
+    r'^Created\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?' + STATEMENT_START,
+    r'^Populated\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?' + STATEMENT_START,
+    r'^\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}.*?' + STATEMENT_START,  # Timestamp logs
+    r'Running query:.*?' + STATEMENT_START,  # Query execution logs
+    r'INFO:.*?' + STATEMENT_START,  # Info logs
+    r'DEBUG:.*?' + STATEMENT_START,  # Debug logs
+    r'Query completed.*$',  # Query completion logs
+    r'Affected rows:.*$',  # Row count logs
+    r'Execution time:.*$'  # Execution time logs
+]
+
+# Parts of a cleaned statement that look like SQL: they start with a keyword, a name or a parenthesis
+SQL_LINE_RE = re.compile(r'[A-Za-z0-9_.()]')
+
+# Enhanced pattern for table names with optional schema/database prefixes
+TABLE_PATTERN = r'(?:\w+\.){0,3}\w+(?=\s|$|\))'
+
+# Pattern to exclude common SQL functions that might be mistaken for table names
+FUNCTION_RE = re.compile(r'\b(COUNT|SUM|AVG|MAX|MIN|COALESCE|CASE|WHEN|THEN|END|AND|OR|IN|EXISTS|BETWEEN)\b')
+
+# The statements are upper-cased and whitespace-collapsed before these run
+TARGET_RE = re.compile(r'(?:INTO|UPDATE|MERGE INTO)\s+(' + TABLE_PATTERN + ')')
+CREATE_TARGET_RE = re.compile(r'(?:CREATE|REPLACE)\s+(?:VIEW|TABLE)\s+((?:\w+\.){0,3}\w+)')
+SOURCE_RE = re.compile(r'(?:FROM|JOIN)\s+(' + TABLE_PATTERN + ')')
+CTE_RE = re.compile(r'WITH\s+(\w+)\s+AS\s*\(')
+# What sqlparse's Statement.get_type() reports as DELETE: the statement, or the statement after its CTEs, is a DELETE
+DELETE_RE = re.compile(r'(?:/\*.*?\*/\s*)*(?:WITH\b.*?\)\s*)?DELETE\b')
+
+# Statement fingerprints: string literals and numbers (including the timestamps/row counts of the log lines)
+# become '?', so executions of one statement template with different values share a fingerprint.
+# Quoted identifiers are matched to be kept as they are, and a number right after a '.' or a name character is
+# part of a name (DB.2023, t_2024), not a literal
+LITERAL_RE = re.compile(r"(?P<identifier>\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[A-Za-z_][^\]]*\])"
+                        r"|'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?\b")
+
+# Statement shapes whose tables are remembered
+DEFAULT_CACHE_SIZE = 10000
+
+
+def statement_fingerprint(stmt):
+    """
+    Hash of the shape of a statement: literals and numbers replaced, whitespace collapsed, upper-cased
+
+    Returns:
+        bytes: 16 byte digest
+    """
+    shape = ' '.join(LITERAL_RE.sub(lambda match: match.group('identifier') or '?', stmt).split()).upper()
+    return hashlib.blake2b(shape.encode('utf-8', errors='replace'), digest_size=16).digest()
+
+
+# Log line timestamps, the time a statement ran
+LOG_TIMESTAMP_RE = re.compile(r'(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+
+
+@lru_cache(maxsize=4096)
+def parse_log_time(day, clock):
+    """'2024-03-01', '10:00:02' -> epoch seconds, log times are taken as UTC"""
+    return datetime.fromisoformat(f'{day}T{clock}').replace(tzinfo=timezone.utc).timestamp()
+
+
+def statement_time(stmt, default=None):
+    """Epoch seconds of the first log timestamp in the statement text, default (now) when there is none"""
+    match = LOG_TIMESTAMP_RE.search(stmt)
+    if match:
+        return parse_log_time(match.group(1), match.group(2))
+    return time.time() if default is None else default
+
+
+def format_time(seconds):
+    """Epoch seconds -> ISO 8601 UTC, the Date format of the Neptune bulk loader"""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class LineageEdgeStore:
+    """
+    Distinct source -> target table edges with their occurrence count and first/last seen time.
+
+    Table names are interned to ints and an edge is keyed by source_id << 32 | target_id, the count and times live
+    in flat arrays, so memory grows with the distinct edges and not with the number of statements. Edges keep the
+    position they were first added at, which gives them a stable id across incremental runs.
+    """
 
-class SQLLineageParser:
     def __init__(self):
-        """Initialize the parser with data structures to store mappings"""
+        self.names = []
+        self.name_ids = {}
+        self.edge_positions = {}
+        self.keys = array('q')
+        self.counts = array('q')
+        self.first_seen = array('d')
+        self.last_seen = array('d')
+        # positions added or updated and names interned since mark_clean(), the delta of an incremental run
+        self.changed = set()
+        self.clean_names = 0
+
+    def intern(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add(self, source, target, seen, count=1, last_seen=None):
+        """
+        Count an occurrence of source -> target seen at `seen` (epoch seconds)
+
+        Returns:
+            int: position of the edge
+        """
+        key = self.intern(source) << 32 | self.intern(target)
+        last_seen = seen if last_seen is None else last_seen
+        position = self.edge_positions.get(key)
+        if position is None:
+            position = self.edge_positions[key] = len(self.keys)
+            self.keys.append(key)
+            self.counts.append(count)
+            self.first_seen.append(seen)
+            self.last_seen.append(last_seen)
+        else:
+            self.counts[position] += count
+            self.first_seen[position] = min(self.first_seen[position], seen)
+            self.last_seen[position] = max(self.last_seen[position], last_seen)
+        self.changed.add(position)
+        return position
+
+    def merge(self, other):
+        """Add the edges of another store (e.g. from a worker process), counts add up"""
+        for source, target, count, first_seen, last_seen in other:
+            self.add(source, target, first_seen, count, last_seen)
+
+    def mark_clean(self):
+        self.changed = set()
+        self.clean_names = len(self.names)
+
+    def new_names(self):
+        """Names interned since mark_clean()"""
+        return self.names[self.clean_names:]
+
+    def edge(self, position):
+        """(source, target, count, first_seen, last_seen) of the edge at position"""
+        key = self.keys[position]
+        return (self.names[key >> 32], self.names[key & 0xFFFFFFFF], self.counts[position],
+                self.first_seen[position], self.last_seen[position])
+
+    def __iter__(self):
+        for position in range(len(self.keys)):
+            yield self.edge(position)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_state(self):
+        """JSON-friendly state for the checkpoint"""
+        edges = zip(self.keys, self.counts, self.first_seen, self.last_seen)
+        return {'names': self.names,
+                'edges': [[key >> 32, key & 0xFFFFFFFF, count, first, last] for key, count, first, last in edges]}
+
+    @classmethod
+    def from_state(cls, state):
+        store = cls()
+        for name in state['names']:
+            store.intern(name)
+        for source_id, target_id, count, first_seen, last_seen in state['edges']:
+            store.add(store.names[source_id], store.names[target_id], first_seen, count, last_seen)
+        store.mark_clean()
+        return store
+
+
+def compile_log_patterns(patterns):
+    """Combine the log patterns into one regex, so a statement is scanned once instead of once per pattern"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE | re.MULTILINE)
+
+
+class SQLLineageParser:
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, column_lineage=False):
+        """
+        Initialize the parser with data structures to store mappings
+
+        Args:
+            cache_size (int): statement fingerprints kept in the LRU parse cache, 0 disables the cache
+            column_lineage (bool): also extract column-level mappings (column_lineage.ColumnLineageExtractor)
+        """
         self.source_tables = set()
         self.target_tables = set()
-        self.mappings = []
-
-        # Common log patterns to clean up
-        self.log_patterns = [
-            r'^Created\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)'
-            r'^Populated\s+\S+\s+\S+\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}:\d{6}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)'
-            r'^\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',  # Timestamp logs
-            r'Running query:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',  # Query execution logs
-            r'INFO:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',  # Info logs
-            r'DEBUG:.*?(?=SELECT|INSERT|UPDATE|CREATE|MERGE)',  # Debug logs
-            r'Query completed.*$',  # Query completion logs
-            r'Affected rows:.*$',  # Row count logs
-            r'Execution time:.*$'  # Execution time logs
-        ]
+        # distinct source -> target mappings with count and first/last seen
+        self.edges = LineageEdgeStore()
+        # target column -> source column mappings, columns named column_id(table, column)
+        self.column_lineage = ColumnLineageExtractor() if column_lineage else None
+        self.column_edges = LineageEdgeStore()
+        # file path -> {'inode', 'offset'}: how far each log file has been parsed, for incremental runs
+        self.file_offsets = {}
+        # tables loaded from a checkpoint, the others are new in this run (changed edges are tracked by the store)
+        self.known_tables = set()
+        # statement fingerprint -> (sources, targets, column mappings), least recently used first
+        self.cache_size = cache_size
+        self.parse_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Common log patterns to clean up, compiled once into a single alternation
+        self.log_patterns = list(LOG_PATTERNS)
+        self.log_regex = compile_log_patterns(self.log_patterns)
 
     def clean_sql_statement(self, sql):
         """
@@ -34,20 +248,15 @@ class SQLLineageParser:
         Returns:
             str: Cleaned SQL statement
         """
-        # Remove common log patterns
-        cleaned_sql = sql.strip()
-        for pattern in self.log_patterns:
-            cleaned_sql = re.sub(pattern, '', cleaned_sql, flags=re.IGNORECASE | re.MULTILINE)
+        # Remove common log patterns in one pass
+        cleaned_sql = self.log_regex.sub('', sql.strip())
 
         # Remove any remaining lines that don't look like SQL
         sql_lines = []
         for line in cleaned_sql.split(';'): #cleaned_sql.split('\n'):
             line = line.strip()
             # Keep lines that start with common SQL keywords or are part of SQL statements
-            if (re.match(
-                    r'^(SELECT|INSERT|UPDATE|CREATE|MERGE|FROM|JOIN|WHERE|GROUP|ORDER|HAVING|WITH|AND|OR|UNION|INTO|AS|\()',
-                    line, re.IGNORECASE) or
-                    re.match(r'^\s*[A-Za-z0-9_\.\(\)]', line)):
+            if SQL_LINE_RE.match(line):
                 sql_lines.append(line)
 
         return ' '.join(sql_lines)
@@ -76,142 +285,603 @@ class SQLLineageParser:
         # Normalize SQL statement
         sql = ' '.join(sql.split()).upper()
 
-        # Enhanced pattern for table names with optional schema/database prefixes
-        table_pattern = r'(?:[\w]+\.){0,3}[\w]+(?=\s|$|\))'
-
-        # Pattern to exclude common SQL functions that might be mistaken for table names
-        function_pattern = r'\b(COUNT|SUM|AVG|MAX|MIN|COALESCE|CASE|WHEN|THEN|END|AND|OR|IN|EXISTS|BETWEEN)\b'
-
         sources = set()
         targets = set()
 
-        try:
-            # Parse the SQL statement
-            parsed = sqlparse.parse(sql)[0]
-            stmt_type = parsed.get_type()
-
-            if stmt_type == 'DELETE':
-                return [], []
-
-            # Extract target tables
-            # if stmt_type in ('INSERT', 'UPDATE', 'MERGE'):
-            if self.check_keywords(sql, ['INSERT', 'UPDATE', 'MERGE']):
-                target_match = re.search(f"(?:INTO|UPDATE|MERGE INTO)\s+({table_pattern})", sql)
-                if target_match and not re.match(function_pattern, target_match.group(1)):
-                    targets.add(target_match.group(1))
-
-            elif self.check_keywords(sql, ['CREATE', 'REPLACE']): #'CREATE' in sql or 'REPLACE' in sql:
-                target_match = re.search(f"(?:CREATE|REPLACE)\s+(VIEW|TABLE)\s+((?:[\w]+\.){0,3}[\w]+)", sql) #((?:[\w]+\.){0,3}[\w]+)
-                if target_match and not re.match(function_pattern, target_match.group(1)):
-                    targets.add(target_match.group(1))
-
-            # Extract source tables
-            from_clauses = re.finditer(r'FROM\s+({})'.format(table_pattern), sql)
-            join_clauses = re.finditer(r'JOIN\s+({})'.format(table_pattern), sql)
-
-            for match in from_clauses:
-                table_name = match.group(1)
-                if not re.match(function_pattern, table_name):
-                    sources.add(table_name)
-
-            for match in join_clauses:
-                table_name = match.group(1)
-                if not re.match(function_pattern, table_name):
-                    sources.add(table_name)
-
-            # Handle CTEs
-            cte_pattern = r'WITH\s+(\w+)\s+AS\s*\('
-            cte_names = set(re.findall(cte_pattern, sql))
-            sources = {table for table in sources if table not in cte_names}
-
-        except Exception as e:
-            print(f"Error parsing SQL statement: {e}")
+        if DELETE_RE.match(sql):
             return [], []
 
+        # Extract target tables
+        if self.check_keywords(sql, ['INSERT', 'UPDATE', 'MERGE']):
+            target_match = TARGET_RE.search(sql)
+            if target_match and not FUNCTION_RE.match(target_match.group(1)):
+                targets.add(target_match.group(1))
+
+        elif self.check_keywords(sql, ['CREATE', 'REPLACE']):
+            target_match = CREATE_TARGET_RE.search(sql)
+            if target_match and not FUNCTION_RE.match(target_match.group(1)):
+                targets.add(target_match.group(1))
+
+        # Extract source tables
+        for match in SOURCE_RE.finditer(sql):
+            table_name = match.group(1)
+            if not FUNCTION_RE.match(table_name):
+                sources.add(table_name)
+
+        # Handle CTEs
+        cte_names = set(CTE_RE.findall(sql))
+        sources = {table for table in sources if table not in cte_names}
+
         return list(sources), list(targets)
 
+    def extract_column_mappings(self, sql):
+        """
+        Column-level mappings of a statement, empty unless the parser was created with column_lineage=True
+
+        Returns:
+            list: (target_table, target_column, source_table, source_column) tuples
+        """
+        if self.column_lineage is None:
+            return []
+        try:
+            return self.column_lineage.extract(self.clean_sql_statement(sql))
+        except Exception as e:
+            print(f"Error parsing SQL statement columns: {e}")
+            return []
+
+    def cached_extract(self, sql):
+        """
+        extract_table_names and extract_column_mappings behind an LRU cache keyed by statement_fingerprint.
+        Logs repeat a few thousand statement templates with different literals, a template is parsed once and
+        the tables of its first statement are reused for the others.
+
+        Returns:
+            tuple: (sources, targets, column mappings)
+        """
+        if not self.cache_size:
+            return self.extract_table_names(sql) + (self.extract_column_mappings(sql),)
+        key = statement_fingerprint(sql)
+        result = self.parse_cache.get(key)
+        if result is not None:
+            self.parse_cache.move_to_end(key)
+            self.cache_hits += 1
+            return result
+        self.cache_misses += 1
+        result = self.extract_table_names(sql) + (self.extract_column_mappings(sql),)
+        self.parse_cache[key] = result
+        if len(self.parse_cache) > self.cache_size:
+            self.parse_cache.popitem(last=False)
+        return result
+
+    def cached_extract_table_names(self, sql):
+        """extract_table_names through the parse cache"""
+        return self.cached_extract(sql)[:2]
+
+    def cache_stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate and size of the parse cache
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'hit_rate': self.cache_hits / lookups if lookups else 0.0, 'size': len(self.parse_cache)}
+
     def process_sql_file(self, file_path):
         """
-        Process SQL file and extract source-to-target mappings
+        Process SQL file and extract source-to-target mappings.
+        The file is streamed statement by statement, memory use does not grow with the file size.
 
         Args:
             file_path (str): Path to SQL file
         """
-        with open(file_path, 'r') as f:
-            sql_content = f.read()
+        for _ in self.iter_file_mappings(file_path):
+            pass
+
+    def iter_file_mappings(self, file_path, start=0, end=None):
+        """
+        Process a SQL file (or the byte range start:end of it) and yield every new mapping as soon as
+        its statement has been read
+
+        Yields:
+            dict: {'source', 'target'}
+        """
+        for stmt in iter_sql_statements(file_path, start, end):
+            yield from self.process_statement(stmt)
+
+    def process_sql_text(self, sql_content):
+        """
+        Extract source-to-target mappings from SQL log text
 
+        Args:
+            sql_content (str): SQL statements with log messages around them
+        """
         # Split content into SQL statements
         # Look for statement terminators and common log patterns
-        statement_pattern = r';|\n\n(?=(?:SELECT|INSERT|UPDATE|CREATE|MERGE))'
-        statements = re.split(statement_pattern, sql_content)
-
-        for stmt in statements:
+        for stmt in STATEMENT_SPLIT_RE.split(sql_content):
             if stmt.strip():
-                sources, targets = self.extract_table_names(stmt)
+                self.process_statement(stmt)
 
-                # Store unique tables
-                self.source_tables.update(sources)
-                self.target_tables.update(targets)
+    def process_statement(self, stmt):
+        """
+        Extract the tables of one statement and store them
 
-                # Create mappings
-                for target in targets:
-                    for source in sources:
-                        self.mappings.append({
-                            'source': source,
-                            'target': target
-                        })
+        Returns:
+            list: the mappings of the statement
+        """
+        sources, targets, column_mappings = self.cached_extract(stmt)
+
+        # Store unique tables
+        self.source_tables.update(sources)
+        self.target_tables.update(targets)
+
+        # Count mappings, seen at the statement's log timestamp
+        mappings = [{'source': source, 'target': target} for target in targets for source in sources]
+        if mappings or column_mappings:
+            seen = statement_time(stmt)
+            for mapping in mappings:
+                self.edges.add(mapping['source'], mapping['target'], seen)
+            for target_table, target_column, source_table, source_column in column_mappings:
+                self.column_edges.add(column_id(source_table, source_column), column_id(target_table, target_column),
+                                      seen)
+        return mappings
+
+    @property
+    def mappings(self):
+        """Distinct mappings: {'source', 'target', 'count', 'first_seen', 'last_seen'}, times as ISO 8601"""
+        return [mapping_row(edge) for edge in self.edges]
+
+    def merge(self, source_tables, target_tables, edges, column_edges=None):
+        """Add the results of another parser (e.g. a worker process) to this one"""
+        self.source_tables.update(source_tables)
+        self.target_tables.update(target_tables)
+        self.edges.merge(edges)
+        if column_edges is not None:
+            self.column_edges.merge(column_edges)
+
+    def process_sql_files(self, inputs, workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES, incremental=False):
+        """
+        Process many SQL log files on a process pool.
+        Every file is split into ranges of about chunk_bytes ending at a ';', the ranges are parsed in parallel
+        and the results merged in file order, so the edges come out as if the files were read one by one.
+
+        Args:
+            inputs: file path, directory, glob pattern ('logs/*.sql') or a list of those
+            workers (int): worker processes, defaults to the number of CPUs
+            chunk_bytes (int): approximate size of the ranges a file is split into
+            incremental (bool): continue every file from file_offsets (see load_checkpoint) instead of the start,
+                a file with another inode, shorter than its offset or starting with other bytes than when the
+                checkpoint was taken (rotated/truncated, also copytruncate and grown back) is read again.
+                An unterminated statement at the end of a file is left for the next run, it may still be written.
+        """
+        ranges = []
+        paths = []
+        for path in sql_log_paths(inputs):
+            path = os.path.abspath(path)
+            paths.append(path)
+            stat = os.stat(path)
+            start = 0
+            saved = self.file_offsets.get(path)
+            if incremental and saved and saved['inode'] == stat.st_ino and saved['offset'] <= stat.st_size:
+                # checkpoints written before the head checksum was added only compare inode and size
+                head = file_head_checksum(path, saved['offset'])
+                if saved.get('head', head) == head:
+                    start = saved['offset']
+            self.file_offsets[path] = {'inode': stat.st_ino, 'offset': start}
+            file_ranges = split_file_ranges(path, chunk_bytes, start, stat.st_size)
+            ranges.extend((file_path, range_start, end, incremental and end == stat.st_size)
+                          for file_path, range_start, end in file_ranges)
+
+        def merge_results(results):
+            for (path, _, _, _), result in zip(ranges, results):
+                self.merge(result['source_tables'], result['target_tables'], result['edges'], result['column_edges'])
+                self.file_offsets[path]['offset'] = result['offset']
+                self.cache_hits += result['cache_hits']
+                self.cache_misses += result['cache_misses']
+            for path in paths:
+                self.file_offsets[path]['head'] = file_head_checksum(path, self.file_offsets[path]['offset'])
+
+        parse = partial(parse_file_range, column_lineage=self.column_lineage is not None,
+                        cache_size=self.cache_size, log_patterns=self.log_patterns)
+        if workers == 1 or len(ranges) <= 1:
+            merge_results(map(parse, ranges))
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            merge_results(executor.map(parse, ranges))
+
+    def save_checkpoint(self, checkpoint_file):
+        """
+        Save the file offsets and the lineage found so far, the next incremental run continues from there.
+        The file is replaced atomically, a crash leaves the previous checkpoint.
+        """
+        state = {
+            'version': 2,
+            'files': self.file_offsets,
+            'source_tables': sorted(self.source_tables),
+            'target_tables': sorted(self.target_tables),
+            'edges': self.edges.to_state(),
+            'column_edges': self.column_edges.to_state(),
+        }
+        with open(checkpoint_file + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    def load_checkpoint(self, checkpoint_file):
+        """
+        Restore a checkpoint written by save_checkpoint, a missing file starts from scratch
+
+        Returns:
+            bool: True when a checkpoint was loaded
+        """
+        if not os.path.exists(checkpoint_file):
+            return False
+        with open(checkpoint_file) as f:
+            state = json.load(f)
+        self.file_offsets = state['files']
+        self.source_tables = set(state['source_tables'])
+        self.target_tables = set(state['target_tables'])
+        if 'edges' in state:
+            self.edges = LineageEdgeStore.from_state(state['edges'])
+        else:
+            # version 1 kept every mapping occurrence, without times
+            self.edges = LineageEdgeStore()
+            for source, target in state['mappings']:
+                self.edges.add(source, target, time.time())
+            self.edges.mark_clean()
+        if 'column_edges' in state:
+            self.column_edges = LineageEdgeStore.from_state(state['column_edges'])
+        self.known_tables = self.source_tables | self.target_tables
+        return True
 
     def generate_mapping_csv(self, output_file):
-        """Generate CSV file with source-to-target mappings"""
+        """Generate CSV file with the distinct source-to-target mappings, their count and first/last seen"""
         with open(output_file, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['source', 'target'])
+            writer = csv.DictWriter(f, fieldnames=MAPPING_FIELDS)
             writer.writeheader()
-            writer.writerows(self.mappings)
+            writer.writerows(mapping_row(edge) for edge in self.edges)
 
-    def generate_neptune_files(self, nodes_file, edges_file):
-        """Generate node and edge files for AWS Neptune"""
-        nodes = []
-        all_tables = self.source_tables.union(self.target_tables)
+    def generate_column_mapping_csv(self, output_file):
+        """Generate CSV file with the distinct column-level mappings, their count and first/last seen"""
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMN_MAPPING_FIELDS)
+            writer.writeheader()
+            writer.writerows(column_mapping_row(edge) for edge in self.column_edges)
+
+    def iter_neptune_nodes(self, delta=False):
+        """
+        Table and Column nodes, one dict at a time ({'~id', '~label', property: value})
 
-        # Generate nodes
+        Args:
+            delta (bool): only the tables and columns added since load_checkpoint
+        """
+        all_tables = self.source_tables.union(self.target_tables)
+        if delta:
+            all_tables -= self.known_tables
         for table in all_tables:
             # Clean up table name for label
             table_parts = table.split('.')
-            label = table_parts[-1]  # Use last part as label
-            nodes.append({
+            yield {
                 '~id': table,
-                '~label': label,
+                '~label': table_parts[-1],  # Use last part as label
                 'name': table,
                 'schema': '.'.join(table_parts[:-1]) if len(table_parts) > 1 else 'default'
-            })
+            }
+
+        columns = self.column_edges.new_names() if delta else self.column_edges.names
+        for column in columns:
+            table, name = split_column_id(column)
+            yield {
+                '~id': column,
+                '~label': 'Column',
+                'name': name,
+                'table': table
+            }
+
+    def iter_neptune_edges(self, delta=False):
+        """
+        TO_TARGET edges between tables and DERIVES_FROM edges from a target column to its source columns,
+        one dict at a time ({'~id', '~from', '~to', '~label', property: value})
+
+        Args:
+            delta (bool): only the edges added or updated since load_checkpoint, edge ids are stable across runs
+        """
+        # DERIVES_FROM points from the target column back to its source
+        for prefix, store, label, reverse in (('e', self.edges, 'TO_TARGET', False),
+                                              ('c', self.column_edges, 'DERIVES_FROM', True)):
+            positions = sorted(store.changed) if delta else range(len(store))
+            for idx in positions:
+                source, target, count, first_seen, last_seen = store.edge(idx)
+                if reverse:
+                    source, target = target, source
+                yield {
+                    '~id': f'{prefix}{idx}',
+                    '~from': source,
+                    '~to': target,
+                    '~label': label,
+                    'count': count,
+                    'first_seen': format_time(first_seen),
+                    'last_seen': format_time(last_seen)
+                }
+
+    def generate_neptune_files(self, nodes_file, edges_file, backend=None, delta=False, format='gremlin',
+                               compress=False):
+        """
+        Generate node and edge CSV files for the AWS Neptune bulk loader, streamed from the parser state.
+        Column-level lineage adds Column nodes and DERIVES_FROM edges from a target column to its source columns.
 
-        # Generate edges
-        edges = []
-        for idx, mapping in enumerate(self.mappings):
-            edges.append({
-                '~id': f'e{idx}',
-                '~from': mapping['source'],
-                '~to': mapping['target'],
-                '~label': 'TO_TARGET'
-            })
+        Args:
+            backend: optional graph backend (generic_load_vertices_edge.graph_backend), anything with
+                upsert_vertices(rows)/upsert_edges(rows). The lineage is also written there, e.g. an
+                in-process EmbeddedGraph for small jobs or a GremlinBackend for a Gremlin Server/Neptune.
+            delta (bool): only the tables added and the edges added or updated since load_checkpoint, edge ids are
+                stable across runs so the files can be loaded as an upsert batch
+            format (str): 'gremlin' or 'opencypher' CSV
+            compress (bool): gzip both files, written as nodes_file.gz and edges_file.gz
 
-        # Write files
-        with open(nodes_file, 'w') as f:
-            for node in nodes:
-                f.write(json.dumps(node) + '\n')
+        Returns:
+            list: paths written
+        """
+        paths = write_neptune_csv(self.iter_neptune_nodes(delta), self.iter_neptune_edges(delta), nodes_file,
+                                  edges_file, NODE_PROPERTIES, EDGE_PROPERTIES, format, compress=compress)
+
+        if backend is not None:
+            backend.upsert_vertices({'id': node['~id'], 'label': node['~label'],
+                                     'properties': {prop: value for prop, value in node.items() if prop[0] != '~'}}
+                                    for node in self.iter_neptune_nodes(delta))
+            backend.upsert_edges({'from': edge['~from'], 'to': edge['~to'], 'label': edge['~label'],
+                                  'properties': {prop: edge[prop] for prop, _ in EDGE_PROPERTIES}}
+                                 for edge in self.iter_neptune_edges(delta))
+        return paths
+
+    def generate_neptune_parts(self, output_dir, delta=False, format='gremlin', max_bytes=DEFAULT_MAX_BYTES,
+                               compress=False):
+        """
+        Like generate_neptune_files, split into nodes-00000.csv, edges-00000.csv, ... of at most max_bytes each
+        (uncompressed) in output_dir, so the bulk loader can read the parts in parallel
 
-        with open(edges_file, 'w') as f:
-            for edge in edges:
-                f.write(json.dumps(edge) + '\n')
+        Returns:
+            list: paths written
+        """
+        return write_neptune_csv_parts(self.iter_neptune_nodes(delta), self.iter_neptune_edges(delta), output_dir,
+                                       NODE_PROPERTIES, EDGE_PROPERTIES, format, max_bytes, compress)
+
+
+# Neptune CSV property columns, tables have name/schema, columns name/table
+NODE_PROPERTIES = [('name', 'String'), ('schema', 'String'), ('table', 'String')]
+EDGE_PROPERTIES = [('count', 'Long'), ('first_seen', 'Date'), ('last_seen', 'Date')]
+
+MAPPING_FIELDS = ['source', 'target', 'count', 'first_seen', 'last_seen']
+COLUMN_MAPPING_FIELDS = ['source_table', 'source_column', 'target_table', 'target_column', 'count', 'first_seen',
+                         'last_seen']
+
+
+def column_id(table, column):
+    """Node id of a column, '#' keeps DB.T#C apart from a table named DB.T.C"""
+    return f'{table}#{column}'
+
+
+def split_column_id(column):
+    """column_id -> (table, column)"""
+    table, _, name = column.rpartition('#')
+    return table, name
+
+
+def column_mapping_row(edge):
+    source, target, count, first_seen, last_seen = edge
+    source_table, source_column = split_column_id(source)
+    target_table, target_column = split_column_id(target)
+    return {'source_table': source_table, 'source_column': source_column, 'target_table': target_table,
+            'target_column': target_column, 'count': count,
+            'first_seen': format_time(first_seen), 'last_seen': format_time(last_seen)}
+
+
+def mapping_row(edge):
+    source, target, count, first_seen, last_seen = edge
+    return {'source': source, 'target': target, 'count': count,
+            'first_seen': format_time(first_seen), 'last_seen': format_time(last_seen)}
+
+
+def sql_log_paths(inputs):
+    """
+    Files named by a path, directory, glob pattern or a list of those, in sorted order
+
+    Returns:
+        list: file paths
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(os.path.join(item, name) for name in os.listdir(item)
+                                if os.path.isfile(os.path.join(item, name))))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(sorted(path for path in glob.glob(item) if os.path.isfile(path)))
+    return paths
+
+
+def file_head_checksum(file_path, size):
+    """sha1 hex digest of the first min(size, HEAD_CHECKSUM_BYTES) bytes of a file"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read(min(size, HEAD_CHECKSUM_BYTES))).hexdigest()
+
+
+def split_file_ranges(file_path, chunk_bytes=DEFAULT_CHUNK_BYTES, start=0, size=None):
+    """
+    Split a file into (path, start, end) byte ranges of about chunk_bytes, every range but the last ends
+    right after a ';' so no statement is cut in two. ';' is a single byte in UTF-8, so the ranges decode cleanly.
+
+    Args:
+        start (int), size (int): split the bytes start:size only, size defaults to the file size
+    Returns:
+        list: (file_path, start, end) tuples covering the bytes
+    """
+    if size is None:
+        size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, 'rb') as f:
+        while start < size:
+            end = start + chunk_bytes
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                # look for the next statement terminator, a range without one runs to the end of the file
+                while True:
+                    block = f.read(1024 * 1024)
+                    if not block:
+                        end = size
+                        break
+                    position = block.find(b';')
+                    if position >= 0:
+                        end += position + 1
+                        break
+                    end += len(block)
+            ranges.append((file_path, start, end))
+            start = end
+    return ranges
+
+
+def iter_sql_statement_offsets(file_path, start=0, end=None, read_size=DEFAULT_READ_SIZE):
+    """
+    Stream the statements of a SQL log file, read read_size bytes at a time.
+    A statement cut by a block boundary is kept and completed with the next block, so memory stays bounded by
+    read_size plus the longest statement. The file is split as bytes (the separators are ASCII), which keeps the
+    offsets exact and never cuts a UTF-8 character.
+
+    Args:
+        start (int), end (int): byte range to read, end None reads to the end of the file
+    Yields:
+        tuple: (statement, byte offset right after the statement's separator), blank statements are skipped
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        buffer = b''
+        buffer_start = start  # file offset of buffer[0]
+        scanned = 0  # buffer[:scanned] holds no separator
+        while remaining is None or remaining > 0:
+            block = f.read(read_size if remaining is None else min(read_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            buffer += block
+            last = 0
+            for match in STATEMENT_SPLIT_BYTES_RE.finditer(buffer, max(0, scanned - STATEMENT_SPLIT_OVERLAP)):
+                if buffer[last:match.start()].strip():
+                    yield buffer[last:match.start()].decode('utf-8', errors='replace'), buffer_start + match.end()
+                last = match.end()
+            buffer = buffer[last:]
+            buffer_start += last
+            scanned = len(buffer)
+        if buffer.strip():
+            yield buffer.decode('utf-8', errors='replace'), buffer_start + len(buffer)
+
+
+def iter_sql_statements(file_path, start=0, end=None, read_size=DEFAULT_READ_SIZE):
+    """Stream the statements of a SQL log file, see iter_sql_statement_offsets"""
+    for stmt, _ in iter_sql_statement_offsets(file_path, start, end, read_size):
+        yield stmt
+
+
+def parse_file_range(file_range, column_lineage=False, cache_size=DEFAULT_CACHE_SIZE, log_patterns=None):
+    """
+    Worker for process_sql_files: parse one (path, start, end, hold_tail) byte range.
+    With hold_tail a last statement not terminated by ';' is not parsed, the file may still be growing.
+
+    Args:
+        cache_size, log_patterns: the calling parser's, so the workers cache and clean like it does
+
+    Returns:
+        dict: source_tables, target_tables, edges, column_edges, offset (parsed up to), cache_hits, cache_misses
+    """
+    file_path, start, end, hold_tail = file_range
+    parser = SQLLineageParser(cache_size=cache_size, column_lineage=column_lineage)
+    if log_patterns is not None:
+        parser.log_patterns = list(log_patterns)
+        parser.log_regex = compile_log_patterns(parser.log_patterns)
+    offset = start
+    for stmt, stmt_end in iter_sql_statement_offsets(file_path, start, end):
+        if hold_tail and stmt_end == end and not _ends_with_terminator(file_path, end):
+            break
+        parser.process_statement(stmt)
+        offset = stmt_end
+    else:
+        offset = end
+    return {'source_tables': parser.source_tables, 'target_tables': parser.target_tables, 'edges': parser.edges,
+            'column_edges': parser.column_edges, 'offset': offset,
+            'cache_hits': parser.cache_hits, 'cache_misses': parser.cache_misses}
+
+
+def _ends_with_terminator(file_path, end):
+    with open(file_path, 'rb') as f:
+        f.seek(end - 1)
+        return f.read(1) == b';'
 
 
 def main():
-    """Main function to demonstrate usage"""
-    parser = SQLLineageParser()
-    parser.process_sql_file('input.sql')
-    parser.generate_mapping_csv('mappings.csv')
-    parser.generate_neptune_files('nodes.csv', 'edges.csv')
+    """
+    Parse SQL logs into mappings.csv, nodes.csv and edges.csv
+
+        python sttm_from_sql_logs.py logs/ --workers 8
+        python sttm_from_sql_logs.py 'logs/*.sql' --checkpoint lineage_checkpoint.json
+        python sttm_from_sql_logs.py input.sql --columns     # also column_mappings.csv, Column nodes
+        python sttm_from_sql_logs.py logs/ --reachability lineage_reachability.json   # downstream/upstream index
+
+    With --checkpoint a run parses only the bytes appended since the previous run, mappings.csv still holds
+    the whole lineage while nodes.csv/edges.csv hold the new nodes and the new or updated edges only
+    (an upsert batch for Neptune).
+    """
+    arg_parser = argparse.ArgumentParser(description='Source to target mappings from SQL logs')
+    arg_parser.add_argument('inputs', nargs='*', default=['input.sql'], help='files, directories or glob patterns')
+    arg_parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to the CPUs')
+    arg_parser.add_argument('--checkpoint', help='checkpoint file for incremental runs')
+    arg_parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                            help='statement shapes kept in the parse cache, 0 disables it')
+    arg_parser.add_argument('--columns', action='store_true', help='extract column-level lineage too')
+    arg_parser.add_argument('--mappings', default='mappings.csv')
+    arg_parser.add_argument('--column-mappings', default='column_mappings.csv')
+    arg_parser.add_argument('--nodes', default='nodes.csv')
+    arg_parser.add_argument('--edges', default='edges.csv')
+    arg_parser.add_argument('--format', choices=['gremlin', 'opencypher'], default='gremlin',
+                            help='Neptune bulk load CSV format')
+    arg_parser.add_argument('--gzip', action='store_true', help='gzip the Neptune files')
+    arg_parser.add_argument('--neptune-dir', help='write size-bounded nodes-/edges- parts here instead of '
+                                                  '--nodes/--edges')
+    arg_parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES, help='size of a part')
+    arg_parser.add_argument('--reachability', help='keep a table reachability index (lineage_reachability) here')
+    args = arg_parser.parse_args()
+
+    parser = SQLLineageParser(cache_size=args.cache_size, column_lineage=args.columns)
+    incremental = args.checkpoint is not None
+    if incremental and parser.load_checkpoint(args.checkpoint):
+        print(f'Checkpoint: {len(parser.known_tables)} tables, {len(parser.edges)} mappings')
+    parser.process_sql_files(args.inputs, workers=args.workers, incremental=incremental)
+    stats = parser.cache_stats()
+    print(f"Parse cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})")
+    parser.generate_mapping_csv(args.mappings)
+    if args.columns:
+        parser.generate_column_mapping_csv(args.column_mappings)
+    if args.neptune_dir:
+        parser.generate_neptune_parts(args.neptune_dir, delta=incremental, format=args.format,
+                                      max_bytes=args.max_bytes, compress=args.gzip)
+    else:
+        parser.generate_neptune_files(args.nodes, args.edges, delta=incremental, format=args.format,
+                                      compress=args.gzip)
+    if args.reachability:
+        if incremental and os.path.exists(args.reachability):
+            index = ReachabilityIndex.load(args.reachability)
+            index.add_edges(parser.edges.edge(position)[:2] for position in parser.edges.changed)
+        else:
+            index = ReachabilityIndex.from_edge_store(parser.edges)
+        index.save(args.reachability)
+    if incremental:
+        print(f'New: {len(parser.source_tables | parser.target_tables) - len(parser.known_tables)} tables, '
+              f'{len(parser.edges.changed)} new or updated mappings')
+        parser.save_checkpoint(args.checkpoint)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,24 @@
+from column_lineage import ColumnLineageExtractor
+
+
+def test_merge_using_subquery():
+    sql = ("MERGE INTO tgt USING (SELECT id, amount AS amt FROM src) s ON tgt.id = s.id "
+           "WHEN MATCHED THEN UPDATE SET amount = s.amt")
+    assert ColumnLineageExtractor().extract(sql) == [('TGT', 'AMOUNT', 'SRC', 'AMOUNT')]
+
+
+def test_merge_using_subquery_with_aliases_and_insert():
+    sql = """MERGE INTO tgt t
+USING (
+  SELECT id, amount AS amt
+  FROM src
+) AS s
+ON t.id = s.id
+WHEN MATCHED THEN UPDATE SET t.amount = s.amt
+WHEN NOT MATCHED THEN INSERT (id, amount) VALUES (s.id, s.amt);"""
+    assert ColumnLineageExtractor().extract(sql) == [('TGT', 'AMOUNT', 'SRC', 'AMOUNT'), ('TGT', 'ID', 'SRC', 'ID')]
+
+
+def test_merge_using_table():
+    sql = "MERGE INTO tgt USING src s ON tgt.id = s.id WHEN MATCHED THEN UPDATE SET amount = s.amt;"
+    assert ColumnLineageExtractor().extract(sql) == [('TGT', 'AMOUNT', 'SRC', 'AMT')]
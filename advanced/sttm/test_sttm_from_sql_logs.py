@@ -0,0 +1,21 @@
+from sttm_from_sql_logs import SQLLineageParser, statement_fingerprint
+
+
+def test_fingerprint_ignores_literals():
+    assert (statement_fingerprint("INSERT INTO t SELECT * FROM s WHERE id = 1 AND name = 'a'") ==
+            statement_fingerprint("insert into t select * from s where id = 42.5 and name = 'it''s'"))
+
+
+def test_fingerprint_keeps_numbers_in_names():
+    assert (statement_fingerprint('INSERT INTO db.2023 SELECT * FROM src') !=
+            statement_fingerprint('INSERT INTO db.2024 SELECT * FROM src'))
+    assert (statement_fingerprint('INSERT INTO sales_2023 SELECT * FROM src') !=
+            statement_fingerprint('INSERT INTO sales_2024 SELECT * FROM src'))
+    assert (statement_fingerprint('INSERT INTO "2023" SELECT * FROM src') !=
+            statement_fingerprint('INSERT INTO "2024" SELECT * FROM src'))
+
+
+def test_cached_extract_does_not_share_tables_across_names():
+    parser = SQLLineageParser()
+    assert parser.cached_extract_table_names('INSERT INTO db.2023 SELECT * FROM src') == (['SRC'], ['DB.2023'])
+    assert parser.cached_extract_table_names('INSERT INTO db.2024 SELECT * FROM src') == (['SRC'], ['DB.2024'])
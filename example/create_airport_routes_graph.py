@@ -1,44 +1,94 @@
 from gremlin_python.structure.graph import Graph
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
 import csv
-from gremlin_python.process.traversal import T
 import random
+from generic_load_vertices_edge.batch_upsert import chunked, add_vertices_by_id_traversal, add_edges_by_id_traversal
+from generic_load_vertices_edge.concurrent_writer import ConcurrentGraphWriter
+from generic_load_vertices_edge.graph_backend import connect
 """
 # miles in the routes file are some random number
+run from this folder with the repo root on the path for the shared batch helpers and writer:
+PYTHONPATH=.. python create_airport_routes_graph.py
 """
 # Connect to your Gremlin Server
+# embedded://<name> loads into an in-process graph instead
+graph_url = 'ws://localhost:8182/gremlin'
 graph = Graph()
-remoteConn = DriverRemoteConnection('ws://localhost:8182/gremlin','g')
-g = graph.traversal().withRemote(remoteConn)
+# remoteConn = DriverRemoteConnection('ws://localhost:8182/gremlin','g')
+# g = graph.traversal().withRemote(remoteConn)
+g, remoteConn = connect(graph_url)
 vertex_label = 'airport::vertex'
+# concurrent writer connections, 0 sends every write on g one after another
+writers = 8
+# vertices/edges per round-trip
+batch_size = 500
 """
 With In memory TinkerGraph, you can use Long data type as an identifier for a vertex and edge
 """
+
+def submit(writer, write):
+    if writer is None:
+        write(g)
+    else:
+        writer.submit(write)
+
+
 # Function to load airports
-def load_airports(file_path):
-    with open(file_path, 'r') as file:
-        reader = csv.DictReader(file)
-        vertex_id = 40000
-        for row in reader:
-            vertex_id = vertex_id + 1
-            g.addV(vertex_label).property(T.id, vertex_id).property('code', row['code']).property('name', row['name']).next()
+def load_airports(file_path, writer=None):
+    """
+    Add the airports batch_size per round-trip
+
+    Returns:
+        dict: airport code -> vertex id, used by load_routes to resolve route endpoints without a lookup
+    """
+    airport_ids = {}
+
+    def rows():
+        with open(file_path, 'r') as file:
+            reader = csv.DictReader(file)
+            vertex_id = 40000
+            for row in reader:
+                vertex_id = vertex_id + 1
+                airport_ids[row['code']] = vertex_id
+                yield {'id': vertex_id, 'label': vertex_label,
+                       'properties': {'code': row['code'], 'name': row['name']}}
+
+    for batch in chunked(rows(), batch_size):
+        submit(writer, lambda g, batch=batch: add_vertices_by_id_traversal(g, batch).iterate())
+    return airport_ids
 
 # Function to load routes
-def load_routes(file_path):
+def load_routes(file_path, airport_ids, writer=None):
+    """Add the routes by vertex id, batch_size per round-trip, endpoints are resolved from airport_ids"""
     edge_label = 'route::edge'
-    with open(file_path, 'r') as file:
-        reader = csv.DictReader(file)
-        edge_id = 50000
-        for row in reader:
-            edge_id = edge_id + 1
-            from_airport = g.V().has(vertex_label, 'code', row['from']).next()
-            to_airport = g.V().has(vertex_label, 'code', row['to']).next()
-            g.V(from_airport).addE(edge_label).property(T.id, edge_id).to(to_airport).property('miles', int(row['miles'])).iterate()
+
+    def rows():
+        with open(file_path, 'r') as file:
+            reader = csv.DictReader(file)
+            edge_id = 50000
+            for row in reader:
+                edge_id = edge_id + 1
+                if row['from'] not in airport_ids or row['to'] not in airport_ids:
+                    print(f'skipping route with unknown airport: {row}')
+                    continue
+                yield {'id': edge_id, 'from': airport_ids[row['from']], 'to': airport_ids[row['to']],
+                       'label': edge_label, 'properties': {'miles': int(row['miles'])}}
+
+    for batch in chunked(rows(), batch_size):
+        submit(writer, lambda g, batch=batch: add_edges_by_id_traversal(g, batch).iterate())
 
 # Load airports and routes
-load_airports('./airports.csv')
-# miles in the routes file are some random number
-load_routes('./routes.csv')
+if writers:
+    with ConcurrentGraphWriter(graph_url, workers=writers) as writer:
+        airport_ids = load_airports('./airports.csv', writer)
+        # routes point at the airports written above
+        writer.flush()
+        # miles in the routes file are some random number
+        load_routes('./routes.csv', airport_ids, writer)
+else:
+    airport_ids = load_airports('./airports.csv')
+    # miles in the routes file are some random number
+    load_routes('./routes.csv', airport_ids)
 
 # Close the connection
 remoteConn.close()
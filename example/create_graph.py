@@ -2,6 +2,7 @@
 pipenv install gremlinpython pandas
 pipenv install aiohttp async_timeout
 Grenlin server needs to be started, apache-tinkerpop-gremlin-server-3.7.1/bin/gremlin-server.sh start
+run from this folder with the repo root on the path for the shared loaders: PYTHONPATH=.. python create_graph.py
 """
 
 import csv
@@ -14,15 +15,12 @@ def read_csv(file_name):
 
 import pandas as pd
 
-# Read CSV files
-accounts_df = pd.read_csv('accounts.csv')
-transactions_df = pd.read_csv('transactions.csv')
-transfers_df = pd.read_csv('transfers.csv')
-
-# Display the dataframes
-print(accounts_df)
-print(transactions_df)
-print(transfers_df)
+# rows per read_csv chunk, the loader streams the chunks so the csv files can be bigger than memory
+chunk_rows = 100_000
+# vertices/edges per round-trip
+batch_size = 500
+# concurrent writer connections, 0 sends every batch on g one after another
+writers = 8
 
 # create graph
 from gremlin_python import statics
@@ -31,9 +29,14 @@ from gremlin_python.process.graph_traversal import __
 from gremlin_python.process.strategies import *
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
 from gremlin_python.process.anonymous_traversal import traversal
+from generic_load_vertices_edge.concurrent_writer import ConcurrentGraphWriter
+from generic_load_vertices_edge.dataframe_loader import load_vertex_frames, load_edge_frames
+from generic_load_vertices_edge.graph_backend import connect
 
-# Connect to your TinkerPop-enabled graph (update the URI as needed)
-g = traversal().withRemote(DriverRemoteConnection('ws://localhost:8182/gremlin','g'))
+# Connect to your TinkerPop-enabled graph (update the URI as needed), embedded://<name> runs without a server
+graph_url = 'ws://localhost:8182/gremlin'
+# g = traversal().withRemote(DriverRemoteConnection('ws://localhost:8182/gremlin','g'))
+g, remoteConn = connect(graph_url)
 
 #
 # Creating an in-memory TinkerGraph instance and start
@@ -45,27 +48,30 @@ g = traversal().withRemote(DriverRemoteConnection('ws://localhost:8182/gremlin',
 # # g = gremlin_python.process.anonymous_traversal.traversal()
 
 
-# Add vertices for accounts
-for idx, row in accounts_df.iterrows():
-    g.addV('account').property('accountId', row['accountId']).property('holderName', row['holderName']).property('balance', row['balance']).next()
+def load(writer=None):
+    # Add vertices for accounts and transactions, keeping accountId/transactionId -> vertex id
+    account_ids = load_vertex_frames(g, 'account', pd.read_csv('accounts.csv', chunksize=chunk_rows),
+                                     key='accountId', batch_size=batch_size, writer=writer)
+    transaction_ids = load_vertex_frames(g, 'transaction', pd.read_csv('transactions.csv', chunksize=chunk_rows),
+                                         key='transactionId', batch_size=batch_size, writer=writer)
+
+    # Add edges for transfers, each row fans out into A1 -> T1 and T1 -> A2, endpoints resolved from the ids above
+    load_edge_frames(g, pd.read_csv('transfers.csv', chunksize=chunk_rows), [
+        {'label': 'transfers', 'from': ('fromAccountId', account_ids), 'to': ('transactionId', transaction_ids),
+         'properties': ['date']},
+        {'label': 'transfers', 'from': ('transactionId', transaction_ids), 'to': ('toAccountId', account_ids),
+         'properties': ['date']},
+    ], batch_size=batch_size, writer=writer)
 
-# Add vertices for transactions
-for idx, row in transactions_df.iterrows():
-    g.addV('transaction').property('transactionId', row['transactionId']).property('amount', row['amount']).next()
 
-# Add edges for transfers
-for idx, row in transfers_df.iterrows():
-    # A1 to T1
-    g.V().has('account', 'accountId', row['fromAccountId']).addE('transfers').to(__.V().has('transaction', 'transactionId', row['transactionId'])).property('date', row['date']).next()
-    # T1 to A2
-    g.V().has('transaction', 'transactionId', row['transactionId']).addE('transfers').to(__.V().has('account', 'accountId', row['toAccountId'])).property('date', row['date']).next()
+if writers:
+    with ConcurrentGraphWriter(graph_url, workers=writers) as writer:
+        load(writer)
+else:
+    load()
 
 # Verify the graph
 print(g.V().toList())
 print(g.V().valueMap())
 print(g.E().toList())
 print(g.E().hasLabel('transfers').valueMap())
-
-
-
-
@@ -0,0 +1,131 @@
+"""
+Concurrent writer shared by the loaders.
+
+One DriverRemoteConnection sending writes one after another keeps a single request in flight, while Gremlin Server
+and Neptune can serve many writers at once. ConcurrentGraphWriter runs `workers` threads, each with its own
+connection and traversal source, fed from a bounded queue: submit() blocks when the queue is full, so a fast reader
+cannot run ahead of the server (backpressure). Writes failing with ConcurrentModificationException (Neptune, two
+writers touching the same element) are retried with exponential backoff and jitter.
+
+    with ConcurrentGraphWriter('ws://localhost:8182/gremlin', workers=8) as writer:
+        for batch in batches:
+            writer.submit(lambda g, batch=batch: vertex_batch_traversal(g, batch).iterate())
+        writer.flush()      # wait for the vertices before writing edges that point at them
+        ...
+
+A write is any callable taking the traversal source g. gremlinpython's client is synchronous (each connection
+runs its own event loop), so the pool uses threads rather than asyncio tasks.
+"""
+import queue
+import random
+import threading
+import time
+
+from generic_load_vertices_edge.graph_backend import connect
+
+RETRYABLE_ERRORS = ('ConcurrentModificationException',)
+
+_STOP = object()
+
+
+def is_retryable(error):
+    return any(name in str(error) for name in RETRYABLE_ERRORS)
+
+
+def remote_connection_factory(url):
+    """Default connection factory: graph_backend.connect(url), a websocket url or embedded://<name>"""
+    return lambda: connect(url)
+
+
+class ConcurrentGraphWriter:
+    def __init__(self, url='ws://localhost:8182/gremlin', workers=8, queue_size=None, max_retries=5,
+                 backoff=0.1, max_backoff=10.0, connection_factory=None):
+        """
+        Args:
+            url (str): Gremlin Server/Neptune websocket endpoint, or embedded://<name> for an in-process graph
+            workers (int): worker threads, one connection each
+            queue_size (int): writes waiting in the queue before submit() blocks, defaults to 4 per worker
+            max_retries (int): retries of a write failing with a retryable error
+            backoff (float): first retry delay in seconds, doubled on every retry up to max_backoff
+            connection_factory: callable returning (g, connection), connection.close() is called on shutdown
+        """
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connection_factory = connection_factory or remote_connection_factory(url)
+        self.queue = queue.Queue(maxsize=queue_size or workers * 4)
+        self.errors = []
+        self.written = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for n in range(self.workers):
+            g, connection = self.connection_factory()
+            thread = threading.Thread(target=self._run, args=(g, connection), name=f'graph-writer-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(raise_errors=exc_type is None)
+
+    def submit(self, write):
+        """Queue write(g), blocks while the queue is full"""
+        if not self._threads:
+            raise RuntimeError('ConcurrentGraphWriter is not started')
+        self.queue.put(write)
+
+    def flush(self):
+        """Wait until every submitted write is done, then raise the first failure if there was one"""
+        self.queue.join()
+        with self._lock:
+            errors, self.errors = self.errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self, raise_errors=True):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if raise_errors:
+            self.flush()
+
+    def _run(self, g, connection):
+        try:
+            while True:
+                write = self.queue.get()
+                try:
+                    if write is _STOP:
+                        return
+                    self._write_with_retry(g, write)
+                finally:
+                    self.queue.task_done()
+        finally:
+            connection.close()
+
+    def _write_with_retry(self, g, write):
+        attempt = 0
+        while True:
+            try:
+                write(g)
+                with self._lock:
+                    self.written += 1
+                return
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    with self._lock:
+                        self.errors.append(e)
+                    return
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
@@ -0,0 +1,151 @@
+"""
+Load pandas DataFrames into the graph in batches instead of iterrows() + one traversal per row.
+
+- frames are converted column-wise: each column is turned into Python values once (Series.tolist()),
+  then zipped into property maps, no Series is built per row
+- vertices are written as g.inject([...]).unfold().addV(label).property(col, select(col))..., one traversal
+  per batch, returning key -> vertex id so edges never have to look their endpoints up with has()
+- edge endpoints are mapped to vertex ids with Series.map(index) for a whole frame at once,
+  then written by id with batch_upsert.add_edges_by_id_traversal
+- anything accepting frames also takes an iterator of frames, e.g. pd.read_csv(path, chunksize=100_000),
+  so files bigger than memory stream through one chunk at a time
+"""
+import threading
+import time
+
+import pandas as pd
+from gremlin_python.process.graph_traversal import __
+
+from generic_load_vertices_edge.batch_upsert import (DEFAULT_BATCH_SIZE, add_edges_by_id_traversal, chunked,
+                                                     report_batch)
+
+
+def iter_frames(frames):
+    """A DataFrame or an iterator of DataFrames (read_csv with chunksize) as an iterator of DataFrames"""
+    if isinstance(frames, pd.DataFrame):
+        return iter([frames])
+    return iter(frames)
+
+
+def frame_records(df, columns=None):
+    """
+    Property maps for every row of df, built column by column.
+    Missing values (NaN/None) are left out of the row's map.
+    """
+    columns = list(columns if columns is not None else df.columns)
+    values = [df[column].tolist() for column in columns]
+    nulls = [df[column].isna().tolist() for column in columns]
+    if not any(any(column_nulls) for column_nulls in nulls):
+        return [dict(zip(columns, row)) for row in zip(*values)]
+    return [{column: value for column, value, null in zip(columns, row, row_nulls) if not null}
+            for row, row_nulls in zip(zip(*values), zip(*nulls))]
+
+
+def add_vertices_traversal(g, label, records, key):
+    """
+    One traversal adding a vertex per record, all records having the same properties.
+    Emits {'key': record[key], 'id': vertex id} per vertex.
+    """
+    t = g.inject(records).unfold().as_('m').addV(label)
+    for prop in records[0]:
+        t = t.property(prop, __.select('m').select(prop))
+    return t.project('key', 'id').by(__.select('m').select(key)).by(__.id_())
+
+
+def _submit(g, writer, write):
+    if writer is None:
+        write(g)
+    else:
+        writer.submit(write)
+
+
+def load_vertex_frames(g, label, frames, key, batch_size=DEFAULT_BATCH_SIZE, writer=None):
+    """
+    Add a vertex per DataFrame row
+
+    Args:
+        g: graph traversal source, not used when writer is given
+        label (str): vertex label
+        frames: DataFrame or iterator of DataFrames, every column becomes a property
+        key (str): column identifying the vertex, e.g. accountId
+        writer: optional concurrent_writer.ConcurrentGraphWriter, flushed before returning
+    Returns:
+        dict: key value -> vertex id
+    """
+    ids = {}
+    lock = threading.Lock()
+    batch_no = 0
+
+    def write_batch(number, records):
+        def write(g):
+            start = time.perf_counter()
+            result = add_vertices_traversal(g, label, records, key).toList()
+            with lock:
+                ids.update((row['key'], row['id']) for row in result)
+            report_batch(label, number, len(records), time.perf_counter() - start)
+        return write
+
+    for df in iter_frames(frames):
+        records = frame_records(df)
+        # the injected batch needs one property list, rows with missing values are grouped by their columns
+        by_columns = {}
+        for record in records:
+            by_columns.setdefault(tuple(record), []).append(record)
+        for group in by_columns.values():
+            for batch in chunked(group, batch_size):
+                batch_no += 1
+                _submit(g, writer, write_batch(batch_no, batch))
+    if writer is not None:
+        writer.flush()
+    return ids
+
+
+def load_edge_frames(g, frames, edge_specs, batch_size=DEFAULT_BATCH_SIZE, writer=None):
+    """
+    Add edges described by DataFrame rows, every spec is applied to every row,
+    so one row can fan out into several edges (account -> transaction -> account).
+
+    Args:
+        frames: DataFrame or iterator of DataFrames
+        edge_specs (list): dicts with
+            label: edge label
+            from: (column, index) - column holding the out vertex key, index mapping the key to a vertex id
+            to: (column, index) - same for the in vertex
+            properties: columns copied onto the edge
+        writer: optional concurrent_writer.ConcurrentGraphWriter, flushed before returning
+    Returns:
+        int: number of edges sent
+    """
+    sent = 0
+    batch_no = 0
+
+    def write_batch(number, rows):
+        def write(g):
+            start = time.perf_counter()
+            add_edges_by_id_traversal(g, rows).iterate()
+            report_batch('edges', number, len(rows), time.perf_counter() - start)
+        return write
+
+    # object dtype keeps the vertex ids as they are, a plain dict map turns ints into floats around missing keys
+    indexes = [(pd.Series(spec['from'][1], dtype=object), pd.Series(spec['to'][1], dtype=object))
+               for spec in edge_specs]
+    for df in iter_frames(frames):
+        rows = []
+        for spec, (from_index, to_index) in zip(edge_specs, indexes):
+            from_column, to_column = spec['from'][0], spec['to'][0]
+            from_ids = df[from_column].map(from_index)
+            to_ids = df[to_column].map(to_index)
+            resolved = from_ids.notna() & to_ids.notna()
+            if not resolved.all():
+                print(f"{spec['label']}: skipping {int((~resolved).sum())} rows with unknown endpoints")
+            properties = frame_records(df.loc[resolved], spec.get('properties', []))
+            rows.extend({'from': from_id, 'to': to_id, 'label': spec['label'], 'properties': props}
+                        for from_id, to_id, props in zip(from_ids[resolved].tolist(), to_ids[resolved].tolist(),
+                                                         properties))
+        for batch in chunked(rows, batch_size):
+            batch_no += 1
+            _submit(g, writer, write_batch(batch_no, batch))
+            sent += len(batch)
+    if writer is not None:
+        writer.flush()
+    return sent
@@ -0,0 +1,840 @@
+"""
+In-process graph store that runs gremlinpython traversals without a Gremlin Server.
+
+    g = EmbeddedGraph().traversal()
+    g.addV('person').property('name', 'Ram').iterate()
+    g.V().has('person', 'name', 'Ram').out('knows').values('name').toList()
+
+traversal() plugs an EmbeddedConnection into gremlinpython's RemoteConnection extension point, the same one
+DriverRemoteConnection uses, so the bytecode the loaders build is interpreted here instead of being serialized
+over a websocket. Loader code runs unchanged against the embedded store or a remote server.
+
+Storage:
+- vertices: id -> [label, properties], edges: id -> [label, out vertex id, in vertex id, properties]
+- adjacency: vertex id -> list of out edge ids / in edge ids
+- label index: label -> vertex ids, property index: key -> value -> vertex ids, built on the first has() on that key
+  and kept up to date afterwards. V().has(...)/hasLabel(...) start from the smallest index hit instead of a scan.
+
+Supported steps, enough for the loaders and lineage queries:
+V E addV addE inject mergeV property drop has hasLabel hasId hasNot is not where out in both outE inE bothE
+outV inV otherV bothV repeat (times/until/emit) simplePath path as select project values valueMap elementMap
+id label constant identity coalesce union optional sideEffect fold unfold count dedup limit range skip order
+"""
+import itertools
+import threading
+from collections import defaultdict
+
+from gremlin_python.driver.remote_connection import RemoteConnection, RemoteTraversal
+from gremlin_python.process.anonymous_traversal import traversal
+from gremlin_python.process.traversal import Bytecode, Cardinality, Merge, Order, P, T, Traverser
+from gremlin_python.structure.graph import Edge, Path, Vertex
+
+MODULATORS = {'by', 'times', 'emit', 'until', 'option', 'from', 'to', 'with'}
+LOOP_MODULATORS = {'times', 'emit', 'until'}
+START_ONLY = object()
+
+
+class _Traverser:
+    __slots__ = ('obj', 'path', 'labels')
+
+    def __init__(self, obj, path=(), labels=()):
+        self.obj = obj
+        self.path = path
+        self.labels = labels
+
+    def split(self, obj):
+        return _Traverser(obj, self.path + (obj,), self.labels + (frozenset(),))
+
+    def label(self, name):
+        return _Traverser(self.obj, self.path, self.labels[:-1] + (self.labels[-1] | {name},))
+
+    def select(self, name):
+        for obj, labels in zip(reversed(self.path), reversed(self.labels)):
+            if name in labels:
+                return obj
+        raise KeyError(name)
+
+
+def _compile(bytecode):
+    """
+    Bytecode instructions -> [name, args, modulators], modulators (by, times, from, ...) attached to their step.
+    A times/until/emit before repeat() is attached as times_first/until_first/emit_first (checked before the body).
+
+    Raises:
+        ValueError: times/until/emit not followed by repeat()
+    """
+    steps = []
+    pending = []
+    for name, *args in bytecode.step_instructions:
+        if name in LOOP_MODULATORS and (not steps or steps[-1][0] != 'repeat'):
+            pending.append((name + '_first', args))
+        elif name in MODULATORS and steps:
+            steps[-1][2].append((name, args))
+        else:
+            if pending and name != 'repeat':
+                raise ValueError(f'{pending[0][0][:-len("_first")]}() must be followed by repeat()')
+            steps.append([name, args, pending])
+            pending = []
+    if pending:
+        raise ValueError(f'{pending[0][0][:-len("_first")]}() must be followed by repeat()')
+    return steps
+
+
+def _test(predicate, value):
+    if not isinstance(predicate, P):
+        return value == predicate
+    op, expected, other = predicate.operator, predicate.value, predicate.other
+    if op == 'and':
+        return _test(expected, value) and _test(other, value)
+    if op == 'or':
+        return _test(expected, value) or _test(other, value)
+    if op == 'not':
+        return not _test(expected, value)
+    if op == 'eq':
+        return value == expected
+    if op == 'neq':
+        return value != expected
+    if op == 'within':
+        return value in expected
+    if op == 'without':
+        return value not in expected
+    if value is None:
+        return False
+    if op in ('lt', 'lte', 'gt', 'gte', 'between', 'inside', 'outside'):
+        try:
+            return {'lt': lambda: value < expected, 'lte': lambda: value <= expected,
+                    'gt': lambda: value > expected, 'gte': lambda: value >= expected,
+                    'between': lambda: expected <= value < other,
+                    'inside': lambda: expected < value < other,
+                    'outside': lambda: value < expected or value > other}[op]()
+        except TypeError:
+            return False
+    if not isinstance(value, str):
+        return False
+    text = {'containing': lambda: expected in value, 'notContaining': lambda: expected not in value,
+            'startingWith': lambda: value.startswith(expected),
+            'notStartingWith': lambda: not value.startswith(expected),
+            'endingWith': lambda: value.endswith(expected), 'notEndingWith': lambda: not value.endswith(expected)}
+    if op in text:
+        return text[op]()
+    raise ValueError(f'unsupported predicate {op}')
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+class EmbeddedGraph:
+    _named = {}
+    _named_lock = threading.Lock()
+
+    def __init__(self):
+        self.vertices = {}
+        self.edges = {}
+        self.out_edges = defaultdict(list)
+        self.in_edges = defaultdict(list)
+        self.label_index = defaultdict(set)
+        self.property_index = {}
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def named(cls, name):
+        """One shared graph per name, so several connections (e.g. writer workers) see the same data"""
+        with cls._named_lock:
+            if name not in cls._named:
+                cls._named[name] = cls()
+            return cls._named[name]
+
+    def traversal(self):
+        return traversal().withRemote(EmbeddedConnection(self))
+
+    # storage
+
+    def _new_id(self, element_id, existing):
+        if element_id is None:
+            element_id = next(self._ids)
+            while element_id in existing:
+                element_id = next(self._ids)
+        elif element_id in existing:
+            raise ValueError(f'element with id {element_id} already exists')
+        return element_id
+
+    def add_vertex(self, label='vertex', vertex_id=None, properties=None):
+        vertex_id = self._new_id(vertex_id, self.vertices)
+        self.vertices[vertex_id] = [label, {}]
+        self.label_index[label].add(vertex_id)
+        for key, value in (properties or {}).items():
+            self.set_property(Vertex(vertex_id, label), key, value)
+        return Vertex(vertex_id, label)
+
+    def add_edge(self, label, out_id, in_id, edge_id=None, properties=None):
+        for vertex_id in (out_id, in_id):
+            if vertex_id not in self.vertices:
+                raise ValueError(f'vertex {vertex_id} does not exist')
+        edge_id = self._new_id(edge_id, self.edges)
+        self.edges[edge_id] = [label, out_id, in_id, dict(properties or {})]
+        self.out_edges[out_id].append(edge_id)
+        self.in_edges[in_id].append(edge_id)
+        return self.edge(edge_id)
+
+    def vertex(self, vertex_id):
+        return Vertex(vertex_id, self.vertices[vertex_id][0])
+
+    def edge(self, edge_id):
+        label, out_id, in_id, _ = self.edges[edge_id]
+        return Edge(edge_id, self.vertex(out_id), label, self.vertex(in_id))
+
+    def properties(self, element):
+        if isinstance(element, Edge):
+            return self.edges[element.id][3]
+        return self.vertices[element.id][1]
+
+    def set_property(self, element, key, value):
+        if isinstance(element, Edge):
+            self.edges[element.id][3][key] = value
+            return
+        props = self.vertices[element.id][1]
+        index = self.property_index.get(key)
+        if index is not None:
+            if key in props and _hashable(props[key]):
+                index[props[key]].discard(element.id)
+            if _hashable(value):
+                index[value].add(element.id)
+        props[key] = value
+
+    def change_id(self, element, new_id):
+        """property(T.id, x) right after addV/addE: give the new element its requested id"""
+        if new_id == element.id:
+            return element
+        if isinstance(element, Edge):
+            self.edges[new_id] = self.edges.pop(element.id)
+            label, out_id, in_id, _ = self.edges[new_id]
+            for adjacency, vertex_id in ((self.out_edges, out_id), (self.in_edges, in_id)):
+                edge_ids = adjacency[vertex_id]
+                edge_ids[edge_ids.index(element.id)] = new_id
+            return self.edge(new_id)
+        if new_id in self.vertices:
+            raise ValueError(f'element with id {new_id} already exists')
+        if self.out_edges.get(element.id) or self.in_edges.get(element.id):
+            raise ValueError('T.id can only be set on a new vertex')
+        label, props = self.vertices.pop(element.id)
+        self.vertices[new_id] = [label, props]
+        self.label_index[label].discard(element.id)
+        self.label_index[label].add(new_id)
+        for key, value in props.items():
+            index = self.property_index.get(key)
+            if index is not None and _hashable(value):
+                index[value].discard(element.id)
+                index[value].add(new_id)
+        return Vertex(new_id, label)
+
+    def remove(self, element):
+        if isinstance(element, Edge):
+            label, out_id, in_id, _ = self.edges.pop(element.id)
+            self.out_edges[out_id].remove(element.id)
+            self.in_edges[in_id].remove(element.id)
+            return
+        for edge_id in list(self.out_edges.pop(element.id, [])) + list(self.in_edges.pop(element.id, [])):
+            if edge_id in self.edges:
+                self.remove(self.edge(edge_id))
+        label, props = self.vertices.pop(element.id)
+        self.label_index[label].discard(element.id)
+        for key, value in props.items():
+            index = self.property_index.get(key)
+            if index is not None and _hashable(value):
+                index[value].discard(element.id)
+
+    def index(self, key):
+        """key -> value -> vertex ids, built on first use"""
+        if key not in self.property_index:
+            index = defaultdict(set)
+            for vertex_id, (_, props) in self.vertices.items():
+                if key in props and _hashable(props[key]):
+                    index[props[key]].add(vertex_id)
+            self.property_index[key] = index
+        return self.property_index[key]
+
+    def value(self, element, key):
+        if key == T.id:
+            return element.id
+        if key == T.label:
+            return element.label
+        return self.properties(element).get(key)
+
+    # loader interface, see graph_backend.GremlinBackend
+
+    def upsert_vertices(self, rows):
+        """Create the {'id', 'label', 'properties'} rows whose id property is not taken yet"""
+        with self.lock:
+            ids = self.index('id')
+            for row in rows:
+                if not ids.get(row['id']):
+                    self.add_vertex(row['label'], properties=dict(row['properties'], id=row['id']))
+
+    def upsert_edges(self, rows):
+        """Create the {'from', 'to', 'label', 'properties'} edges between id properties that do not exist yet"""
+        with self.lock:
+            ids = self.index('id')
+            for row in rows:
+                from_ids, to_ids = ids.get(row['from']), ids.get(row['to'])
+                if not from_ids or not to_ids:
+                    continue
+                from_id, to_id = next(iter(from_ids)), next(iter(to_ids))
+                if not any(self.edges[edge_id][0] == row['label'] and self.edges[edge_id][2] == to_id
+                           for edge_id in self.out_edges.get(from_id, [])):
+                    self.add_edge(row['label'], from_id, to_id, properties=row['properties'])
+
+    def execute(self, bytecode):
+        with self.lock:
+            return list(_Executor(self).run(bytecode, [_Traverser(START_ONLY)]))
+
+
+class EmbeddedConnection(RemoteConnection):
+    """RemoteConnection answering traversals from an EmbeddedGraph in the same process"""
+
+    def __init__(self, graph=None):
+        super().__init__('embedded', 'g')
+        self.graph = graph if graph is not None else EmbeddedGraph()
+
+    def submit(self, bytecode):
+        return RemoteTraversal(iter([Traverser(t.obj) for t in self.graph.execute(bytecode)]))
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class _Executor:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, bytecode, traversers):
+        steps = _compile(bytecode)
+        stream = iter(traversers)
+        i = 0
+        while i < len(steps):
+            name, args, modulators = steps[i]
+            if name in ('V', 'E') and not args:
+                # V().has(...).hasLabel(...): answer the has steps from the indexes
+                filters = []
+                while i + 1 < len(steps) and steps[i + 1][0] in ('has', 'hasLabel') and not steps[i + 1][2]:
+                    filters.append(steps[i + 1])
+                    i += 1
+                stream = self._start(name, stream, filters)
+            else:
+                step = getattr(self, f'step_{name}', None)
+                if step is None:
+                    raise ValueError(f'step {name}() is not supported by the embedded graph')
+                stream = step(stream, args, modulators)
+            i += 1
+        return (t for t in stream if t.obj is not START_ONLY)
+
+    def sub(self, bytecode, traverser):
+        """Results of a child traversal started from traverser"""
+        return self.run(bytecode, [traverser])
+
+    def first(self, arg, traverser):
+        if isinstance(arg, Bytecode):
+            for t in self.sub(arg, traverser):
+                return t.obj
+            raise ValueError(f'{arg} produced no value')
+        return arg
+
+    # start steps
+
+    def _start(self, name, stream, filters):
+        graph = self.graph
+        for t in stream:
+            if name == 'E':
+                for edge_id in list(graph.edges):
+                    edge = graph.edge(edge_id)
+                    if all(self._has(edge, step[0], step[1]) for step in filters):
+                        yield t.split(edge)
+                continue
+            candidates = None
+            for step_name, args, _ in filters:
+                if step_name == 'hasLabel' and all(not isinstance(a, P) for a in args):
+                    ids = set().union(*(graph.label_index.get(a, ()) for a in args))
+                elif step_name == 'has' and len(args) >= 2 and not isinstance(args[-1], (P, Bytecode)) \
+                        and _hashable(args[-1]) and args[-2] not in (T.id, T.label):
+                    ids = graph.index(args[-2]).get(args[-1], set())
+                    if len(args) == 3:
+                        ids = ids & graph.label_index.get(args[0], set())
+                else:
+                    continue
+                candidates = ids if candidates is None or len(ids) < len(candidates) else candidates
+            vertex_ids = list(candidates) if candidates is not None else list(graph.vertices)
+            for vertex_id in vertex_ids:
+                if vertex_id in graph.vertices:
+                    vertex = graph.vertex(vertex_id)
+                    if all(self._has(vertex, step[0], step[1]) for step in filters):
+                        yield t.split(vertex)
+
+    def _ids(self, args):
+        ids = []
+        for arg in args:
+            if isinstance(arg, (list, tuple, set)):
+                ids.extend(self._ids(arg))
+            else:
+                ids.append(arg.id if isinstance(arg, (Vertex, Edge)) else arg)
+        return ids
+
+    def step_V(self, stream, args, modulators):
+        for t in stream:
+            for vertex_id in self._ids(args):
+                if vertex_id in self.graph.vertices:
+                    yield t.split(self.graph.vertex(vertex_id))
+
+    def step_E(self, stream, args, modulators):
+        for t in stream:
+            for edge_id in self._ids(args):
+                if edge_id in self.graph.edges:
+                    yield t.split(self.graph.edge(edge_id))
+
+    def step_inject(self, stream, args, modulators):
+        for t in stream:
+            if t.obj is not START_ONLY:
+                yield t
+        for arg in args:
+            yield _Traverser(arg, (arg,), (frozenset(),))
+
+    def step_addV(self, stream, args, modulators):
+        for t in stream:
+            label = self.first(args[0], t) if args else 'vertex'
+            yield t.split(self.graph.add_vertex(label))
+
+    def step_addE(self, stream, args, modulators):
+        for t in stream:
+            label = self.first(args[0], t)
+            ends = {'from': t.obj, 'to': t.obj}
+            for name, (arg, *_) in modulators:
+                if isinstance(arg, str):
+                    ends[name] = t.select(arg)
+                else:
+                    ends[name] = self.first(arg, t)
+            out_v, in_v = ends['from'], ends['to']
+            yield t.split(self.graph.add_edge(label, out_v.id, in_v.id))
+
+    def step_mergeV(self, stream, args, modulators):
+        options = {option: value for _, (option, value) in modulators}
+        for t in stream:
+            search = self.first(args[0], t) if args else {}
+            search = dict(search or {})
+            matches = self._match_vertices(search)
+            if not matches:
+                create = options.get(Merge.on_create)
+                props = dict(search)
+                props.update(dict(self.first(create, t) or {}) if create is not None else {})
+                vertex_id = props.pop(T.id, None)
+                label = props.pop(T.label, 'vertex')
+                yield t.split(self.graph.add_vertex(label, vertex_id, props))
+                continue
+            on_match = options.get(Merge.on_match)
+            for vertex in matches:
+                if on_match is not None:
+                    for key, value in dict(self.first(on_match, t.split(vertex)) or {}).items():
+                        self.graph.set_property(vertex, key, value)
+                yield t.split(vertex)
+
+    def _match_vertices(self, search):
+        graph = self.graph
+        if T.id in search:
+            vertex_ids = [search[T.id]] if search[T.id] in graph.vertices else []
+        else:
+            keyed = [(k, v) for k, v in search.items() if k != T.label and _hashable(v)]
+            if keyed:
+                vertex_ids = graph.index(keyed[0][0]).get(keyed[0][1], set())
+            elif T.label in search:
+                vertex_ids = graph.label_index.get(search[T.label], set())
+            else:
+                vertex_ids = graph.vertices
+        matches = []
+        for vertex_id in list(vertex_ids):
+            vertex = graph.vertex(vertex_id)
+            if all(graph.value(vertex, k) == v for k, v in search.items()):
+                matches.append(vertex)
+        return matches
+
+    def step_property(self, stream, args, modulators):
+        if isinstance(args[0], Cardinality):
+            args = args[1:]
+        key, value = args[0], args[1]
+        for t in stream:
+            resolved = self.first(value, t)
+            if key == T.id:
+                element = self.graph.change_id(t.obj, resolved)
+                t = _Traverser(element, t.path[:-1] + (element,), t.labels)
+            elif isinstance(key, str):
+                self.graph.set_property(t.obj, key, resolved)
+            yield t
+
+    def step_drop(self, stream, args, modulators):
+        for t in stream:
+            if isinstance(t.obj, Edge) and t.obj.id not in self.graph.edges:
+                continue
+            if isinstance(t.obj, Vertex) and t.obj.id not in self.graph.vertices:
+                continue
+            self.graph.remove(t.obj)
+        return
+        yield
+
+    def step_none(self, stream, args, modulators):
+        for _ in stream:
+            pass
+        return
+        yield
+
+    step_discard = step_none
+
+    # filters
+
+    def _has(self, element, name, args):
+        if name == 'hasLabel':
+            return any(_test(label, element.label) for label in args)
+        if name == 'hasId':
+            return any(_test(element_id, element.id) for element_id in self._ids(args))
+        if name == 'hasNot':
+            return args[0] not in self.graph.properties(element)
+        if len(args) == 1:
+            return args[0] in (T.id, T.label) or args[0] in self.graph.properties(element)
+        if len(args) == 3:
+            if element.label != args[0]:
+                return False
+            args = args[1:]
+        key, predicate = args
+        if key not in (T.id, T.label) and key not in self.graph.properties(element):
+            return False
+        return _test(predicate, self.graph.value(element, key))
+
+    def step_has(self, stream, args, modulators):
+        return (t for t in stream if self._has(t.obj, 'has', args))
+
+    def step_hasLabel(self, stream, args, modulators):
+        return (t for t in stream if self._has(t.obj, 'hasLabel', args))
+
+    def step_hasId(self, stream, args, modulators):
+        return (t for t in stream if self._has(t.obj, 'hasId', args))
+
+    def step_hasNot(self, stream, args, modulators):
+        return (t for t in stream if self._has(t.obj, 'hasNot', args))
+
+    def step_is(self, stream, args, modulators):
+        return (t for t in stream if _test(args[0], t.obj))
+
+    def step_not(self, stream, args, modulators):
+        return (t for t in stream if next(iter(self.sub(args[0], t)), None) is None)
+
+    def step_where(self, stream, args, modulators):
+        arg = args[0]
+        for t in stream:
+            if isinstance(arg, P):
+                # where(eq('a')): compare with the object labeled a
+                if _test(P(arg.operator, t.select(arg.value), arg.other), t.obj):
+                    yield t
+                continue
+            steps = arg.step_instructions
+            if steps and steps[-1][0] == 'as' and any(steps[-1][1] in labels for labels in t.labels):
+                # where(outV().as('a')): the child traversal has to end on the object labeled a
+                child = Bytecode()
+                child.step_instructions = steps[:-1]
+                expected = t.select(steps[-1][1])
+                if any(r.obj == expected for r in self.sub(child, t)):
+                    yield t
+            elif next(iter(self.sub(arg, t)), None) is not None:
+                yield t
+
+    def step_simplePath(self, stream, args, modulators):
+        for t in stream:
+            objects = [o for o in t.path if o is not START_ONLY]
+            if len(objects) == len({(type(o), getattr(o, 'id', o)) for o in objects}):
+                yield t
+
+    def step_dedup(self, stream, args, modulators):
+        seen = set()
+        for t in stream:
+            key = (type(t.obj), t.obj.id) if isinstance(t.obj, (Vertex, Edge)) else repr(t.obj)
+            if key not in seen:
+                seen.add(key)
+                yield t
+
+    def step_limit(self, stream, args, modulators):
+        return itertools.islice(stream, args[-1])
+
+    def step_range(self, stream, args, modulators):
+        low, high = args[-2], args[-1]
+        return itertools.islice(stream, low, None if high < 0 else high)
+
+    def step_skip(self, stream, args, modulators):
+        return itertools.islice(stream, args[-1], None)
+
+    # adjacency
+
+    def _adjacent_edges(self, vertex, direction, labels):
+        graph = self.graph
+        edge_ids = []
+        if direction in ('out', 'both'):
+            edge_ids += graph.out_edges.get(vertex.id, [])
+        if direction in ('in', 'both'):
+            edge_ids += graph.in_edges.get(vertex.id, [])
+        for edge_id in edge_ids:
+            if not labels or graph.edges[edge_id][0] in labels:
+                yield edge_id
+
+    def _walk(self, stream, direction, labels, to_vertex):
+        graph = self.graph
+        for t in stream:
+            for edge_id in self._adjacent_edges(t.obj, direction, labels):
+                if not to_vertex:
+                    yield t.split(graph.edge(edge_id))
+                    continue
+                _, out_id, in_id, _ = graph.edges[edge_id]
+                if direction == 'out':
+                    yield t.split(graph.vertex(in_id))
+                elif direction == 'in':
+                    yield t.split(graph.vertex(out_id))
+                else:
+                    yield t.split(graph.vertex(in_id if out_id == t.obj.id else out_id))
+
+    def step_out(self, stream, args, modulators):
+        return self._walk(stream, 'out', args, True)
+
+    def step_in(self, stream, args, modulators):
+        return self._walk(stream, 'in', args, True)
+
+    def step_both(self, stream, args, modulators):
+        return self._walk(stream, 'both', args, True)
+
+    def step_outE(self, stream, args, modulators):
+        return self._walk(stream, 'out', args, False)
+
+    def step_inE(self, stream, args, modulators):
+        return self._walk(stream, 'in', args, False)
+
+    def step_bothE(self, stream, args, modulators):
+        return self._walk(stream, 'both', args, False)
+
+    def step_outV(self, stream, args, modulators):
+        return (t.split(self.graph.vertex(self.graph.edges[t.obj.id][1])) for t in stream)
+
+    def step_inV(self, stream, args, modulators):
+        return (t.split(self.graph.vertex(self.graph.edges[t.obj.id][2])) for t in stream)
+
+    def step_bothV(self, stream, args, modulators):
+        for t in stream:
+            _, out_id, in_id, _ = self.graph.edges[t.obj.id]
+            yield t.split(self.graph.vertex(out_id))
+            yield t.split(self.graph.vertex(in_id))
+
+    def step_otherV(self, stream, args, modulators):
+        for t in stream:
+            _, out_id, in_id, _ = self.graph.edges[t.obj.id]
+            previous = t.path[-2] if len(t.path) > 1 else None
+            other = in_id if getattr(previous, 'id', None) == out_id else out_id
+            yield t.split(self.graph.vertex(other))
+
+    def step_repeat(self, stream, args, modulators):
+        """
+        Loop over the body like TinkerPop: until/times after repeat() are checked after every pass of the body,
+        before it (until_first/times_first) also on the start traversers; emit after repeat() emits the results of
+        a pass, emit before it (emit_first) the traversers entering a pass, the start ones included. Traversers
+        leaving the loop through until/times are not emitted a second time.
+        """
+        body = args[0]
+        options = {}
+        for name, m_args in modulators:
+            options.setdefault(name, m_args)
+        times_first = 'times_first' in options
+        times = (options.get('times_first') or options.get('times') or [None])[0]
+        until_first = 'until_first' in options
+        until = (options.get('until_first') or options.get('until') or [None])[0]
+        emit_first = 'emit_first' in options
+        emit = options.get('emit_first', options.get('emit'))
+
+        def emitted(t):
+            return emit is not None and (not emit or next(iter(self.sub(emit[0], t)), None) is not None)
+
+        def done(t, loops, first):
+            if times is not None and times_first == first and loops >= times:
+                return True
+            return until is not None and until_first == first and next(iter(self.sub(until, t)), None) is not None
+
+        frontier = list(stream)
+        loops = 0
+        while frontier:
+            entering = []
+            for t in frontier:
+                if done(t, loops, True):
+                    yield t
+                    continue
+                if emit_first and emitted(t):
+                    yield t
+                entering.append(t)
+            loops += 1
+            frontier = []
+            for t in entering:
+                for r in self.sub(body, t):
+                    if done(r, loops, False):
+                        yield r
+                    else:
+                        if not emit_first and emitted(r):
+                            yield r
+                        frontier.append(r)
+
+    # maps
+
+    def step_identity(self, stream, args, modulators):
+        return stream
+
+    def step_constant(self, stream, args, modulators):
+        return (t.split(args[0]) for t in stream)
+
+    def step_id(self, stream, args, modulators):
+        return (t.split(t.obj.id) for t in stream)
+
+    def step_label(self, stream, args, modulators):
+        return (t.split(t.obj.label) for t in stream)
+
+    def step_values(self, stream, args, modulators):
+        for t in stream:
+            props = self.graph.properties(t.obj)
+            for key in (args or list(props)):
+                if key in props:
+                    value = props[key]
+                    yield t.split(value)
+
+    def step_valueMap(self, stream, args, modulators):
+        with_tokens = bool(args and isinstance(args[0], bool) and args[0])
+        keys = [a for a in args if isinstance(a, str)]
+        for t in stream:
+            props = self.graph.properties(t.obj)
+            result = {}
+            if with_tokens:
+                result[T.id] = t.obj.id
+                result[T.label] = t.obj.label
+            for key in (keys or list(props)):
+                if key in props:
+                    value = props[key]
+                    result[key] = value if isinstance(t.obj, Edge) else [value]
+            yield t.split(result)
+
+    def step_elementMap(self, stream, args, modulators):
+        for t in stream:
+            props = self.graph.properties(t.obj)
+            result = {T.id: t.obj.id, T.label: t.obj.label}
+            result.update((key, value) for key, value in props.items() if not args or key in args)
+            yield t.split(result)
+
+    def step_path(self, stream, args, modulators):
+        """Path of the traverser, by() modulators applied to its objects in rotation"""
+        bys = [m_args for name, m_args in modulators if name == 'by']
+        for t in stream:
+            pairs = [(labels, obj) for labels, obj in zip(t.labels, t.path) if obj is not START_ONLY]
+            objects = [obj for _, obj in pairs]
+            if bys:
+                objects = [self._by(_Traverser(obj, (obj,), (frozenset(),)), bys[n % len(bys)])
+                           for n, obj in enumerate(objects)]
+            yield t.split(Path([set(labels) for labels, _ in pairs], objects))
+
+    def step_as(self, stream, args, modulators):
+        for t in stream:
+            for name in args:
+                t = t.label(name)
+            yield t
+
+    def step_select(self, stream, args, modulators):
+        keys = [a for a in args if isinstance(a, str)]
+        for t in stream:
+            try:
+                values = [t.obj[key] if isinstance(t.obj, dict) and key in t.obj else t.select(key) for key in keys]
+            except KeyError:
+                continue
+            yield t.split(values[0] if len(values) == 1 else dict(zip(keys, values)))
+
+    def _by(self, t, by_args):
+        if not by_args:
+            return t.obj
+        arg = by_args[0]
+        if isinstance(arg, Bytecode):
+            return self.first(arg, t)
+        if isinstance(arg, T):
+            return self.graph.value(t.obj, arg)
+        if isinstance(arg, str):
+            return self.graph.properties(t.obj).get(arg)
+        return t.obj
+
+    def step_project(self, stream, args, modulators):
+        bys = [m_args for name, m_args in modulators if name == 'by']
+        for t in stream:
+            result = {}
+            for n, key in enumerate(args):
+                result[key] = self._by(t, bys[n % len(bys)] if bys else [])
+            yield t.split(result)
+
+    def step_order(self, stream, args, modulators):
+        bys = [m_args for name, m_args in modulators if name == 'by'] or [[]]
+        rows = list(stream)
+        for by_args in reversed(bys):
+            reverse = Order.desc in by_args
+            key_args = [a for a in by_args if not isinstance(a, Order)]
+            rows.sort(key=lambda t: self._sort_key(self._by(t, key_args)), reverse=reverse)
+        return iter(rows)
+
+    @staticmethod
+    def _sort_key(value):
+        if isinstance(value, (Vertex, Edge)):
+            value = value.id
+        return (type(value).__name__, value)
+
+    # branches
+
+    def step_coalesce(self, stream, args, modulators):
+        for t in stream:
+            for child in args:
+                results = list(self.sub(child, t))
+                if results:
+                    yield from results
+                    break
+
+    def step_union(self, stream, args, modulators):
+        for t in stream:
+            for child in args:
+                yield from self.sub(child, t)
+
+    def step_optional(self, stream, args, modulators):
+        for t in stream:
+            results = list(self.sub(args[0], t))
+            yield from results or [t]
+
+    def step_sideEffect(self, stream, args, modulators):
+        for t in stream:
+            for _ in self.sub(args[0], t):
+                pass
+            yield t
+
+    # reducers
+
+    def step_fold(self, stream, args, modulators):
+        folded = [t.obj for t in stream if t.obj is not START_ONLY]
+        yield _Traverser(folded, (folded,), (frozenset(),))
+
+    def step_unfold(self, stream, args, modulators):
+        for t in stream:
+            if isinstance(t.obj, dict):
+                for item in t.obj.items():
+                    yield t.split(dict([item]))
+            elif isinstance(t.obj, (list, tuple, set)):
+                for item in t.obj:
+                    yield t.split(item)
+            else:
+                yield t
+
+    def step_count(self, stream, args, modulators):
+        count = sum(1 for t in stream if t.obj is not START_ONLY)
+        yield _Traverser(count, (count,), (frozenset(),))
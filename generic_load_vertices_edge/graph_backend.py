@@ -0,0 +1,60 @@
+"""
+Pluggable graph backends for the loaders and the lineage tools.
+
+connect(url) returns (g, connection) for either
+- a Gremlin Server / Neptune websocket url: ws://localhost:8182/gremlin, wss://<neptune-endpoint>:8182/gremlin
+- an in-process embedded_graph.EmbeddedGraph: embedded://<name>, every connection to the same name shares one graph
+so the loader code does not change with the backend, e.g. the YAML loader runs with graph_url = 'embedded://load'.
+
+Code that only needs to write vertices/edges (SQLLineageParser.generate_neptune_files) takes a backend object with
+    upsert_vertices(rows)   rows: {'id', 'label', 'properties'}, the vertex is identified by its id property
+    upsert_edges(rows)      rows: {'from', 'to', 'label', 'properties'}, endpoints given by their id property
+GremlinBackend implements it with the batched traversals on any traversal source,
+EmbeddedGraph implements it directly on its storage.
+"""
+from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
+from gremlin_python.process.anonymous_traversal import traversal
+
+from generic_load_vertices_edge.batch_upsert import (DEFAULT_BATCH_SIZE, chunked, edge_batch_traversal,
+                                                     vertex_batch_traversal)
+from generic_load_vertices_edge.embedded_graph import EmbeddedConnection, EmbeddedGraph
+
+EMBEDDED_SCHEME = 'embedded://'
+
+
+def connect(url):
+    """(g, connection) for a websocket url or embedded://<name>, close the connection when done"""
+    if url.startswith(EMBEDDED_SCHEME):
+        connection = EmbeddedConnection(EmbeddedGraph.named(url[len(EMBEDDED_SCHEME):]))
+    else:
+        connection = DriverRemoteConnection(url, 'g')
+    return traversal().withRemote(connection), connection
+
+
+class GremlinBackend:
+    def __init__(self, g, batch_size=DEFAULT_BATCH_SIZE, use_merge_v=True):
+        self.g = g
+        self.batch_size = batch_size
+        self.use_merge_v = use_merge_v
+
+    def upsert_vertices(self, rows):
+        for batch in chunked(rows, self.batch_size):
+            vertex_batch_traversal(self.g, batch, self.use_merge_v).iterate()
+
+    def upsert_edges(self, rows):
+        for batch in chunked(rows, self.batch_size):
+            edge_batch_traversal(self.g, batch).iterate()
+
+
+def open_backend(url, batch_size=DEFAULT_BATCH_SIZE, use_merge_v=True):
+    """
+    Backend for url: the EmbeddedGraph itself for embedded://<name>, otherwise a GremlinBackend
+
+    Returns:
+        tuple: (backend, connection)
+    """
+    if url.startswith(EMBEDDED_SCHEME):
+        graph = EmbeddedGraph.named(url[len(EMBEDDED_SCHEME):])
+        return graph, EmbeddedConnection(graph)
+    g, connection = connect(url)
+    return GremlinBackend(g, batch_size, use_merge_v), connection
@@ -0,0 +1,182 @@
+"""
+Memory-compact YAML id -> consistent long vertex id map.
+
+A dict of Python ints costs ~100 bytes per vertex. CompactIdMap keeps 16 bytes per vertex:
+- keys: uint64 hash of the YAML id (str(id), so 1 and '1' are the same key), sorted
+- values: int64 consistent long vertex id, in key order
+Lookups are binary searches (numpy.searchsorted). New entries collect in a small dict and are written as a
+sorted run every spill_threshold entries; a run is merged with the one before it once that one is no more than
+MERGE_RATIO times its size, so the runs shrink geometrically, there are O(log n) of them and every entry is
+rewritten O(log n) times (instead of the whole map on every spill). save() merges the runs into one.
+With a path the runs are written to <path>.run<n>.keys.npy/.values.npy and memory-mapped, save() writes
+<path>.keys.npy/<path>.values.npy, so the map lives on disk instead of the heap and can be reloaded by the next
+incremental load, e.g. an edges-only file referencing vertices loaded before.
+"""
+import os
+
+import numpy as np
+
+from generic_load_vertices_edge.parse_vertices_edges import generate_consistent_longs
+
+
+def hash_keys(keys):
+    """YAML ids -> uint64 array of key hashes"""
+    return generate_consistent_longs([str(key) for key in keys]).astype(np.uint64)
+
+
+# A run is merged into the run before it when that one is at most MERGE_RATIO times larger
+MERGE_RATIO = 2
+
+
+class CompactIdMap:
+    def __init__(self, path=None, spill_threshold=100_000):
+        """
+        Args:
+            path (str): file prefix to spill and save to, None keeps the arrays in memory
+            spill_threshold (int): pending entries written as a sorted run at a time
+        """
+        self.path = path
+        self.spill_threshold = spill_threshold
+        # sorted (keys, values, run file prefix or None) runs, oldest first, a newer run wins for a key
+        self.runs = []
+        self._pending = {}
+        self._run_ids = 0
+
+    @classmethod
+    def load(cls, path, spill_threshold=100_000):
+        """Memory-map a map saved with save(), new entries are spilled next to the same files"""
+        id_map = cls(path, spill_threshold)
+        id_map.runs = [(np.load(f'{path}.keys.npy', mmap_mode='r'), np.load(f'{path}.values.npy', mmap_mode='r'),
+                        None)]
+        return id_map
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(f'{path}.keys.npy') and os.path.exists(f'{path}.values.npy')
+
+    def __getitem__(self, key):
+        key_hash = int(hash_keys([key])[0])
+        if key_hash in self._pending:
+            return self._pending[key_hash]
+        key_hash = np.uint64(key_hash)
+        for keys, values, _ in reversed(self.runs):
+            i = int(np.searchsorted(keys, key_hash))
+            if i < len(keys) and keys[i] == key_hash:
+                return int(values[i])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, value):
+        self.update([(key, value)])
+
+    def update(self, pairs):
+        """Add (YAML id, long id) pairs, the key column is hashed in one batch"""
+        pairs = list(pairs.items() if isinstance(pairs, dict) else pairs)
+        if not pairs:
+            return
+        key_hashes = hash_keys([key for key, _ in pairs]).tolist()
+        self._pending.update(zip(key_hashes, [int(value) for _, value in pairs]))
+        if len(self._pending) >= self.spill_threshold:
+            self.spill()
+
+    def get_many(self, keys, default=-1):
+        """
+        Vectorized lookup of a whole column of YAML ids
+
+        Returns:
+            numpy.ndarray: int64 long ids, default where the key is unknown
+        """
+        self.spill()
+        key_hashes = hash_keys(keys)
+        result = np.full(len(key_hashes), default, dtype=np.int64)
+        missing = np.ones(len(key_hashes), dtype=bool)
+        for run_keys, run_values, _ in reversed(self.runs):
+            wanted = np.flatnonzero(missing)
+            if not len(wanted):
+                break
+            positions = np.searchsorted(run_keys, key_hashes[wanted])
+            in_range = positions < len(run_keys)
+            found = np.zeros(len(wanted), dtype=bool)
+            found[in_range] = run_keys[positions[in_range]] == key_hashes[wanted][in_range]
+            result[wanted[found]] = run_values[positions[found]]
+            missing[wanted[found]] = False
+        return result
+
+    def __len__(self):
+        """Distinct keys, merges the runs into one"""
+        self.compact()
+        return len(self.runs[0][0]) if self.runs else 0
+
+    def _write_run(self, keys, values):
+        """The run as arrays, memory-mapped from new run files when the map has a path"""
+        if self.path is None:
+            return keys, values, None
+        prefix = f'{self.path}.run{self._run_ids}'
+        self._run_ids += 1
+        np.save(f'{prefix}.keys.npy', keys)
+        np.save(f'{prefix}.values.npy', values)
+        return np.load(f'{prefix}.keys.npy', mmap_mode='r'), np.load(f'{prefix}.values.npy', mmap_mode='r'), prefix
+
+    @staticmethod
+    def _drop_run(run):
+        if run[2] is not None:
+            for suffix in ('keys', 'values'):
+                os.remove(f'{run[2]}.{suffix}.npy')
+
+    def _merge(self, runs):
+        """One sorted run of the given runs (oldest first), the newest value of a key wins"""
+        keys = np.concatenate([np.asarray(run[0]) for run in reversed(runs)])
+        values = np.concatenate([np.asarray(run[1]) for run in reversed(runs)])
+        # return_index sorts stably, so the first occurrence - the newest run - is kept
+        keys, first = np.unique(keys, return_index=True)
+        merged = self._write_run(keys, values[first])
+        for run in runs:
+            self._drop_run(run)
+        return merged
+
+    def spill(self):
+        """Write the pending entries as a sorted run, merging the runs that became comparable in size"""
+        if not self._pending:
+            return
+        keys = np.fromiter(self._pending.keys(), dtype=np.uint64, count=len(self._pending))
+        values = np.fromiter(self._pending.values(), dtype=np.int64, count=len(self._pending))
+        order = np.argsort(keys)
+        self._pending = {}
+        self.runs.append(self._write_run(keys[order], values[order]))
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= MERGE_RATIO * len(self.runs[-1][0]):
+            self.runs[-2:] = [self._merge(self.runs[-2:])]
+
+    def compact(self):
+        """Spill and merge all runs into one"""
+        self.spill()
+        if len(self.runs) > 1:
+            self.runs = [self._merge(self.runs)]
+
+    def save(self, path=None):
+        """Write the map to <path>.keys.npy/<path>.values.npy, defaults to the spill path"""
+        path = path or self.path
+        if path is None:
+            raise ValueError('CompactIdMap.save needs a path')
+        self.compact()
+        if not self.runs:
+            keys, values = np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+        else:
+            keys, values, prefix = self.runs[0]
+            if prefix is None and path == self.path and self.exists(path):
+                return  # the loaded files, unchanged
+        for suffix, array in (('keys', keys), ('values', values)):
+            np.save(f'{path}.{suffix}.npy.tmp.npy', np.asarray(array))
+            os.replace(f'{path}.{suffix}.npy.tmp.npy', f'{path}.{suffix}.npy')
+        if path == self.path:
+            if self.runs:
+                self._drop_run(self.runs[0])
+            self.runs = [(np.load(f'{path}.keys.npy', mmap_mode='r'), np.load(f'{path}.values.npy', mmap_mode='r'),
+                          None)] if len(keys) else []
@@ -1,12 +1,28 @@
 from gremlin_python.structure.graph import Graph
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
-from generic_load_vertices_edge.parse_vertices_edges import load_graph_from_yaml
+from generic_load_vertices_edge.graph_backend import connect
+from generic_load_vertices_edge.parse_vertices_edges import load_graph_from_yaml, iter_graph_with_ids
 from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.process.graph_traversal import __
+from generic_load_vertices_edge.batch_upsert import upsert_graph_stream
+from generic_load_vertices_edge.id_map import CompactIdMap
+from generic_load_vertices_edge.concurrent_writer import ConcurrentGraphWriter
 
 # Define the Neptune server connection configuration
 neptune_host = "localhost"
 neptune_port = 8182
+# websocket url of the Gremlin Server/Neptune, or embedded://<name> to load into an in-process graph
+graph_url = f'ws://{neptune_host}:{neptune_port}/gremlin'
+# YAML, or JSON Lines (.jsonl) with one vertex/edge per line
+graph_file = 'data.yaml'
+# YAML id -> vertex id map kept between runs (id_map.keys.npy/id_map.values.npy), None to rebuild it every run
+id_map_file = 'id_map'
+# vertices/edges per round-trip, set to 1 to fall back to add_vertex_if_not_exists/add_edge_if_not_exists
+batch_size = 500
+# mergeV needs TinkerPop 3.6+, set False to use fold().coalesce(unfold(), addV()) instead
+use_merge_v = True
+# concurrent writer connections used in batch mode, 0 writes every batch on the single connection below
+writers = 8
 
 """
 Note the miles between routes are some random value
@@ -14,12 +30,11 @@ Note the miles between routes are some random value
 
 # Connect to your Gremlin Server
 graph = Graph()
-remoteConn = DriverRemoteConnection(f'ws://{neptune_host}:{neptune_port}/gremlin','g')
+#remoteConn = DriverRemoteConnection(f'ws://{neptune_host}:{neptune_port}/gremlin','g')
 #g = graph.traversal().withRemote(remoteConn)
-g = traversal().withRemote(remoteConn)
+g, remoteConn = connect(graph_url)
 
 
-vertices, edges, id_map = load_graph_from_yaml('data.yaml')
 """
 # Adding vertices with properties
 for vertex in vertices:
@@ -68,11 +83,28 @@ def add_edge_if_not_exists(g, edge):
         print(f'edge already exists: {edge}')
 
 # Adding vertices and edges
-for vertex in vertices:
-    add_vertex_if_not_exists(g, vertex)
+if batch_size > 1:
+    # stream the file, batches are written while the rest of the file is still being parsed
+    if id_map_file and CompactIdMap.exists(id_map_file):
+        id_map = CompactIdMap.load(id_map_file)
+    else:
+        id_map = CompactIdMap(id_map_file)
+    if writers:
+        with ConcurrentGraphWriter(graph_url, workers=writers) as writer:
+            upsert_graph_stream(g, iter_graph_with_ids(graph_file, id_map), id_map,
+                                batch_size=batch_size, use_merge_v=use_merge_v, writer=writer)
+    else:
+        upsert_graph_stream(g, iter_graph_with_ids(graph_file, id_map), id_map,
+                            batch_size=batch_size, use_merge_v=use_merge_v)
+    if id_map_file:
+        id_map.save()
+else:
+    vertices, edges, id_map = load_graph_from_yaml(graph_file)
+    for vertex in vertices:
+        add_vertex_if_not_exists(g, vertex)
 
-for edge in edges:
-    add_edge_if_not_exists(g, edge)
+    for edge in edges:
+        add_edge_if_not_exists(g, edge)
 
 # Don't forget to close the connection
 remoteConn.close()
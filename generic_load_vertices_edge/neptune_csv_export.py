@@ -0,0 +1,277 @@
+"""
+Export a YAML/JSON Lines graph definition as Neptune bulk loader CSV (the Gremlin load format,
+see how_to_upload_to_neptune.md).
+
+    vertices: ~id,~label,id:Long,name:String,age:Long
+    edges:    ~id,~from,~to,~label,since:String
+
+- the input is streamed with iter_graph_with_ids, nothing but the id map is kept in memory
+- ~id is the consistent long id, it is also written as the id property the Gremlin loaders look vertices up by
+- property types are inferred from the values (Bool, Long, Double, Date, String, lists as Type[] on vertices).
+  Every file has a single header, so elements are grouped by their property columns and each group gets its own files.
+  At most max_open_files of them are open at a time, the least recently written one is closed and reopened on demand
+- a vertex property named id is rejected, it would clash with the id:Long column
+- files are split after max_bytes (uncompressed) so the bulk loader can read many of them in parallel,
+  and optionally gzipped (one .csv.gz per part, which the bulk loader accepts)
+
+iter_neptune_csv/load_neptune_csv read the files back and write them through the batched upserts,
+so the export can be checked against a local Gremlin Server (TinkerGraph) without AWS.
+
+    python -m generic_load_vertices_edge.neptune_csv_export data.yaml neptune_csv --max-bytes 100000000 --gzip
+"""
+import argparse
+import csv
+import datetime
+import glob
+import gzip
+import io
+import os
+from collections import OrderedDict
+
+from generic_load_vertices_edge.batch_upsert import DEFAULT_BATCH_SIZE, upsert_graph_stream
+from generic_load_vertices_edge.parse_vertices_edges import generate_consistent_long_from_string, iter_graph_with_ids
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+# part files kept open at once while exporting, well below the usual 1024 descriptors per process
+MAX_OPEN_FILES = 64
+
+INT_TYPES = ('Byte', 'Short', 'Int', 'Long')
+FLOAT_TYPES = ('Float', 'Double')
+
+
+def neptune_type(value, multi_valued=True):
+    """Neptune CSV type of a property value, lists become Type[] when the element allows sets (vertices)"""
+    if isinstance(value, (list, tuple, set)):
+        if not multi_valued or not value:
+            return 'String'
+        return neptune_type(next(iter(value)), multi_valued=False) + '[]'
+    if isinstance(value, bool):
+        return 'Bool'
+    if isinstance(value, int):
+        return 'Long'
+    if isinstance(value, float):
+        return 'Double'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return 'Date'
+    return 'String'
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple, set)):
+        return ';'.join(format_value(item) for item in value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def edge_id(from_id, label, to_id):
+    """Consistent ~id for an edge, the same edge always gets the same id"""
+    return generate_consistent_long_from_string(f'{from_id}{label}{to_id}')
+
+
+class CsvPartWriter:
+    """
+    CSV files sharing one header, a new part (<prefix>-00000.csv, ...) is started once max_bytes have been written.
+    With max_bytes None everything goes to a single <prefix>.csv. Compressed files get a further .gz.
+    close() only releases the file, a later writerow() appends to the same part (a gzipped one gets another gzip
+    member, which gzip readers concatenate). A writer closed without rows still writes its first part, the header
+    alone, so an empty export replaces the files of an earlier one.
+    """
+
+    def __init__(self, directory, prefix, header, max_bytes=DEFAULT_MAX_BYTES, compress=False, suffix='.csv'):
+        self.directory = directory
+        self.prefix = prefix
+        self.header = header
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.suffix = suffix
+        self.paths = []
+        self._file = None
+        self._written = 0
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+
+    def _encode(self, row):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._csv.writerow(row)
+        return self._buffer.getvalue().encode('utf-8')
+
+    def _open_part(self):
+        self._release()
+        suffix = self.suffix + '.gz' if self.compress else self.suffix
+        part = '' if self.max_bytes is None else f'-{len(self.paths):05d}'
+        path = os.path.join(self.directory, f'{self.prefix}{part}{suffix}')
+        self._file = gzip.open(path, 'wb') if self.compress else open(path, 'wb')
+        self.paths.append(path)
+        header = self._encode(self.header)
+        self._file.write(header)
+        self._written = len(header)
+
+    def writerow(self, row):
+        data = self._encode(row)
+        full = self.max_bytes is not None and self._written + len(data) > self.max_bytes
+        if self._file is None and self.paths and not full:
+            self._file = gzip.open(self.paths[-1], 'ab') if self.compress else open(self.paths[-1], 'ab')
+        elif self._file is None or full:
+            self._open_part()
+        self._file.write(data)
+        self._written += len(data)
+
+    def _release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if not self.paths:
+            self._open_part()
+        self._release()
+
+
+def property_columns(properties, multi_valued):
+    return tuple((prop, neptune_type(value, multi_valued)) for prop, value in sorted(properties.items()))
+
+
+def export_neptune_csv(graph_file, output_dir, id_map=None, max_bytes=DEFAULT_MAX_BYTES, compress=False,
+                       max_open_files=MAX_OPEN_FILES):
+    """
+    Stream graph_file into Neptune bulk loader vertex and edge CSV files
+
+    Args:
+        graph_file (str): YAML or .jsonl graph definition
+        output_dir (str): folder for the CSV files, upload it as the loader "source" prefix
+        id_map: YAML id -> long id map, e.g. a saved id_map.CompactIdMap when edges refer to earlier loads
+        max_bytes (int): uncompressed size after which a new part file is started
+        compress (bool): gzip every part
+        max_open_files (int): part files open at a time, one per label and property signature being written
+    Returns:
+        list: paths of the files written, vertex files first
+    Raises:
+        ValueError: for a vertex with an id property
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    id_map = {} if id_map is None else id_map
+    writers = {}
+    # writers with an open file, least recently written first
+    open_writers = OrderedDict()
+
+    def writer_for(kind, columns):
+        key = (kind, columns)
+        if key not in writers:
+            if kind == 'vertex':
+                header = ['~id', '~label', 'id:Long']
+            else:
+                header = ['~id', '~from', '~to', '~label']
+            header += [f'{prop}:{prop_type}' for prop, prop_type in columns]
+            prefix = f"{'vertices' if kind == 'vertex' else 'edges'}-{sum(k[0] == kind for k in writers):03d}"
+            writers[key] = CsvPartWriter(output_dir, prefix, header, max_bytes, compress)
+        open_writers[key] = writers[key]
+        open_writers.move_to_end(key)
+        if len(open_writers) > max_open_files:
+            open_writers.popitem(last=False)[1].close()
+        return writers[key]
+
+    try:
+        for kind, element in iter_graph_with_ids(graph_file, id_map):
+            properties = element.get('properties') or {}
+            columns = property_columns(properties, multi_valued=kind == 'vertex')
+            values = [format_value(properties[prop]) for prop, _ in columns]
+            if kind == 'vertex':
+                if 'id' in properties:
+                    raise ValueError(f"vertex {element['id']!r}: property 'id' clashes with the id:Long column, "
+                                     f"rename it")
+                vertex_id = id_map[element['id']]
+                row = [vertex_id, element['label'], vertex_id]
+            else:
+                from_id, to_id = id_map[element['from']], id_map[element['to']]
+                row = [edge_id(from_id, element['label'], to_id), from_id, to_id, element['label']]
+            writer_for(kind, columns).writerow(row + values)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    paths = [path for (kind, _), writer in writers.items() if kind == 'vertex' for path in writer.paths]
+    return paths + [path for (kind, _), writer in writers.items() if kind == 'edge' for path in writer.paths]
+
+
+def parse_value(text, prop_type):
+    if prop_type.endswith('[]'):
+        return [parse_value(item, prop_type[:-2]) for item in text.split(';')]
+    if prop_type in INT_TYPES:
+        return int(text)
+    if prop_type in FLOAT_TYPES:
+        return float(text)
+    if prop_type == 'Bool':
+        return text.lower() == 'true'
+    return text
+
+
+def iter_neptune_csv(paths):
+    """
+    Read Neptune bulk loader CSV files back as batch_upsert rows:
+    ('vertex', {'id', 'label', 'properties'}) and ('edge', {'from', 'to', 'label', 'properties'}).
+    Empty cells are left out, like the bulk loader does.
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            system = [column for column in header if column.startswith('~')]
+            columns = [column.rsplit(':', 1) if ':' in column else (column, 'String')
+                       for column in header[len(system):]]
+            is_edge = '~from' in system
+            for values in reader:
+                element = dict(zip(system, values))
+                properties = {prop: parse_value(text, prop_type)
+                              for (prop, prop_type), text in zip(columns, values[len(system):]) if text != ''}
+                if is_edge:
+                    yield 'edge', {'from': int(element['~from']), 'to': int(element['~to']),
+                                   'label': element['~label'], 'properties': properties}
+                else:
+                    properties.pop('id', None)
+                    yield 'vertex', {'id': int(element['~id']), 'label': element['~label'], 'properties': properties}
+
+
+def neptune_csv_files(directory):
+    """Vertex files first, then edge files, so edges always find their endpoints"""
+    files = sorted(glob.glob(os.path.join(directory, '*.csv')) + glob.glob(os.path.join(directory, '*.csv.gz')))
+    return ([path for path in files if os.path.basename(path).startswith('vertices')] +
+            [path for path in files if not os.path.basename(path).startswith('vertices')])
+
+
+class IdentityIdMap:
+    """id map for elements whose ids are already the consistent long ids"""
+
+    def __getitem__(self, key):
+        return key
+
+
+def load_neptune_csv(g, directory, batch_size=DEFAULT_BATCH_SIZE, use_merge_v=True, writer=None):
+    """
+    Load exported CSV files into a local Gremlin Server (TinkerGraph) stand-in for the Neptune bulk loader.
+    The rows are already resolved, so they go through upsert_graph_stream with an identity id map.
+
+    Returns:
+        tuple: (vertices sent, edges sent)
+    """
+    return upsert_graph_stream(g, iter_neptune_csv(neptune_csv_files(directory)), IdentityIdMap(),
+                               batch_size=batch_size, use_merge_v=use_merge_v, writer=writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a YAML/JSON Lines graph as Neptune bulk loader CSV')
+    parser.add_argument('graph_file')
+    parser.add_argument('output_dir')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args()
+    for path in export_neptune_csv(args.graph_file, args.output_dir, max_bytes=args.max_bytes, compress=args.gzip):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
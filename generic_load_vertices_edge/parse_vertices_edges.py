@@ -1,29 +1,134 @@
+import json
 import yaml
 import sys
 
 
 def load_graph_from_yaml(file_path):
+    vertices = []
+    edges = []
+    id_map = {}
+    for kind, element in iter_graph_with_ids(file_path, id_map):
+        if kind == 'vertex':
+            vertices.append(element)
+        else:
+            edges.append(element)
+
+    return vertices, edges, id_map
+
+
+def vertex_key(vertex):
+    """label followed by the property values, the string the consistent vertex id is hashed from"""
+    id = []
+    id.append(vertex['label'])
+    for prop, value in vertex['properties'].items():
+        id.append(str(value))
+    return ''.join(id)
+
+
+def iter_graph_from_yaml(file_path):
+    """
+    Yield ('vertex', vertex) and ('edge', edge) one at a time from a YAML definition file.
+
+    yaml.safe_load builds the whole document before returning. Here the SafeLoader is driven event by event,
+    only one list item at a time is composed into Python objects, so memory does not grow with the file.
+    Keys other than vertices/edges are skipped.
+    """
     with open(file_path, 'r') as file:
-        data = yaml.safe_load(file)
+        loader = yaml.SafeLoader(file)
+        try:
+            loader.get_event()  # StreamStart
+            while not loader.check_event(yaml.StreamEndEvent):
+                loader.get_event()  # DocumentStart
+                if not loader.check_event(yaml.MappingStartEvent):
+                    loader.compose_node(None, None)
+                else:
+                    loader.get_event()  # MappingStart
+                    while not loader.check_event(yaml.MappingEndEvent):
+                        key = loader.construct_document(loader.compose_node(None, None))
+                        kind = {'vertices': 'vertex', 'edges': 'edge'}.get(key)
+                        if kind and loader.check_event(yaml.SequenceStartEvent):
+                            loader.get_event()  # SequenceStart
+                            while not loader.check_event(yaml.SequenceEndEvent):
+                                yield kind, loader.construct_document(loader.compose_node(None, None))
+                            loader.get_event()  # SequenceEnd
+                        else:
+                            loader.compose_node(None, None)
+                    loader.get_event()  # MappingEnd
+                loader.get_event()  # DocumentEnd
+                loader.anchors = {}
+        finally:
+            loader.dispose()
 
-    vertices = data.get('vertices', [])
 
-    id_map = {}
-    for vertex in vertices:
-        id = []
-        id.append(vertex['label'])
-        for prop, value in vertex['properties'].items():
-            id.append(str(value))
-        id = ''.join(id)
-        hashcode = generate_consistent_long_from_string(id)
-        id_map[vertex['id']]=hashcode
+def iter_graph_from_jsonl(file_path):
+    """
+    Yield ('vertex', vertex) and ('edge', edge) from a JSON Lines file, one element per line
+    with the same fields as the YAML lists, e.g.
+        {"id": 1, "label": "person::female", "properties": {"name": "Alica", "age": 30}}
+        {"from": 1, "to": 2, "label": "knows::friend1", "properties": {"since": "2020"}}
+    An optional "type": "vertex"|"edge" field is used when present, otherwise lines with from/to are edges.
+    """
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            element = json.loads(line)
+            kind = element.pop('type', None) or ('edge' if 'from' in element else 'vertex')
+            yield kind, element
 
-    edges = data.get('edges', [])
 
-    return vertices, edges, id_map
+def iter_graph(file_path):
+    """Stream a .jsonl/.ndjson or YAML graph definition file"""
+    if file_path.endswith(('.jsonl', '.ndjson')):
+        return iter_graph_from_jsonl(file_path)
+    return iter_graph_from_yaml(file_path)
+
+
+def iter_graph_with_ids(file_path, id_map, hash_batch_size=1000):
+    """
+    Stream the elements of file_path, adding the consistent id of every vertex to id_map as it goes by.
+    Vertices are hashed hash_batch_size at a time with generate_consistent_longs, pending vertices are
+    always assigned before an edge is yielded. Edges may reference vertices defined anywhere in the file
+    (an edges: list before vertices: works) or in an earlier load when id_map is a saved id_map.CompactIdMap;
+    an edge whose endpoints are not known yet is held back until the end of the file, so such files cost
+    memory for those edges.
+
+    Raises:
+        ValueError: an edge references a vertex defined nowhere
+    """
+    pending = []
+    deferred = []
+
+    def assign():
+        ids = generate_consistent_longs([vertex_key(vertex) for vertex in pending])
+        id_map.update(zip([vertex['id'] for vertex in pending], ids.tolist()))
+        for vertex in pending:
+            yield 'vertex', vertex
+        pending.clear()
+
+    for kind, element in iter_graph(file_path):
+        if kind == 'vertex':
+            pending.append(element)
+            if len(pending) >= hash_batch_size:
+                yield from assign()
+        else:
+            yield from assign()
+            if element['from'] in id_map and element['to'] in id_map:
+                yield kind, element
+            else:
+                deferred.append(element)
+    yield from assign()
+    for element in deferred:
+        missing = [end for end in ('from', 'to') if element[end] not in id_map]
+        if missing:
+            raise ValueError(f"edge {element.get('label')} {element['from']} -> {element['to']}: "
+                             f"no vertex with id {element[missing[0]]!r} in {file_path} or the id map")
+        yield 'edge', element
 
 
 import hashlib
+import numpy as np
 
 
 def generate_consistent_long_from_string(input_string):
@@ -38,6 +143,21 @@ def generate_consistent_long_from_string(input_string):
     long_value = long_value & ((1 << 63) - 1)  # Truncate to 63 bits
 
     return long_value
+
+
+def generate_consistent_longs(input_strings):
+    """
+    Vectorized generate_consistent_long_from_string for a whole column of keys.
+    The low 63 bits of the SHA-256 value are the last 8 digest bytes, so only those are kept
+    and converted in a single numpy call instead of one int.from_bytes per key.
+
+    Returns:
+        numpy.ndarray: int64 ids, same order as input_strings
+    """
+    tails = b''.join(hashlib.sha256(s.encode('utf-8')).digest()[24:] for s in input_strings)
+    return (np.frombuffer(tails, dtype='>u8') & np.uint64((1 << 63) - 1)).astype(np.int64)
+
+
 def hashValue(value:str) -> str:
     hash_obj = hashlib.sha256(value.encode('UTF-8'))
     hex_hash = hash_obj.hexdigest()
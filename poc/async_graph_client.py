@@ -0,0 +1,250 @@
+"""
+Non-blocking Gremlin access for asyncio services, on top of gremlinpython's client (graph_api.GraphService
+submits its traversals through it when given a client).
+
+gremlinpython's aiohttp transport runs its own event loop per connection and hands results back as
+concurrent.futures, so request handlers that call submitAsync(...).result() hold a worker thread for the
+whole traversal. AsyncGraphClient awaits those futures on the service's loop instead (asyncio.wrap_future),
+the handler gives its loop back while Neptune works:
+
+    graph = AsyncGraphClient('wss://<neptune-endpoint>:8182/gremlin', pool_size=8, timeout=10)
+    vertices = await graph.submit(g.V().hasLabel('account').valueMap(True).limit(100))
+    counts = await graph.gather({'accounts': g.V().hasLabel('account').count(),
+                                 'transfers': g.E().hasLabel('transfers').count()})
+
+- one shared Client, pool_size websocket connections; at most pool_size requests are in flight, the others wait
+  on an asyncio.Semaphore (the client's own pool would block the loop thread)
+- per-request timeout on the await, also sent as evaluationTimeout so the server stops the query too
+- gather() fans independent sub-queries out concurrently
+- identical queries (same bytecode/script, bindings and timeout) in flight at the same time run once, every
+  caller awaits the same result
+
+Queries are traversals (sent as bytecode, g is only used to build them) or Gremlin script strings.
+EmbeddedGremlinClient stands in for a Gremlin Server, answering bytecode from an embedded graph with an
+optional latency, so the layer runs without a server:
+
+    python -m poc.async_graph_client --latency 0.05
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from gremlin_python.driver.client import Client
+from gremlin_python.process.traversal import Binding, Bytecode, P, Traverser
+
+from generic_load_vertices_edge.embedded_graph import EmbeddedGraph
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30.0
+
+
+def _message(query):
+    """Bytecode of a traversal, a script string as is"""
+    return query.bytecode if hasattr(query, 'bytecode') else query
+
+
+def _typed(value):
+    """
+    Hashable form of a request part that keeps the value types apart: repr(P.gt(1)) == repr(P.gt('1')), and a
+    string id and an int id are different queries
+    """
+    if isinstance(value, Bytecode):
+        return ('Bytecode', _typed(value.source_instructions), _typed(value.step_instructions), _typed(value.bindings))
+    if isinstance(value, P):
+        # TextP too
+        return (type(value).__name__, value.operator, _typed(value.value), _typed(value.other))
+    if isinstance(value, Binding):
+        return ('Binding', value.key, _typed(value.value))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted(((_typed(key), _typed(item)) for key, item in value.items()), key=repr)))
+    if isinstance(value, (set, frozenset)):
+        return ('set', tuple(sorted(map(_typed, value), key=repr)))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(map(_typed, value)))
+    return type(value).__qualname__, repr(value)
+
+
+def _query_key(message, bindings, timeout):
+    """Identity of a request for coalescing, binding values may be lists or dicts (e.g. ids for within())"""
+    return _typed(message), _typed(bindings or {}), timeout
+
+
+def _unwrap(results):
+    """Bytecode requests answer with traversers (object and bulk), scripts with plain values"""
+    values = []
+    for result in results:
+        if isinstance(result, Traverser):
+            values.extend([result.object] * result.bulk)
+        else:
+            values.append(result)
+    return values
+
+
+class AsyncGraphClient:
+    def __init__(self, url=None, traversal_source='g', pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 client=None, **client_kwargs):
+        """
+        Args:
+            url (str): Gremlin Server/Neptune websocket endpoint
+            pool_size (int): connections of the shared client, also the requests in flight
+            timeout (float): default seconds a request may take, None for no limit
+            client: anything with submit_async(message, bindings, request_options) returning a future of a
+                result set with all() (a gremlinpython Client, or EmbeddedGremlinClient), built from url when None
+            client_kwargs: passed on to gremlinpython's Client, e.g. headers for IAM auth
+        """
+        self.client = client or Client(url, traversal_source, pool_size=pool_size, max_workers=pool_size,
+                                       **client_kwargs)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.submitted = 0
+        self.coalesced = 0
+        self._slots = None
+        self._in_flight = {}
+
+    async def _run(self, message, bindings, timeout):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        request_options = {'evaluationTimeout': int(timeout * 1000)} if timeout else None
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            self.submitted += 1
+            # submit_async waits for a free connection of the client's pool, keep that off the loop thread
+            result_set = await asyncio.wrap_future(
+                await loop.run_in_executor(None, self.client.submit_async, message, bindings, request_options))
+            return _unwrap(await asyncio.wrap_future(result_set.all()))
+
+    async def submit(self, query, bindings=None, timeout=None):
+        """
+        Results of a traversal or script
+
+        Args:
+            timeout (float): seconds the request may take, the client default when None; sent to the server as
+                evaluationTimeout as well
+
+        Raises:
+            asyncio.TimeoutError: no result within timeout (an identical request other callers share keeps running)
+
+        Returns:
+            list: result values
+        """
+        message = _message(query)
+        timeout = timeout or self.timeout
+        key = _query_key(message, bindings, timeout)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(message, bindings, timeout))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    async def gather(self, queries, timeout=None):
+        """
+        Run independent queries concurrently
+
+        Args:
+            queries (dict or list): name -> query, or a list of queries
+
+        Returns:
+            dict or list: results in the same shape
+        """
+        if isinstance(queries, dict):
+            results = await asyncio.gather(*(self.submit(query, timeout=timeout) for query in queries.values()))
+            return dict(zip(queries, results))
+        return await asyncio.gather(*(self.submit(query, timeout=timeout) for query in queries))
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.client.close)
+
+
+class _ResultSet:
+    def __init__(self, results):
+        self.results = results
+
+    def all(self):
+        future = Future()
+        future.set_result(self.results)
+        return future
+
+
+class EmbeddedGremlinClient:
+    def __init__(self, graph=None, latency=0.0, workers=DEFAULT_POOL_SIZE):
+        """
+        Gremlin Server stand-in: bytecode requests answered from an EmbeddedGraph on worker threads
+
+        Args:
+            latency (float): seconds added to every request, like the round trip to a server
+        """
+        self.graph = graph if graph is not None else EmbeddedGraph()
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _execute(self, message):
+        if not isinstance(message, Bytecode):
+            raise TypeError('the embedded stand-in answers traversals (bytecode), not scripts')
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _ResultSet([Traverser(t.obj) for t in self.graph.execute(message)])
+
+    def submit_async(self, message, bindings=None, request_options=None):
+        return self._executor.submit(self._execute, message)
+
+    def close(self):
+        self._executor.shutdown()
+
+
+async def demo(graph, latency, queries=16):
+    """Blocking one-by-one calls vs fan-out vs coalescing, on the stand-in"""
+    from gremlin_python.process.anonymous_traversal import traversal
+    from gremlin_python.structure.graph import Graph
+
+    g = traversal().withGraph(Graph())
+    query_list = [g.V().hasLabel('rootNode').has('id', f'root{n}').out().count() for n in range(queries)]
+
+    blocking = EmbeddedGremlinClient(graph, latency)
+    start = time.perf_counter()
+    for query in query_list:
+        blocking.submit_async(query.bytecode).result().all().result()
+    print(f'{queries} queries, blocking one by one:  {time.perf_counter() - start:6.3f} s')
+    blocking.close()
+
+    stand_in = EmbeddedGremlinClient(graph, latency)
+    client = AsyncGraphClient(client=stand_in, timeout=10)
+    start = time.perf_counter()
+    counts = await client.gather(query_list)
+    print(f'{queries} queries, gather fan-out:       {time.perf_counter() - start:6.3f} s   {counts[:4]}...')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client.submit(query_list[0]) for _ in range(100)))
+    print(f'100 identical concurrent requests:    {time.perf_counter() - start:6.3f} s   '
+          f'{client.coalesced} coalesced, {stand_in.requests - queries} sent')
+
+    slow = AsyncGraphClient(client=EmbeddedGremlinClient(graph, latency=1.0), timeout=10)
+    try:
+        await slow.submit(query_list[0], timeout=0.1)
+    except asyncio.TimeoutError:
+        print('request with a 0.1 s timeout on a 1 s server: TimeoutError')
+    await slow.close()
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AsyncGraphClient against the embedded Gremlin Server stand-in')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request of the stand-in')
+    parser.add_argument('--queries', type=int, default=16)
+    args = parser.parse_args()
+
+    from poc.graph_api import seed_graph
+    seed_graph('embedded://async-demo')
+    asyncio.run(demo(EmbeddedGraph.named('async-demo'), args.latency, args.queries))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""
+Graph JSON API for the D3 front ends (pyflask_d3js_neptune_graph.md, graph_with_d3_js.html, graph_nodes_edges.html).
+
+    GET /graph?root=rootNode&edge=<edge label>&limit=5000&cursor=<next>
+    -> {"nodes": [{"id", "label"}], "links": [{"id", "source", "target", "label"}], "next": "<cursor>" or null}
+
+Instead of the whole g.V().hasLabel('rootNode').outE().inV().path() on every page load, the edges are read a
+page at a time by key: the cursor is the last edge id of the previous page (JSON encoded), the next page is the
+first `limit` edges by id above it, so a page does not re-read the pages before it the way an offset would.
+Edges are projected to ids and labels only. Within a page every vertex appears once in "nodes" however many paths reach it, so the
+payload grows with the distinct vertices, not with the paths (the front end merges pages by node id).
+Pages are kept in a TTL/LRU cache keyed by query and parameters, as ready JSON and gzip bodies, so a repeated
+request costs neither a traversal nor a serialization; responses are gzipped when the client accepts it and
+carry an ETag for If-None-Match.
+
+With --async-pool N the traversals go through one shared async_graph_client.AsyncGraphClient, run on a loop
+thread of the service: concurrent requests for the same cold page run one traversal, at most N are in flight
+on the server, and each is stopped server side after the client timeout. The Flask handlers still wait for
+their page.
+
+Run from the repository root (the graph backend lives in generic_load_vertices_edge):
+
+    python -m poc.graph_api --url wss://<neptune-endpoint>:8182/gremlin
+    python -m poc.graph_api --url ws://localhost:8182/gremlin --bench      # local Gremlin Server
+    python -m poc.graph_api --url embedded://bench --bench                 # in-process graph, no server
+    python -m poc.graph_api --url embedded://bench --bench --async-pool 8
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from gremlin_python.process.graph_traversal import __
+from gremlin_python.process.traversal import P, T
+
+from generic_load_vertices_edge.embedded_graph import EmbeddedGraph
+from generic_load_vertices_edge.graph_backend import EMBEDDED_SCHEME, connect, open_backend
+from poc.async_graph_client import AsyncGraphClient, EmbeddedGremlinClient
+
+DEFAULT_PAGE_SIZE = 5000
+MAX_PAGE_SIZE = 20000
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_TTL = 60.0
+# Bodies smaller than this are sent uncompressed, gzip would not pay for its header
+MIN_GZIP_BYTES = 1024
+
+
+class TTLCache:
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES, ttl=DEFAULT_TTL, clock=time.monotonic):
+        """
+        LRU cache whose entries also expire `ttl` seconds after they were stored, thread safe
+
+        Args:
+            max_entries (int): entries kept, the least recently used one is evicted first
+            ttl (float): seconds an entry is served, the graph may change behind the cache
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The value stored under key, None when missing or expired"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class CachedBody:
+    """A response body serialized once: JSON bytes, their gzip and an ETag"""
+    __slots__ = ('body', 'gzipped', 'etag')
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(',', ':'), default=str).encode()
+        self.gzipped = gzip.compress(self.body, compresslevel=6) if len(self.body) >= MIN_GZIP_BYTES else None
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+
+
+def edge_page_traversal(g, root_label, edge_label=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    The first `limit` edges by id out of the root vertices, only ids above `after` (all when None),
+    projected to the ids and labels of the edge and its ends
+    """
+    edges = g.V().hasLabel(root_label)
+    edges = edges.outE(edge_label) if edge_label else edges.outE()
+    if after is not None:
+        edges = edges.has(T.id, P.gt(after))
+    return (edges.order().by(T.id).limit(limit)
+            .project('id', 'label', 'source', 'source_label', 'target', 'target_label')
+            .by(T.id).by(T.label)
+            .by(__.outV().id_()).by(__.outV().label())
+            .by(__.inV().id_()).by(__.inV().label()))
+
+
+def graph_page(rows, limit):
+    """
+    D3 nodes/links of a page of projected edges, every vertex once
+
+    Returns:
+        dict: nodes, links and next (cursor of the next page: the last edge id as JSON, None on the last page)
+    """
+    nodes = {}
+    links = []
+    for row in rows:
+        nodes.setdefault(row['source'], {'id': row['source'], 'label': row['source_label']})
+        nodes.setdefault(row['target'], {'id': row['target'], 'label': row['target_label']})
+        links.append({'id': row['id'], 'source': row['source'], 'target': row['target'], 'label': row['label']})
+    return {'nodes': list(nodes.values()), 'links': links,
+            'next': json.dumps(rows[-1]['id']) if rows and len(rows) == limit else None}
+
+
+def async_client(url, pool_size):
+    """AsyncGraphClient for a websocket url, or for embedded://<name> one over the embedded stand-in"""
+    if url.startswith(EMBEDDED_SCHEME):
+        graph = EmbeddedGraph.named(url[len(EMBEDDED_SCHEME):])
+        return AsyncGraphClient(client=EmbeddedGremlinClient(graph, workers=pool_size), pool_size=pool_size)
+    return AsyncGraphClient(url, pool_size=pool_size)
+
+
+class GraphService:
+    def __init__(self, g, cache=None, client=None):
+        """
+        Args:
+            g: traversal source (graph_backend.connect)
+            cache (TTLCache): page cache, a default one when None
+            client (AsyncGraphClient): submit the traversals through it (on a loop thread of the service)
+                instead of running them on g's connection
+        """
+        self.g = g
+        self.cache = cache if cache is not None else TTLCache()
+        self.client = client
+        self._loop = None
+        if client is not None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='graph-service-loop', daemon=True).start()
+
+    def _rows(self, traversal):
+        if self.client is None:
+            return traversal.toList()
+        return asyncio.run_coroutine_threadsafe(self.client.submit(traversal), self._loop).result()
+
+    def close(self):
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def page(self, root_label='rootNode', edge_label=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        One page of the graph as a CachedBody, from the cache when the same page was served within the TTL
+
+        Args:
+            cursor (str): `next` of the previous page, None or '' for the first page
+
+        Raises:
+            ValueError: bad cursor or limit
+        """
+        limit = int(limit)
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be in 1..{MAX_PAGE_SIZE}')
+        try:
+            after = json.loads(cursor) if cursor else None
+        except ValueError:
+            raise ValueError(f'bad cursor {cursor!r}') from None
+        # the decoded cursor, re-encoded: spellings of one id share a page, 1 and "1" stay different pages
+        key = ('graph', root_label, edge_label, None if after is None else json.dumps(after), limit)
+        cached = self.cache.get(key)
+        if cached is None:
+            rows = self._rows(edge_page_traversal(self.g, root_label, edge_label, after, limit))
+            cached = CachedBody(graph_page(rows, limit))
+            self.cache.put(key, cached)
+        return cached
+
+    def pages(self, root_label='rootNode', edge_label=None, limit=DEFAULT_PAGE_SIZE):
+        """Every page, following the cursors"""
+        cursor = None
+        while True:
+            cached = self.page(root_label, edge_label, cursor, limit)
+            yield cached
+            cursor = json.loads(cached.body)['next']
+            if cursor is None:
+                return
+
+
+def create_app(url, cache=None, async_pool=None):
+    """
+    Flask app serving /graph from the graph at url (graph_backend.connect) and / from templates/index.html
+
+    Args:
+        async_pool (int): run the traversals through an AsyncGraphClient with this many connections
+    """
+    from flask import Flask, Response, jsonify, render_template, request
+
+    app = Flask(__name__)
+    g, connection = connect(url)
+    service = GraphService(g, cache, async_client(url, async_pool) if async_pool else None)
+    app.config['graph_service'] = service
+
+    @app.route('/graph', methods=['GET'])
+    def get_graph():
+        try:
+            cached = service.page(request.args.get('root', 'rootNode'), request.args.get('edge'),
+                                  request.args.get('cursor'), request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 502
+        headers = {'ETag': cached.etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'private, max-age=0'}
+        # if_none_match holds the tags unquoted, contains_raw unquotes ours (and honours *)
+        if request.if_none_match.contains_raw(cached.etag):
+            return Response(status=304, headers=headers)
+        if cached.gzipped is not None and 'gzip' in request.accept_encodings:
+            headers['Content-Encoding'] = 'gzip'
+            return Response(cached.gzipped, mimetype='application/json', headers=headers)
+        return Response(cached.body, mimetype='application/json', headers=headers)
+
+    @app.route('/graph/cache', methods=['GET'])
+    def cache_stats():
+        return jsonify(service.cache.stats())
+
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    return app
+
+
+def legacy_graph(g, root_label='rootNode'):
+    """What /graph returned before: the full path query, one node entry per path step (duplicates included)"""
+    nodes = []
+    edges = []
+    for path in g.V().hasLabel(root_label).outE().inV().path().toList():
+        path_objects = path.objects
+        for i in range(len(path_objects) - 1):
+            source = path_objects[i]
+            target = path_objects[i + 1]
+            nodes.append({'id': source.id, 'label': source.label})
+            edges.append({'source': source.id, 'target': target.id})
+    return {'nodes': nodes, 'links': edges}
+
+
+def seed_graph(url, roots=50, children=200, shared=0.5):
+    """
+    Test graph: `roots` rootNode vertices with `children` out edges each, a `shared` fraction of the
+    children shared between all roots (so paths repeat vertices)
+    """
+    backend, connection = open_backend(url)
+    try:
+        shared_children = int(children * shared)
+        vertices = [{'id': f'root{r}', 'label': 'rootNode', 'properties': {}} for r in range(roots)]
+        vertices += [{'id': f'shared{c}', 'label': 'child', 'properties': {}} for c in range(shared_children)]
+        vertices += [{'id': f'child{r}_{c}', 'label': 'child', 'properties': {}}
+                     for r in range(roots) for c in range(shared_children, children)]
+        backend.upsert_vertices(vertices)
+        backend.upsert_edges({'from': f'root{r}', 'to': f'shared{c}' if c < shared_children else f'child{r}_{c}',
+                              'label': 'has', 'properties': {}} for r in range(roots) for c in range(children))
+    finally:
+        connection.close()
+
+
+def bench(url, page_size=DEFAULT_PAGE_SIZE, repeat=5, async_pool=None, concurrent=8):
+    """
+    Legacy full path query vs paged, deduplicated pages, cold (traversal) and warm (cache).
+    With async_pool, also `concurrent` simultaneous cold requests for the first page, with and without the client.
+    """
+    g, connection = connect(url)
+    try:
+        start = time.perf_counter()
+        legacy = json.dumps(legacy_graph(g)).encode()
+        legacy_seconds = time.perf_counter() - start
+
+        service = GraphService(g)
+        start = time.perf_counter()
+        pages = list(service.pages(limit=page_size))
+        cold_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(service.pages(limit=page_size))
+        warm_seconds = (time.perf_counter() - start) / repeat
+
+        concurrent_lines = []
+        if async_pool:
+            for name, client in (('blocking', None), ('async client', async_client(url, async_pool))):
+                concurrent_service = GraphService(g, client=client)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(concurrent) as executor:
+                    list(executor.map(lambda _: concurrent_service.page(limit=page_size), range(concurrent)))
+                seconds = time.perf_counter() - start
+                traversals = concurrent_service.cache.misses if client is None else client.submitted
+                concurrent_lines.append(f'{concurrent} concurrent cold first pages, {name}: {seconds * 1000:.1f} ms, '
+                                        f'{traversals} traversals')
+                concurrent_service.close()
+    finally:
+        connection.close()
+
+    body = sum(len(page.body) for page in pages)
+    gzipped = sum(len(page.gzipped or page.body) for page in pages)
+    print(f'legacy path query:        {legacy_seconds * 1000:9.1f} ms  {len(legacy):12,} bytes')
+    print(f'paged, cold ({len(pages)} pages):  {cold_seconds * 1000:9.1f} ms  {body:12,} bytes, {gzipped:,} gzipped')
+    print(f'paged, cached:            {warm_seconds * 1000:9.1f} ms  hit rate {service.cache.stats()["hit_rate"]:.0%}')
+    for line in concurrent_lines:
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Graph JSON API for the D3 front ends')
+    parser.add_argument('--url', default='ws://localhost:8182/gremlin',
+                        help='Gremlin Server/Neptune websocket url or embedded://<name>')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL)
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES)
+    parser.add_argument('--bench', action='store_true', help='benchmark instead of serving')
+    parser.add_argument('--seed', action='store_true', help='load the benchmark graph first (always for embedded)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--async-pool', type=int, help='run the traversals through an AsyncGraphClient '
+                                                         'with this many connections')
+    args = parser.parse_args()
+
+    if args.seed or args.bench and args.url.startswith(EMBEDDED_SCHEME):
+        seed_graph(args.url)
+    if args.bench:
+        bench(args.url, args.page_size, async_pool=args.async_pool)
+        return
+    create_app(args.url, TTLCache(args.cache_entries, args.ttl), args.async_pool).run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()